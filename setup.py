@@ -4,7 +4,8 @@ import os
 from setuptools import setup, Extension
 
 source_dir = 'src'
-solver_sources = ['solver.cpp', 'cubex.cpp']
+solver_sources = ['solver.cpp', 'cubex.cpp', 'twophase.cpp', 'pocket.cpp',
+                  'statecode.cpp']
 
 cpp_dir = os.path.join(source_dir, 'solver')
 python_dir = os.path.join(source_dir, 'python')
@@ -19,10 +20,15 @@ setup( name = "rubik",
        author_email = "martinom@ifi.uio.no, torkildr@ifi.uio.no",
        description = "An OpenGL python and C implemented Rubik's cube.",
        package_dir = { '' : python_dir },
-       py_modules = ['box', 'rubik', 'cube', 'quaternion', 'test'],
+       py_modules = ['benchmark', 'box', 'rubik', 'cube', 'cubestate',
+                     'framestats', 'microbenchmark', 'offscreen', 'quaternion',
+                     'reduction', 'renderer', 'solutioncache', 'test'],
        entry_points = {
            'console_scripts': [
-               'rubik=rubik:main'
+               'rubik=rubik:main',
+               'rubik-render=offscreen:main',
+               'rubik-benchmark=benchmark:main',
+               'rubik-microbenchmark=microbenchmark:main'
            ],
        },
        ext_modules = [solver_mod])
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+"""Benchmarks of the solver engines.
+
+Every engine solves the same corpus of scrambled cubes, made from a seed
+so it's the same on every run: 3x3x3 states drawn uniformly from all
+states for the layer by layer and the two-phase engines, and 2x2x2 states
+for the pocket cube search. Every solution is checked by applying it.
+
+The results hold the throughput, the latency of every solve, through
+loadCube and solveCube, as percentiles, and the distributions of the
+solution lengths and of the moves of every phase of the engine. They are
+written as JSON, and a run can be compared against the JSON of an
+earlier one.
+
+Run as a program:
+
+    benchmark.py [count] [seed] [output] [baseline]
+"""
+
+import json
+import platform
+import sys
+import time
+import numpy
+
+import solver
+from cubestate import *
+
+# The engines, the size of cube they solve and the names of their phases.
+# The moves of the phases are counted like those of the solutions, half
+# turns as two, so they add up to the solution length for the two-phase
+# search.
+engines = {
+    'cubex': ('cubex', 3, ['top edges', 'top corners', 'middle edges',
+                           'bottom edges orient', 'bottom edges position',
+                           'bottom corners position', 'bottom corners orient',
+                           'centers rotate']),
+    'twophase': ('twophase', 3, ['phase 1', 'phase 2']),
+    'pocket': ('cubex', 2, ['search']),
+}
+
+def corpus(n, count, seed):
+    """The states of 'count' scrambled n*n*n cubes made from 'seed'.
+    """
+    return scrambleStates(n, count, seed, uniform=n == 3)
+
+def distribution(values):
+    """Summarizes a list of numbers by their mean, percentiles and maximum.
+    """
+    values = numpy.asarray(values, dtype=float)
+    if not len(values):
+        return {}
+    p50, p95, p99 = numpy.percentile(values, [50, 95, 99])
+    return {'mean': float(values.mean()), 'p50': float(p50),
+            'p95': float(p95), 'p99': float(p99), 'max': float(values.max())}
+
+def histogram(values):
+    """Counts how often every whole number occurs in a list.
+    """
+    counts = numpy.bincount(numpy.asarray(values, dtype=int))
+    return dict((str(k), int(c)) for k, c in enumerate(counts) if c)
+
+def benchmarkEngine(name, states, maxMoves=22, timeout=1.0):
+    """Solves every state of a corpus with one of the engines, and returns
+    the results as a dict.
+    """
+    engine, n, phaseNames = engines[name]
+    s = solver.Solver(engine=engine, maxMoves=maxMoves, timeout=timeout)
+    state = CubeState(n)
+
+    # The first solve may make the tables of the engine, keep it out
+    if len(states):
+        state.cells[:] = states[0]
+        s.loadCube(state)
+        s.solveCube()
+
+    latencies, lengths, phases = [], [], []
+    failed = wrong = 0
+    start = time.perf_counter()
+    for cells in states:
+        state.cells[:] = cells
+        t = time.perf_counter()
+        s.loadCube(state)
+        solution = s.solveCube()
+        latencies.append(time.perf_counter() - t)
+
+        if not solution and not state.isSolved():
+            failed += 1
+            continue
+        lengths.append(len(solution))
+        phases.append(s.phases)
+
+        state.apply(solution)
+        if not state.isSolved():
+            wrong += 1
+    seconds = time.perf_counter() - start
+
+    phases = numpy.array(phases, dtype=int).reshape(-1, len(phaseNames))
+    return {
+        'engine': engine,
+        'size': n,
+        'count': len(states),
+        'failed': failed,
+        'wrong': wrong,
+        'seconds': seconds,
+        'throughput': len(states) / seconds if seconds else 0.,
+        'latency': dict((k, 1000. * v) for k, v in
+                        distribution(latencies).items()),
+        'moves': dict(distribution(lengths), histogram=histogram(lengths)),
+        'phases': [dict(distribution(phases[:, i]), name=phaseName,
+                        histogram=histogram(phases[:, i]))
+                   for i, phaseName in enumerate(phaseNames)],
+    }
+
+def runBenchmarks(count=100, seed=0, names=None, maxMoves=22, timeout=1.0):
+    """Runs the benchmarks of the engines in 'names', all of them by
+    default, on corpora of 'count' cubes made from 'seed'.
+    """
+    solver.init()
+    names = names or list(engines)
+    states = {}
+    results = {}
+    for name in names:
+        n = engines[name][1]
+        if n not in states:
+            states[n] = corpus(n, count, seed)
+        results[name] = benchmarkEngine(name, states[n], maxMoves, timeout)
+
+    return {
+        'seed': seed,
+        'count': count,
+        'maxMoves': maxMoves,
+        'timeout': timeout,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'engines': results,
+    }
+
+def report(results, baseline=None):
+    """Lines summarizing the results, with the change from the results of
+    a baseline run for the engines it has too.
+    """
+    lines = ["%-10s %9s %9s %9s %9s %7s %6s" % ('engine', 'solves/s',
+             'p50 ms', 'p95 ms', 'p99 ms', 'moves', 'failed')]
+    for name, result in results['engines'].items():
+        latency, moves = result['latency'], result['moves']
+        lines.append("%-10s %9.1f %9.3f %9.3f %9.3f %7.1f %6d" % (
+            name, result['throughput'], latency.get('p50', 0.),
+            latency.get('p95', 0.), latency.get('p99', 0.),
+            moves.get('mean', 0.), result['failed'] + result['wrong']))
+
+        old = (baseline or {}).get('engines', {}).get(name)
+        if old and old['latency'] and latency:
+            lines.append("%-10s %9s %+8.1f%% %+8.1f%% %+8.1f%% %+7.1f" % (
+                '', 'change',
+                100. * (latency['p50'] / old['latency']['p50'] - 1),
+                100. * (latency['p95'] / old['latency']['p95'] - 1),
+                100. * (latency['p99'] / old['latency']['p99'] - 1),
+                moves.get('mean', 0.) - old['moves'].get('mean', 0.)))
+    return lines
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+
+    if len(argv) > 5:
+        print("%s [count] [seed] [output] [baseline]" % argv[0])
+        return 1
+
+    count = int(argv[1]) if len(argv) > 1 else 100
+    seed = int(argv[2]) if len(argv) > 2 else 0
+    output = argv[3] if len(argv) > 3 else 'benchmark.json'
+
+    baseline = None
+    if len(argv) > 4:
+        with open(argv[4]) as f:
+            baseline = json.load(f)
+
+    results = runBenchmarks(count, seed)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    for line in report(results, baseline):
+        print(line)
+    print("Wrote %s" % output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
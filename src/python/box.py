@@ -1,30 +1,40 @@
 import OpenGL.GL as gl
 from math import *
+import numpy
 
 from quaternion import *
-
-def colorFromCoord(c):
-    if c[0] >  0.5: return 3
-    if c[0] < -0.5: return 5
-    if c[1] >  0.5: return 1
-    if c[1] < -0.5: return 6
-    if c[2] >  0.5: return 2
-    if c[2] < -0.5: return 4
-    return 0
-
-def getOpposite(num):
-    if num == 1: return 6
-    if num == 2: return 4
-    if num == 3: return 5
-    if num == 4: return 2
-    if num == 5: return 3
-    if num == 6: return 1
+from cubestate import normals
+
+# The colors facing each side of the cube for every one of the 24 box
+# orientations, in the order of cubeRotations(). Filled in by sideTable()
+# the first time it's needed, as is the table of orientationIndexFromSides().
+boxSides = []
+orientationTable = []
+
+# Finds the sides of every orientation from its rotation matrix: color c
+# faces the side its own normal is turned to.
+def sideTable():
+    if not boxSides:
+        turned = numpy.einsum('kji,cj->kci', rotationMatrices()[:, :3, :3],
+                              normals)
+        faces = (turned @ normals.T).argmax(axis=-1)
+        table = numpy.empty((24, 6), dtype=int)
+        table[numpy.arange(24)[:, None], faces] = numpy.arange(1, 7)
+        boxSides.append(table)
+
+    return boxSides[0]
 
 # The boxes of the cube should be looked upon as "stupid" or "dumb"
 # boxes, only knowing their own rotation around their own
 # axes and their own position relative to the cube center.
+#
+# The orientation of a box is one of the 24 rotations of a cube, kept as
+# an index in a row of an exact Orientations array. The cube shares the
+# array between all its boxes so whole slices get turned at once, a box
+# on its own gets an array of one. Turning a box is a table lookup, so it
+# never drifts however many moves it makes.
 class Box:
-    def __init__(self, listId, id, pos):
+    def __init__(self, listId, id, pos, orientations=None, row=0):
         # The listId is given by the parent cube object and refers
         # to the displaying routine compiled on the GPU for drawing
         # single boxes. A compiled routine is quicker than drawing
@@ -34,46 +44,75 @@ class Box:
 
         self.id = id
 
-        self.rot = Quaternion()
-        
-        # which side points where
-        self.side = [1, 2, 3, 4, 5, 6]
+        if orientations is None:
+            orientations = Orientations(1, exact=True)
+        self.orientations = orientations
+        self.row = row
 
-    # Big Whoop.
-    def drawBox(self):
-        gl.glTranslatef(self.pos[0], self.pos[1], self.pos[2])
+    @property
+    def rot(self):
+        return self.orientations[self.row]
 
-        x, y, z, r = self.rot.getAngleAxis()
-        gl.glRotatef( r, x, y, z )
+    @rot.setter
+    def rot(self, quat):
+        self.orientations.set(self.row, quat.elements)
 
-        gl.glCallList(self.listId)
+    # which side points where
+    @property
+    def side(self):
+        return sideTable()[self.orientations.index[self.row]].tolist()
 
-    # Self explanatory
-    def rotateBox(self, rot):
-        self.rot.rotateEuler( rot )
+    @side.setter
+    def side(self, side):
+        self.orientations.index[self.row] = orientationIndexFromSides([side])[0]
 
-        top = colorFromCoord(self.rot.vertex( [0., 1., 0.] ))
-        front = colorFromCoord(self.rot.vertex( [0., 0., 1.] ))
-        right = colorFromCoord(self.rot.vertex( [1., 0., 0.] ))
+    # Big Whoop. The cube hands in the matrices of every box at once,
+    # looked up in one go from the orientations.
+    def drawBox(self, matrix=None):
+        gl.glTranslatef(self.pos[0], self.pos[1], self.pos[2])
 
+        if matrix is None:
+            matrix = self.orientations.matrices()[self.row]
+        gl.glMultMatrixd(matrix)
 
-        self.side[top-1] = 1
-        self.side[front-1] = 2
-        self.side[right-1] = 3
-        self.side[getOpposite(front)-1] = 4
-        self.side[getOpposite(right)-1] = 5
-        self.side[getOpposite(top)-1] = 6
+        gl.glCallList(self.listId)
 
-# This is the drawing routine of a single box. It should be called from
-# the parent cube object and the returned listId should be given to every
-# new instance of a box object. All the boxes in a cube should have the
-# same listId as all the boxes are in principal equal in design. If, however,
-# there arises a reason for one of the boxes (or more) to have different
-# color or size a new display list will have to be created for these
-# "special" boxes. This is achieved with a new call to "buildBox()", but
-# it's clearly not recommended as the rest of the design relies on identical
-# boxes.
-def buildBox(size=1,
+    # Self explanatory
+    def rotateBox(self, rot):
+        self.orientations.rotateEuler( self.row, rot )
+
+    # Turns the box so that it shows the given colors on each side
+    # of the cube, as kept by the cube's state.
+    def setSide(self, side):
+        self.side = side
+
+# Finds the rotation of a box from the colors facing each side of the
+# cube, as a quaternion.
+def orientationFromSide(side):
+    index = orientationIndexFromSides([side])[0]
+    return tuple(cubeRotations()[0][index])
+
+# The batched version of orientationFromSide, for a (k, 6) array of sides,
+# giving the index of each orientation. A box's orientation only depends on
+# where its top and front colors face, so it's looked up by those two.
+def orientationIndexFromSides(sides):
+    if not orientationTable:
+        table = -numpy.ones((6, 6), dtype=int)
+        for i, side in enumerate(sideTable().tolist()):
+            table[side.index(1), side.index(2)] = i
+        orientationTable.append(table)
+
+    sides = numpy.asarray(sides)
+    top = (sides == 1).argmax(axis=1)
+    front = (sides == 2).argmax(axis=1)
+    return orientationTable[0][top, front]
+
+# The geometry of a box, shared by the display list of buildBox() and the
+# vertex buffers of the instanced renderer. Returns the tuple (faces,
+# outlines, lineMaterial). Every face is a tuple (normal, ambient, diffuse,
+# corners) in the order top, bottom, front, back, left and right, and every
+# outline the four corners of a line loop around a face.
+def boxGeometry(size=1,
         topColor=(1.,1.,1.,1.),
         bottomColor=(0.,1.,0.,1.),
         frontColor=(0.,0.,1.,1.),
@@ -83,8 +122,6 @@ def buildBox(size=1,
         lineColor=(0.,0.,0.,1.)
         ):
 
-    listId = gl.glGenLists(1)
-
     # Offset variables to make vertex positioning easier.
     # This implementation only allows square boxes.
     o1 = (float(size) / 2)
@@ -93,167 +130,88 @@ def buildBox(size=1,
     o1 -= 0.01
     o2 += 0.01
 
-    gl.glNewList(listId, gl.GL_COMPILE)
-
-    gl.glBegin(gl.GL_QUADS)
-
-    ambient = [0.6, 0.6, 0.6, 0.0]
-    specular = [0.3, 0.3, 0.3, 0.0]
-    shininess = [1.0]
-
-    # Top of box
-    #gl.glColor4fv(topColor)
-
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_AMBIENT, ambient)
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_DIFFUSE, topColor)
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_SPECULAR, specular)
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_SHININESS, shininess)
-
-    gl.glNormal3f(0., 1., 0.)
-
-    gl.glVertex3f(o2, o1, o1)
-    gl.glVertex3f(o1, o1, o1)
-    gl.glVertex3f(o1, o1, o2)
-    gl.glVertex3f(o2, o1, o2)
-
-    # Bottom of box
-    #gl.glColor4fv(bottomColor)
-
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_AMBIENT, [0., 0.3, 0., 0.])
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_DIFFUSE, bottomColor)
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_SPECULAR, specular)
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_SHININESS, shininess)
-
-    gl.glNormal3f(0., -1., 0.)
-
-    gl.glVertex3f(o2, o2, o2)
-    gl.glVertex3f(o1, o2, o2)
-    gl.glVertex3f(o1, o2, o1)
-    gl.glVertex3f(o2, o2, o1)
+    faces = [
+        ((0., 1., 0.), [0.6, 0.6, 0.6, 0.0], topColor,
+         [(o2, o1, o1), (o1, o1, o1), (o1, o1, o2), (o2, o1, o2)]),
+        ((0., -1., 0.), [0., 0.3, 0., 0.], bottomColor,
+         [(o2, o2, o2), (o1, o2, o2), (o1, o2, o1), (o2, o2, o1)]),
+        ((0., 0., 1.), [0., 0., 0.3, 0.], frontColor,
+         [(o2, o1, o1), (o2, o2, o1), (o1, o2, o1), (o1, o1, o1)]),
+        ((0., 0., -1.), [0.3, 0., 0., 0.], backColor,
+         [(o1, o1, o2), (o1, o2, o2), (o2, o2, o2), (o2, o1, o2)]),
+        ((-1., 0., 0.), [0.3, 0.3, 0., 0.], leftColor,
+         [(o2, o1, o1), (o2, o1, o2), (o2, o2, o2), (o2, o2, o1)]),
+        ((1., 0., 0.), [0.3, 0.15, 0., 0.], rightColor,
+         [(o1, o1, o2), (o1, o1, o1), (o1, o2, o1), (o1, o2, o2)]),
+    ]
+
+    outlines = [
+        [(o2, o1, o2), (o1, o1, o2), (o1, o1, o1), (o2, o1, o1)],
+        [(o2, o2, o1), (o1, o2, o1), (o1, o2, o2), (o2, o2, o2)],
+        [(o2, o1, o1), (o2, o2, o1), (o1, o2, o1), (o1, o1, o1)],
+        [(o1, o1, o2), (o1, o2, o2), (o2, o2, o2), (o2, o1, o2)],
+        [(o2, o1, o2), (o2, o1, o1), (o2, o2, o1), (o2, o2, o2)],
+        [(o1, o1, o1), (o1, o1, o2), (o1, o2, o2), (o1, o2, o1)],
+    ]
+
+    return faces, outlines, ([0., 0., 0., 0.], lineColor)
+
+# Material of the faces of a box that isn't in boxGeometry(), as it's the
+# same for every face.
+faceSpecular = [0.3, 0.3, 0.3, 0.0]
+faceShininess = [1.0]
+lineSpecular = [0.1, 0.1, 0.1, 0.1]
+lineShininess = [0.1]
 
-    # Front of box
-    #gl.glColor4fv(frontColor)
-
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_AMBIENT, [0., 0., 0.3, 0.])
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_DIFFUSE, frontColor)
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_SPECULAR, specular)
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_SHININESS, shininess)
-
-    gl.glNormal3f(0., 0., 1.)
-
-    gl.glVertex3f(o2, o1, o1)
-    gl.glVertex3f(o2, o2, o1)
-    gl.glVertex3f(o1, o2, o1)
-    gl.glVertex3f(o1, o1, o1)
-
-    # Back of box
-    #gl.glColor4fv(backColor)
-
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_AMBIENT, [0.3, 0., 0., 0.])
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_DIFFUSE, backColor)
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_SPECULAR, specular)
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_SHININESS, shininess)
-
-    gl.glNormal3f(0., 0., -1.)
-
-    gl.glVertex3f(o1, o1, o2)
-    gl.glVertex3f(o1, o2, o2)
-    gl.glVertex3f(o2, o2, o2)
-    gl.glVertex3f(o2, o1, o2)
-
-    # Left of box
-    #gl.glColor4fv(leftColor)
-
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_AMBIENT, [0.3, 0.3, 0., 0.])
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_DIFFUSE, leftColor)
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_SPECULAR, specular)
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_SHININESS, shininess)
+# This is the drawing routine of a single box. It should be called from
+# the parent cube object and the returned listId should be given to every
+# new instance of a box object. All the boxes in a cube should have the
+# same listId as all the boxes are in principal equal in design. If, however,
+# there arises a reason for one of the boxes (or more) to have different
+# color or size a new display list will have to be created for these
+# "special" boxes. This is achieved with a new call to "buildBox()", but
+# it's clearly not recommended as the rest of the design relies on identical
+# boxes.
+def buildBox(size=1, **colors):
+    faces, outlines, lineMaterial = boxGeometry(size, **colors)
 
-    gl.glNormal3f(-1., 0., 0.)
+    listId = gl.glGenLists(1)
 
-    gl.glVertex3f(o2, o1, o1)
-    gl.glVertex3f(o2, o1, o2)
-    gl.glVertex3f(o2, o2, o2)
-    gl.glVertex3f(o2, o2, o1)
+    gl.glNewList(listId, gl.GL_COMPILE)
 
-    # Right of box
-    #gl.glColor4fv(rightColor)
+    gl.glBegin(gl.GL_QUADS)
 
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_AMBIENT, [0.3, 0.15, 0., 0.])
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_DIFFUSE, rightColor)
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_SPECULAR, specular)
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_SHININESS, shininess)
+    for normal, ambient, diffuse, corners in faces:
+        gl.glMaterialfv(gl.GL_FRONT, gl.GL_AMBIENT, ambient)
+        gl.glMaterialfv(gl.GL_FRONT, gl.GL_DIFFUSE, diffuse)
+        gl.glMaterialfv(gl.GL_FRONT, gl.GL_SPECULAR, faceSpecular)
+        gl.glMaterialfv(gl.GL_FRONT, gl.GL_SHININESS, faceShininess)
 
-    norm = vecNormalize(vectDotProduct([o1, o1, o2], [o1, o1, o1]))
-    gl.glNormal3f(1., 0., 0.)
+        gl.glNormal3f(*normal)
 
-    gl.glVertex3f(o1, o1, o2)
-    gl.glVertex3f(o1, o1, o1)
-    gl.glVertex3f(o1, o2, o1)
-    gl.glVertex3f(o1, o2, o2)
+        for corner in corners:
+            gl.glVertex3f(*corner)
 
     gl.glEnd()
     # Done drawing planes of the box
 
     # Create black outlines
+    ambient, lineColor = lineMaterial
     gl.glColor4fv(lineColor)
     lw = float(size * 3)
     gl.glLineWidth(lw)
 
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_AMBIENT, [0., 0., 0., 0.])
+    gl.glMaterialfv(gl.GL_FRONT, gl.GL_AMBIENT, ambient)
     gl.glMaterialfv(gl.GL_FRONT, gl.GL_DIFFUSE, lineColor)
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_SPECULAR, [0.1, 0.1, 0.1, 0.1])
-    gl.glMaterialfv(gl.GL_FRONT, gl.GL_SHININESS, [0.1])
-
-    # Top outline
-    gl.glBegin(gl.GL_LINE_LOOP)
-    gl.glVertex3f(o2, o1, o2)
-    gl.glVertex3f(o1, o1, o2)
-    gl.glVertex3f(o1, o1, o1)
-    gl.glVertex3f(o2, o1, o1)
-    gl.glEnd()
-
-    # Bottom outline
-    gl.glBegin(gl.GL_LINE_LOOP)
-    gl.glVertex3f(o2, o2, o1)
-    gl.glVertex3f(o1, o2, o1)
-    gl.glVertex3f(o1, o2, o2)
-    gl.glVertex3f(o2, o2, o2)
-    gl.glEnd()
+    gl.glMaterialfv(gl.GL_FRONT, gl.GL_SPECULAR, lineSpecular)
+    gl.glMaterialfv(gl.GL_FRONT, gl.GL_SHININESS, lineShininess)
 
-    # Front outline
-    gl.glBegin(gl.GL_LINE_LOOP)
-    gl.glVertex3f(o2, o1, o1)
-    gl.glVertex3f(o2, o2, o1)
-    gl.glVertex3f(o1, o2, o1)
-    gl.glVertex3f(o1, o1, o1)
-    gl.glEnd()
-
-    # Back outline
-    gl.glBegin(gl.GL_LINE_LOOP)
-    gl.glVertex3f(o1, o1, o2)
-    gl.glVertex3f(o1, o2, o2)
-    gl.glVertex3f(o2, o2, o2)
-    gl.glVertex3f(o2, o1, o2)
-    gl.glEnd()
-
-    # Left outline
-    gl.glBegin(gl.GL_LINE_LOOP)
-    gl.glVertex3f(o2, o1, o2)
-    gl.glVertex3f(o2, o1, o1)
-    gl.glVertex3f(o2, o2, o1)
-    gl.glVertex3f(o2, o2, o2)
-    gl.glEnd()
-
-    # Right outline
-    gl.glBegin(gl.GL_LINE_LOOP)
-    gl.glVertex3f(o1, o1, o1)
-    gl.glVertex3f(o1, o1, o2)
-    gl.glVertex3f(o1, o2, o2)
-    gl.glVertex3f(o1, o2, o1)
-    gl.glEnd()
+    for corners in outlines:
+        gl.glBegin(gl.GL_LINE_LOOP)
+        for corner in corners:
+            gl.glVertex3f(*corner)
+        gl.glEnd()
 
     gl.glEndList()
 
     return listId
-
@@ -2,12 +2,16 @@ import OpenGL.GL as gl
 import OpenGL.GLU as glu
 import OpenGL.GLUT as glut
 
+import collections
 import math
 import time
-import random
+import numpy
 
 from box import *
+from renderer import *
 from quaternion import *
+from cubestate import *
+from solutioncache import *
 import solver
 
 """Rounds an angle to the nearest 90 degrees."""
@@ -23,21 +27,23 @@ def round(x):
 # as "stupid" or "dumb" boxes, only knowing their own rotation around their own
 # axes and their own position relative to the cube center.
 class Cube:
-    def __init__(self, nSide):
+    def __init__(self, nSide, instanced=True):
 
-        if nSide < 2 or nSide > 7:
-            raise TypeError("A cube can only be between 2^3 and 7^3 large")
+        if nSide < 2:
+            raise TypeError("A cube has to be at least 2^3 large")
 
-        # A display list ("listId") holds the drawing routine of a box.
+        # A display list ("listId") holds the drawing routine of a box. It
+        # is built on the first draw, so a cube can be made and turned
+        # without OpenGL.
         self.boxSize = 1
-        listId = buildBox(size=self.boxSize)
+        self.listId = None
 
         # Place the cube in a nice position
         self.pos = list((0., 0., - (math.sqrt((nSide ** 2) + (nSide ** 2)) + nSide)))
 
-        # The cube dimension and a list containing the boxes of the cube
+        # The cube dimension and the boxes of the cube, keyed by their id
         self.n = nSide
-        self.boxes = []
+        self.boxes = {}
 
         # Some member variabels containing rotation information. Names should
         # be self explanatory.
@@ -50,79 +56,66 @@ class Cube:
         self.oldMouseX = 0
         self.oldMouseY = 0
         self.moveDir = ""
+        self.moveAxis = None
+        self.moveSign = 1
         self.rotateList = []
-        self.clickable = []
         self.selectedBox = -1
-
-        # A cube is build up of 'boxCount' smaller boxes
-        self.boxCount = nSide ** 3
-
-        for i in range(self.boxCount):
-            excluded = self.excludedBoxes()
-
-            if self.isClickable(i):
-                self.clickable.append(i)
-
-            if not i in excluded:
-                pos = self.positionBox(i)
-                self.boxes.append(Box(listId, i, pos))
-            else:
-                self.boxes.append(0)
+        self.selectedFace = None
+
+        # Turns waiting to be animated, the first one being the turn on
+        # screen, as [axis, layer, angle, target angle, solving] lists. A
+        # quarter turn takes 'turnTime' seconds however often the cube is
+        # drawn, and 'clock' is the time the animation was last advanced to.
+        self.turns = collections.deque()
+        self.turnTime = 0.25
+        self.clock = None
+
+        # The colors of the cube are kept in 'state', the boxes are only
+        # brought up to date with it when drawn. 'facelets' is a buffer
+        # with the visible colors in the order used by the solver, kept
+        # up to date by every move.
+        self.state = CubeState(nSide)
+        self.facelets = self.state.facelets
+        self.dirty = False
+
+        # A cube is build up of 'boxCount' smaller boxes, only the ones on
+        # the surface as the boxes inside are never seen. 'ids' holds their
+        # ids in order and 'rows' the row of every id in 'ids', which is also
+        # its row in 'orientations', the 24 rotations of a cube kept together
+        # in one array, and in the index of the state.
+        self.ids = surfaceBoxes(nSide)
+        self.rows = dict((id, row) for row, id in enumerate(self.ids.tolist()))
+        self.boxCount = len(self.ids)
+        self.orientations = Orientations(self.boxCount, exact=True)
+
+        for row, i in enumerate(self.ids.tolist()):
+            pos = self.positionBox(i)
+            self.boxes[i] = Box(None, i, pos, self.orientations, row)
+
+        # The ids of the boxes in every slice, as slices[axis][layer]
+        coords = numpy.stack([self.ids % nSide, self.ids // nSide % nSide,
+                              self.ids // nSide ** 2], axis=1)
+        self.slices = []
+        for axis in range(3):
+            order = numpy.argsort(coords[:, axis], kind='stable')
+            bounds = numpy.searchsorted(coords[order, axis], range(nSide + 1))
+            self.slices.append([self.ids[order[bounds[l]:bounds[l + 1]]].tolist()
+                                for l in range(nSide)])
+
+        # The boxes are drawn by an InstancedRenderer where OpenGL can, made
+        # on the first draw once there's a context to make it in
+        self.instanced = instanced
+        self.renderer = None
 
         # initiate solver
         solver.init()
 
     def __iter__(self):
-        for i in range(self.boxCount):
-            if self.boxes[i] != 0:
-                yield i
-
-    # These are the boxes that should not be drawn. i.e. the
-    # boxes that would have been in the middle of the cube.
-    def excludedBoxes(self):
-        excluded = []
-        n = self.n
-
-        for i in range(n ** 3):
-            if i >= n ** 2 and i < n ** 3 - n ** 2:
-                tmp = i - ( int( i / n ** 2 ) * n ** 2 )
-
-                if tmp > n and tmp < n ** 2 - n:
-                    if tmp % n != 0 and tmp % n != n - 1:
-                        excluded.append(i)
-
-        return excluded
+        return iter(self.ids.tolist())
 
-    # Calculates if a box in the cube should be clickable and therfore
-    # also a control box for rotation
-    def isClickable(self, id):
-        odd = self.n % 2
-        middle = int( self.n / 2 )
-
-        x = self.findXFromId(id)
-        y = self.findYFromId(id)
-        z = self.findZFromId(id)
-
-        if odd and (x == middle or y == middle or z == middle):
-            return False
-
-        accum = 0
-
-        if x == 0 or x == self.n - 1:
-            accum = accum + 1
-
-        if y == 0 or y == self.n - 1:
-            accum = accum + 1
-
-        if z == 0 or z == self.n - 1:
-            accum = accum + 1
-
-        # If the box is positioned on more than one side
-        # it's automatically clickable
-        if accum >= 2:
-            return True
-
-        return False
+    # Finds the id of the box at a position, the inverse of findRelativePos.
+    def findIdFromPos(self, pos):
+        return pos[0] + pos[1] * self.n + pos[2] * self.n ** 2
 
     def relativeToAbsolutePos(self, relPos):
         pos = []
@@ -158,28 +151,54 @@ class Cube:
     # Dynamically finds the y-position of a box relative
     # to the cube center.
     def findYFromId(self, id):
-        return int( id / self.n ) % self.n
+        return id // self.n % self.n
 
     # Dynamically finds the z-position of a box relative
     # to to the cube center.
     def findZFromId(self, id):
-        return int( id / self.n ** 2 )
+        return id // self.n ** 2
     
+    # The boxes are only turned to match the cube's state when the cube
+    # is drawn, so moves that are never shown cost nothing but the state.
+    def syncBoxes(self):
+        if self.dirty:
+            sides = self.state.cells[self.state.index]
+            self.orientations.index[:] = orientationIndexFromSides(sides)
+            self.dirty = False
+            if self.renderer is not None:
+                self.renderer.update()
+
     # Self explanatory really.
     def drawCube(self):
+        self.syncBoxes()
+
         gl.glPushMatrix()
         self.setUpCubeTransRot()
 
-        # Draw all the boxes
-        for id in range(self.boxCount):
-            if self.boxes[id] == 0:
-                continue
+        if self.instanced and self.renderer is None:
+            self.renderer = InstancedRenderer.create(self)
+            self.instanced = self.renderer is not None
+
+        if self.renderer is not None:
+            self.renderer.turn(self.rotateList, self.sideRot)
+            self.renderer.draw()
+            gl.glPopMatrix()
+            return
 
+        if self.listId is None:
+            self.listId = buildBox(size=self.boxSize)
+            for box in self.boxes.values():
+                box.listId = self.listId
+
+        # Draw all the boxes
+        matrices = self.orientations.matrices()
+        rotating = set(self.rotateList)
+        for row, id in enumerate(self.ids.tolist()):
             gl.glPushMatrix()
-            if id in self.rotateList:
+            if id in rotating:
                 self.setUpSideRot()
 
-            self.boxes[id].drawBox()
+            self.boxes[id].drawBox(matrices[row])
             gl.glPopMatrix()
 
         gl.glPopMatrix()
@@ -221,79 +240,54 @@ class Cube:
     # one of the cube's sides.
     def createRotList(self, axis):
         if len(self.rotateList) == 0:
-            if axis == "y":
-                yVal = self.findYFromId(self.selectedBox)
-                self.rotateList = list()
-                for i in self:
-                    if self.findYFromId(i) == yVal:
-                        self.rotateList.append(i)
-
-            elif axis == "x":
-                xVal = self.findXFromId(self.selectedBox)
-                self.rotateList = list()
-                for i in self:
-                    if self.findXFromId(i) == xVal:
-                        self.rotateList.append(i)
-            else:
-                zVal = self.findZFromId(self.selectedBox)
-                self.rotateList = list()
-                for i in self:
-                    if self.findZFromId(i) == zVal:
-                        self.rotateList.append(i)
+            axis = "xyz".index(axis)
+            layer = self.findRelativePos(self.selectedBox)[axis]
+            self.rotateList = list(self.slices[axis][layer])
+
+    # The axis a side turns around when the face 'face' of a box is dragged
+    # along the window direction (dx, dy), and the sign of the angle the
+    # drag turns it by. The face normal crossed with the drag, both in the
+    # coordinates of the cube, gives the axis; the cube rotation tells how
+    # the drag on screen lies in the cube.
+    def dragAxis(self, face, dx, dy):
+        rotation = matrixArrays(fromEuler(*self.rot).elements)[:3, :3]
+        drag = rotation @ [dx, -dy, 0.]
+        torque = numpy.cross(normals[face], drag)
+        axis = int(numpy.abs(torque).argmax())
+        return "xyz"[axis], 1 if torque[axis] > 0 else -1
 
     # This method takes care of the animation of a rotating side
     # when the user uses the mouse to rotate a side.
     def mouseRotateSide(self, x, y):
         if self.moveDir == "x":
-            # We are rotating around the y-axis by dragging the mouse in
-            # the x-direction. This is along the horizontal line.
-            self.createRotList("y")
-
-            rotVal = self.rotVal
-
-            if x - self.oldMouseX < 1:
-                self.rotateSide("y", -rotVal)
-            elif x - self.oldMouseX > 1:
-                self.rotateSide("y", rotVal)
-
+            delta = x - self.oldMouseX
         elif self.moveDir == "y":
-            # We are rotating around the y-axis or the z-axis depending on
-            # the angle we are looking at the cube from. If we are looking
-            # from the front or the back, rotate around the x-axis, if
-            # we are looking from the left or right side, rotate around the
-            # z-axis.
-            rotVal = self.rotVal
-
-            if round( self.rot[1] ) % 180 == 0:
-                dir = "x"
-                if round( self.rot[1] ) == 180:
-                    rotVal = -rotVal
-
-                self.createRotList("x")
-            else:
-                dir = "z"
-                if round( self.rot[1] ) == 270:
-                    rotVal = -rotVal
-
-                self.createRotList("z")
-
-            if y - self.oldMouseY < 1:
-                self.rotateSide(dir, -rotVal)
-            elif y - self.oldMouseY > 1:
-                self.rotateSide(dir, rotVal)
+            delta = y - self.oldMouseY
         else:
             # We have not yet moved the mouse far enough to determine which
-            # direction the user wants to rotate the side.
-            diffX = abs(x - self.oldMouseX)
-            diffY = abs(y - self.oldMouseY)
+            # direction the user wants to rotate the side. Once we have, the
+            # face the drag started on tells which side turns, and which way.
+            diffX = x - self.oldMouseX
+            diffY = y - self.oldMouseY
 
-            if diffX < 10 and diffY < 10:
+            if abs(diffX) < 10 and abs(diffY) < 10:
                 return
 
-            if diffX > diffY:
+            if abs(diffX) > abs(diffY):
                 self.moveDir = "x"
-            elif diffY > diffX:
+                self.moveAxis, self.moveSign = self.dragAxis(self.selectedFace,
+                                                             1, 0)
+            elif abs(diffY) > abs(diffX):
                 self.moveDir = "y"
+                self.moveAxis, self.moveSign = self.dragAxis(self.selectedFace,
+                                                             0, 1)
+            return
+
+        self.createRotList(self.moveAxis)
+        if delta < 0:
+            self.rotateSide(self.moveAxis, -self.moveSign * self.rotVal)
+        elif delta > 0:
+            self.rotateSide(self.moveAxis, self.moveSign * self.rotVal)
 
     # Callback from the main file for deciding between rotating the cube
     # or rotating one of the sides, depending on if there's a selected
@@ -307,23 +301,19 @@ class Cube:
         self.oldMouseX = x
         self.oldMouseY = y
 
-    # Release of a mouse button. What to do?
+    # Release of a mouse button. A side turned by the mouse is animated
+    # the rest of the way to the nearest quarter turn, or back.
     def mouseUp(self, x, y):
-        # Check to see if we have rotated the side far enough to complete
-        # the animation and register the rotation so that the cube has changed
         if len(self.rotateList) != 0:
-            if self.sideRot[0] % 90 < 5 and self.sideRot[1] % 90 < 5 and self.sideRot[2] % 90 < 5:
-                self.sideRot[0] = round(self.sideRot[0])
-                self.sideRot[1] = round(self.sideRot[1])
-                self.sideRot[2] = round(self.sideRot[2])
-
-                self.registerSideRotation()
-
-                return 1
-            else:
-                return self.snapSideRotation()
+            pos = self.findRelativePos(self.selectedBox)
+            for axis in range(3):
+                if self.sideRot[axis]:
+                    self.queueTurn(axis, pos[axis], round(self.sideRot[axis]),
+                                   self.sideRot[axis])
+                    break
 
-        return 1
+            self.rotateList = []
+            self.sideRot = [0., 0., 0.]
 
     # A Mouse button has been clicked. Take proper action.
     def mouseDown(self, x, y):
@@ -336,30 +326,49 @@ class Cube:
         projectionView = gl.glGetDoublev(gl.GL_PROJECTION_MATRIX)
         viewport = gl.glGetIntegerv(gl.GL_VIEWPORT)
 
-        # Invert y win-coord to match GL-coord and find 3d coords of the click
+        # Invert y win-coord to match GL-coord and find the ray from the
+        # eye through the click, in the coordinates of the cube
         y = viewport[3] - y
-        z = gl.glReadPixels(x, y, 1, 1, gl.GL_DEPTH_COMPONENT, gl.GL_FLOAT)
-        pos3dx, pos3dy, pos3dz = glu.gluUnProject(x, y, z, modelView, projectionView, viewport)
+        near = glu.gluUnProject(x, y, 0., modelView, projectionView, viewport)
+        far = glu.gluUnProject(x, y, 1., modelView, projectionView, viewport)
 
-        # Bias allows us to click close to the boxs' edges
-        bias = 0.01
-        nSize = float(self.boxSize) / 2 + bias
-        selectedBox = -1
+        # If the ray misses the cube we'll just rotate the entire cube
+        # around its own axes.
+        # The same goes while turns are animated, the sides are busy.
         self.moveDir = ""
-
-        # Test for which box has been clicked, if none of the clickables
-        # we'll just rotate the entire cube around its own axes.
-        for i in self.clickable:
-            if (pos3dx >= self.boxes[i].pos[0] - nSize) and \
-                (pos3dx <= self.boxes[i].pos[0] + nSize) and \
-                (pos3dy >= self.boxes[i].pos[1] - nSize) and \
-                (pos3dy <= self.boxes[i].pos[1] + nSize) and \
-                (pos3dz >= self.boxes[i].pos[2] - nSize) and \
-                (pos3dz <= self.boxes[i].pos[2] + nSize):
-                selectedBox = i
-                break
-
-        self.selectedBox = selectedBox
+        self.selectedBox, self.selectedFace = self.pickBox(
+            near, numpy.subtract(far, near))
+        if self.turns:
+            self.selectedBox = -1
+
+    # Finds the box a ray starting outside the cube hits first, and the face
+    # of the cube it hits it on (numbered like the faces of CubeState). The
+    # ray is intersected with the cube as a whole, the point it enters at
+    # tells the box. Returns (-1, None) if the ray misses the cube.
+    def pickBox(self, origin, direction):
+        half = self.n / 2.
+        origin = numpy.asarray(origin, dtype=float)
+        direction = numpy.asarray(direction, dtype=float)
+        direction = numpy.where(direction == 0., 1e-12, direction)
+
+        # Where the ray crosses the planes of each pair of opposite faces
+        low = (-half - origin) / direction
+        high = (half - origin) / direction
+        enter = numpy.minimum(low, high)
+        leave = numpy.maximum(low, high).min()
+
+        axis = int(enter.argmax())
+        if enter[axis] > leave or leave < 0.:
+            return (-1, None)
+
+        hit = origin + enter[axis] * direction
+        pos = numpy.floor([hit[0] + half, half - hit[1], half - hit[2]])
+        pos = numpy.clip(pos, 0, self.n - 1).astype(int).tolist()
+
+        normal = [0, 0, 0]
+        normal[axis] = -1 if direction[axis] > 0 else 1
+        face = [tuple(f) for f in normals.tolist()].index(tuple(normal))
+        return (self.findIdFromPos(pos), face)
 
     def zoomIn(self):
         self.pos[2] = self.pos[2] + 1
@@ -393,244 +402,158 @@ class Cube:
                 return 1
         return 0
 
-    # find previous box when rotated
-    def prevId(self, i):
-        pos = self.findRelativePos(i) 
-        m = self.n - 1
-
-        if self.sideRot[0] == 90.0:
-            z = m - pos[1]
-            pos[1] = pos[2]
-            pos[2] = z
-        elif self.sideRot[0] == -90.0:
-            y = m - pos[2]
-            pos[2] = pos[1]
-            pos[1] = y
-        elif self.sideRot[1] == 90.0:
-            z = m - pos[0]
-            pos[0] = pos[2]
-            pos[2] = z
-        elif self.sideRot[1] == -90.0:
-            x = m - pos[2]
-            pos[2] = pos[0]
-            pos[0] = x
-        elif self.sideRot[2] == 90.0:
-            x = m - pos[1]
-            pos[1] = pos[0]
-            pos[0] = x
-        elif self.sideRot[2] == -90.0:
-            y = m - pos[0]
-            pos[0] = pos[1]
-            pos[1] = y
-
-        return pos[0] + pos[1] * self.n + pos[2] * self.n**2
-
-    # rotate all the boxes in the rotate list
-    def registerSideRotation(self, solving=False):
-        while len(self.rotateList) != 0:
-            last = 0
-            boxId = self.rotateList[0]
-
-            while not last:
-                self.rotateList.remove(boxId)
-                prevBoxId = self.prevId(boxId)
-
-                if prevBoxId in self.rotateList:
-                    self.boxes[prevBoxId].rotateBox(self.sideRot)
-                    relPos = self.findRelativePos(boxId)
-                    self.boxes[prevBoxId].pos = self.relativeToAbsolutePos(relPos)
-
-                    box = self.boxes[boxId]
-                    self.boxes[boxId] = self.boxes[prevBoxId]
-                    self.boxes[prevBoxId] = box
-
-                else:
-                    self.boxes[boxId].rotateBox(self.sideRot)
-                    relPos = self.findRelativePos(boxId)
-                    self.boxes[boxId].pos = self.relativeToAbsolutePos(relPos)
-                    last = 1
-
-                boxId = prevBoxId
-
-        #self.sideRot = Quaternion()
-        self.sideRot = [ 0., 0., 0. ]
+    # Registers a turn of a layer with the state of the cube
+    def registerTurn(self, axis, layer, angle, solving=False):
+        if not round(angle) % 360:
+            return
+
+        self.state.rotate(axis, layer, angle)
+        self.dirty = True
 
         # if we're in auto-solve mode, we don't
         # need to check for correct solution
         if not solving:
-            # check if cube is solved
-            solver.loadCube(self)
-
-            # sorry to say we "only" support solving
-            # of 3x3x3 cubes at this time
-            if self.n == 3:
-                if solver.isSolved() and self.n == 3:
-                    print("Solved")
-                else:
-                    left = len(solver.solveCube())
-                    if (left == 1):
-                        print("One move left!")
-                    elif (left <= 10):
-                        print("%d moves left" % left)
-
-    def snapSideRotation(self):
-        # If the user released the mouse before a complete rotation,
-        # rotate the side to a full 90 degrees in an animation
-        if self.sideRot[0] != 0:
-            if abs(self.sideRot[0]) < 45:
-                if self.sideRot[0] > 0:
-                    self.sideRot[0] = self.sideRot[0] - self.rotVal
-                else:
-                    self.sideRot[0] = self.sideRot[0] + self.rotVal
-            else:
-                if self.sideRot[0] > 0:
-                    self.sideRot[0] = self.sideRot[0] + self.rotVal
-                else:
-                    self.sideRot[0] = self.sideRot[0] - self.rotVal
-
-        elif self.sideRot[1] != 0:
-            if abs(self.sideRot[1]) < 45:
-                if self.sideRot[1] > 0:
-                    self.sideRot[1] = self.sideRot[1] - self.rotVal
-                else:
-                    self.sideRot[1] = self.sideRot[1] + self.rotVal
-            else:
-                if self.sideRot[1] > 0:
-                    self.sideRot[1] = self.sideRot[1] + self.rotVal
-                else:
-                    self.sideRot[1] = self.sideRot[1] - self.rotVal
-
-        elif self.sideRot[2] != 0:
-            if abs(self.sideRot[2]) < 45:
-                if self.sideRot[2] > 0:
-                    self.sideRot[2] = self.sideRot[2] - self.rotVal
-                else:
-                    self.sideRot[2] = self.sideRot[2] + self.rotVal
+            self.showProgress()
+
+    # Tells the user if the cube is solved, or how many moves are left
+    def showProgress(self):
+        # check if cube is solved
+        if self.state.isSolved():
+            print("Solved")
+
+        # bigger cubes take a lot more moves, so the
+        # hint only shows up near the end
+        else:
+            # solving takes seconds past 3x3x3, too long to wait for after
+            # every move, so those only get a hint for a cached solution
+            if self.n <= 3:
+                moves = solutionCache.solve(self)
             else:
-                if self.sideRot[2] > 0:
-                    self.sideRot[2] = self.sideRot[2] + self.rotVal
-                else:
-                    self.sideRot[2] = self.sideRot[2] - self.rotVal
-
-    # scrable the cube by sending a bunch of commands
-    def scramble(self):
-        actions = ('UL', 'UR', 'DL', 'DR', 'LU', 'LD', 'RU', 'RD', 'FC', 'FA', 'BC', 'BA')
-        size = len(actions)
-        
-        random.seed()
-        
-        # 15..30 times seems like an ok amount
-        times = random.randint(15, 30)
-        for i in range(times):
-            rand = random.randint(0, size-1)
-            self.doAction(actions[rand], True, False)
-
-    # Animates an automatic rotation of a side
-    def animateAction(self, dir, angle, drawFunc):
-        steps = angle / (24 * 1)
-        while not self.rotateSide(dir, steps):
-            drawFunc()
-            yawn = 1. / 24.
-            time.sleep(yawn / 2)
-
-    # automated rotation actions
-    def doAction(self, action, solving=False, drawFunc=False):
+                moves = solutionCache.lookup(self.facelets)
+            if moves is None:
+                return
+
+            left = len(moves)
+            if (left == 1):
+                print("One move left!")
+            elif (left <= 10):
+                print("%d moves left" % left)
+
+    # Queues an animated turn of a layer from the angle 'start' to the angle
+    # 'target', in degrees around the x (0), y (1) or z (2) axis.
+    def queueTurn(self, axis, layer, target, start=0., solving=False):
+        if not self.turns:
+            self.clock = None
+        self.turns.append([axis, layer, float(start), float(target), solving])
+
+    # Drops the queued turns, but lets the one on screen finish. With
+    # 'current' that one is dropped too and the cube shown as it is, for
+    # when the state is about to be replaced.
+    def abortTurns(self, current=False):
+        while len(self.turns) > int(not current):
+            self.turns.pop()
+        if current:
+            self.rotateList = []
+            self.sideRot = [0., 0., 0.]
+
+    # Advances the animated turns to the time 'now', in seconds and by
+    # default time.time(). Turns are timed by the clock and not by frames,
+    # so a frame that comes late finishes every turn it is late for and
+    # the next one carries on from where the time puts it. Returns whether
+    # there are turns left to animate.
+    def animate(self, now=None):
+        if now is None:
+            now = time.time()
+        if self.clock is None:
+            self.clock = now
+        elapsed = now - self.clock
+        self.clock = now
+
+        while self.turns:
+            turn = self.turns[0]
+            axis, layer, angle, target, solving = turn
+
+            # The time the rest of this turn takes
+            left = abs(target - angle) / 90. * self.turnTime
+            if elapsed < left:
+                step = elapsed / self.turnTime * 90.
+                turn[2] = angle + (step if target > angle else -step)
+                self.sideRot = [0., 0., 0.]
+                self.sideRot[axis] = turn[2]
+                self.rotateList = self.slices[axis][layer]
+                return True
+
+            elapsed -= left
+            self.turns.popleft()
+            self.rotateList = []
+            self.sideRot = [0., 0., 0.]
+            self.registerTurn(axis, layer, target, solving)
+
+        return False
+
+    # scrambles the cube, the same way for the same seed. A 3x3x3 cube is
+    # put in a state drawn uniformly from all states, bigger ones are
+    # turned by random moves
+    def scramble(self, seed=None):
+        self.abortTurns(True)
+        self.state.cells[:] = scrambleStates(self.n, 1, seed, uniform=self.n == 3)[0]
+        self.dirty = True
+
+    # automated rotation actions, the animated ones
+    # are queued and played by animate()
+    def doAction(self, action, solving=False, animated=False):
         # all these actions are "relative" to
         # the orange face (1, 0, 0)
-        if action == 'UL':      # top left
-            self.selectedBox = 0
-            self.createRotList("y")
-            if drawFunc:
-                self.animateAction("y", -90., drawFunc)
-            else:
-                self.rotateSide("y", -90.)
-            self.registerSideRotation(solving)
-        elif action == 'UR':    # top right
-            self.selectedBox = 0
-            self.createRotList("y")
-            if drawFunc:
-                self.animateAction("y", 90., drawFunc)
-            else:
-                self.rotateSide("y", 90.)
-            self.registerSideRotation(solving)
-        elif action == 'DL':    # bottom left
-            self.selectedBox = 6
-            self.createRotList("y")
-            if drawFunc:
-                self.animateAction("y", -90., drawFunc)
-            else:
-                self.rotateSide("y", -90.)
-            self.registerSideRotation(solving)
-        elif action == 'DR':    # bottom right
-            self.selectedBox = 6
-            self.createRotList("y")
-            if drawFunc:
-                self.animateAction("y", 90., drawFunc)
-            else:
-                self.rotateSide("y", 90.)
-            self.registerSideRotation(solving)
-        elif action == 'LU':    # left up
-            self.selectedBox = 0
-            self.createRotList("z")
-            if drawFunc:
-                self.animateAction("z", 90., drawFunc)
-            else:
-                self.rotateSide("z", 90)
-            self.registerSideRotation(solving)
-        elif action == 'LD':    # left down
-            self.selectedBox = 0
-            self.createRotList("z")
-            if drawFunc:
-                self.animateAction("z", -90., drawFunc)
-            else:
-                self.rotateSide("z", -90)
-            self.registerSideRotation(solving)
-        elif action == 'RU':    # right up
-            self.selectedBox = 18
-            self.createRotList("z")
-            if drawFunc:
-                self.animateAction("z", 90., drawFunc)
-            else:
-                self.rotateSide("z", 90.)
-            self.registerSideRotation(solving)
-        elif action == 'RD':    # right down
-            self.selectedBox = 18
-            self.createRotList("z")
-            if drawFunc:
-                self.animateAction("z", -90., drawFunc)
-            else:
-                self.rotateSide("z", -90)
-            self.registerSideRotation(solving)
-        elif action == 'FC':    # front clockwise
-            self.selectedBox = 2
-            self.createRotList("x")
-            if drawFunc:
-                self.animateAction("x", -90., drawFunc)
-            else:
-                self.rotateSide("x", -90.)
-            self.registerSideRotation(solving)
-        elif action == 'FA':    # front counterclockwise
-            self.selectedBox = 2
-            self.createRotList("x")
-            if drawFunc:
-                self.animateAction("x", 90., drawFunc)
-            else:
-                self.rotateSide("x", 90.)
-            self.registerSideRotation(solving)
-        elif action == 'BC':    # back clockwise
-            self.selectedBox = 0
-            self.createRotList("x")
-            if drawFunc:
-                self.animateAction("x", -90., drawFunc)
-            else:
-                self.rotateSide("x", -90.)
-            self.registerSideRotation(solving)
-        elif action == 'BA':    # back counterclockwise
-            self.selectedBox = 0
-            self.createRotList("x")
-            if drawFunc:
-                self.animateAction("x", 90., drawFunc)
-            else:
-                self.rotateSide("x", 90.)
-            self.registerSideRotation(solving)
+        parsed = parseAction(action)
+        if parsed is None:
+            return
+
+        axis, layer, angle = parsed
+        layer = layer % self.n
 
+        if animated:
+            self.queueTurn(axis, layer, angle, solving=solving)
+        else:
+            self.registerTurn(axis, layer, angle, solving)
+
+    # A whole sequence of actions, such as a solution. It's compiled once,
+    # with the turns that cancel out dropped, and then turns the state in
+    # one go, or queues the turns that are left when animated.
+    def doActions(self, actions, solving=False, animated=False):
+        sequence = compileActions(self.n, actions)
+
+        if animated:
+            for move in sequence.moves:
+                axis, rest = divmod(move, 3 * self.n)
+                layer, turns = divmod(rest, 3)
+                angle = -90. if turns == 2 else 90. * (turns + 1)
+                self.queueTurn(axis, layer, angle, solving=solving)
+        elif len(sequence):
+            self.state.apply(sequence)
+            self.dirty = True
+            if not solving:
+                self.showProgress()
+
+    # The permutation of the state a sequence of actions makes, to compose
+    # with others into new algorithms
+    def permutation(self, actions=()):
+        return Permutation.fromActions(self.n, actions)
+
+    # Applies a Permutation of the state, however many moves made it up
+    def apply(self, permutation, solving=False):
+        self.state.apply(permutation)
+        self.dirty = True
+        if not solving:
+            self.showProgress()
+
+    # The state as bytes, 9 for a 3x3x3 cube, to save or compare states
+    def encode(self):
+        return self.state.encode()
+
+    # Sets the state from the bytes of encode()
+    def decode(self, code):
+        state = CubeState(self.n)
+        state.decode(code)
+        self.abortTurns(True)
+        self.state.cells[:] = state.cells
+        self.dirty = True
@@ -0,0 +1,721 @@
+"""Headless model of the state of a cube.
+
+The state of an n*n*n cube is kept as one flat array of colors with one
+entry per face of every box on the surface of the cube. The first 6*n*n
+entries are the visible facelets, laid out face by face (top, front, right,
+back, left, bottom) in the order the solver expects. The remaining entries
+are the faces pointing into the cube, which only matter when drawing.
+
+A move is a permutation of this array. The entries every move of a cube
+size changes, those of the boxes of one layer, are found once, so applying
+a move only copies those and needs neither OpenGL nor the Box objects of a
+Cube, and scrambleStates makes batches of scrambled states from a seed the
+same way. Whole algorithms are composed into a Permutation, which can be
+inverted, raised to powers and combined into conjugates and commutators,
+and knows its order without applying it over and over.
+
+States are stored and compared by their code. A 3x3x3 state packs into 9
+bytes with the solver extension's encodeFacelets: the way the centers are
+turned and Kociemba's corner and edge coordinates relative to them, see
+statecode.h. Other sizes pack their facelets, three to a
+byte, into 2 * n * n bytes.
+"""
+
+from collections import OrderedDict
+from functools import reduce
+import math
+
+import numpy
+
+import solver
+
+# World direction of the faces 1 to 6 (top, front, right, back, left and
+# bottom). This is the numbering used by Box.side and the solver.
+normals = numpy.array([
+    [ 0,  1,  0],
+    [ 0,  0,  1],
+    [ 1,  0,  0],
+    [ 0,  0, -1],
+    [-1,  0,  0],
+    [ 0, -1,  0],
+])
+
+# A quarter turn (+90 degrees) around the x, y and z axes.
+quarterTurns = numpy.array([
+    [[ 1,  0,  0], [ 0,  0, -1], [ 0,  1,  0]],
+    [[ 0,  0,  1], [ 0,  1,  0], [-1,  0,  0]],
+    [[ 0, -1,  0], [ 1,  0,  0], [ 0,  0,  1]],
+])
+
+# The named actions of Cube.doAction and the solver as (axis, layer, angle).
+# A layer of -1 is the last layer of the axis, whatever the cube size. An
+# action may be followed by a depth to turn an inner layer instead, so 'UL1'
+# turns the layer below the top layer the way 'UL' turns the top layer.
+actionTable = {
+    'UL': (1,  0, -90.),
+    'UR': (1,  0,  90.),
+    'DL': (1, -1, -90.),
+    'DR': (1, -1,  90.),
+    'LU': (2,  0,  90.),
+    'LD': (2,  0, -90.),
+    'RU': (2, -1,  90.),
+    'RD': (2, -1, -90.),
+    'FC': (0, -1, -90.),
+    'FA': (0, -1,  90.),
+    'BC': (0,  0, -90.),
+    'BA': (0,  0,  90.),
+}
+
+_layouts = {}
+_moveTables = {}
+_sequences = OrderedDict()
+_boxColors = []
+_boxKeys = {}
+
+def faceletPosition(n, face, row, col):
+    """Finds the box (x, y, z) showing a facelet. Faces are numbered
+    from 0 (top) to 5 (bottom).
+    """
+    m = n - 1
+    if face == 0: return (row, 0, col)
+    if face == 1: return (col, row, 0)
+    if face == 2: return (m, row, col)
+    if face == 3: return (m - col, row, m)
+    if face == 4: return (0, row, m - col)
+    return (m - row, m, col)
+
+def surfaceBoxes(n):
+    """The ids of the boxes on the surface of an n*n*n cube, in order. The
+    id of the box at (x, y, z) is x + y * n + z * n * n.
+    """
+    grid = numpy.arange(n * n)
+    x, y = grid % n, grid // n
+    ring = grid[(x % (n - 1) == 0) | (y % (n - 1) == 0)]
+
+    layers = [grid] + [ring + z * n * n for z in range(1, n - 1)]
+    return numpy.concatenate(layers + [grid + (n - 1) * n * n])
+
+def layout(n):
+    """Returns the layout of the state array of an n*n*n cube as the
+    tuple (slots, faces, index). 'slots' and 'faces' give the box id and
+    face of every entry. 'index' maps a box on the surface, by its row in
+    surfaceBoxes(n) (see boxRows), and a face to its entry.
+    """
+    if n not in _layouts:
+        slots = []
+        faces = []
+
+        # The visible facelets come first, in the order of the solver
+        for face in range(6):
+            for row in range(n):
+                for col in range(n):
+                    x, y, z = faceletPosition(n, face, row, col)
+                    slots.append(x + y * n + z * n ** 2)
+                    faces.append(face)
+
+        surface = surfaceBoxes(n)
+        index = -numpy.ones((len(surface), 6), dtype=int)
+        index[numpy.searchsorted(surface, slots), faces] = numpy.arange(len(slots))
+
+        # Then the hidden faces of the boxes on the surface
+        rows, hidden = numpy.nonzero(index < 0)
+        index[rows, hidden] = len(slots) + numpy.arange(len(rows))
+        slots = numpy.concatenate([slots, surface[rows]])
+        faces = numpy.concatenate([faces, hidden])
+
+        _layouts[n] = (slots, faces, index)
+
+    return _layouts[n]
+
+def boxRows(n, ids):
+    """The rows in surfaceBoxes(n), and in the index of layout(n), of the
+    boxes 'ids' on the surface of an n*n*n cube.
+    """
+    return numpy.searchsorted(surfaceBoxes(n), ids)
+
+def boxColors():
+    """The colors of a box of the solved cube turned by every one of the 24
+    rotations of a cube, as a (24, 6) array with the colors facing each side
+    in the order of Box.side.
+    """
+    if not _boxColors:
+        faceOf = numpy.zeros(27, dtype=int)
+        faceOf[(normals + 1) @ [9, 3, 1]] = numpy.arange(6)
+
+        rotations = [numpy.identity(3, dtype=int)]
+        for r in rotations:
+            for turn in quarterTurns:
+                t = turn @ r
+                if not any((t == known).all() for known in rotations):
+                    rotations.append(t)
+
+        colors = numpy.empty((len(rotations), 6), dtype=numpy.uint8)
+        for i, r in enumerate(rotations):
+            colors[i, faceOf[(normals @ r.T + 1) @ [9, 3, 1]]] = numpy.arange(1, 7)
+        _boxColors.append(colors)
+
+    return _boxColors[0]
+
+def moveIndex(n, axis, layer, turns):
+    """Finds the row of a move in the move table of an n*n*n cube.
+    'turns' is the number of quarter turns, from 1 to 3.
+    """
+    return (axis * n + layer) * 3 + turns - 1
+
+class MoveTable:
+    """The moves of an n*n*n cube. A move only changes the entries of the
+    boxes in the layer it turns, so only those are kept, which makes the
+    table grow with the surface of the cube rather than with its volume.
+    Row moveIndex(...) holds the pair (targets, sources) of a move, such
+    that the state after the move is the state with state[targets] set to
+    state[sources].
+    """
+    def __init__(self, length, rows):
+        self.length = length
+        self.offsets = numpy.cumsum([0] + [len(t) for t, s in rows])
+        self.targets = numpy.concatenate([t for t, s in rows]).astype(numpy.intp)
+        self.sources = numpy.concatenate([s for t, s in rows]).astype(numpy.intp)
+        self.rows = [(self.targets[start:end], self.sources[start:end])
+                     for start, end in zip(self.offsets[:-1], self.offsets[1:])]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, move):
+        """The permutation of the whole state a move makes, such that the
+        state after the move is state[permutation].
+        """
+        permutation = numpy.arange(self.length)
+        targets, sources = self.rows[move]
+        permutation[targets] = sources
+        return permutation
+
+    def permutations(self, size=None):
+        """The permutations of every move of the first 'size' entries of
+        the state, by default all of them, as one array. Moves keep the
+        visible facelets among themselves, so a size of 6 * n * n gives the
+        permutations of the facelets.
+        """
+        size = size or self.length
+        table = numpy.tile(numpy.arange(size, dtype=numpy.int32), (len(self), 1))
+        for move, (targets, sources) in enumerate(self.rows):
+            keep = targets < size
+            table[move, targets[keep]] = sources[keep]
+        return table
+
+    def applyBatch(self, states, moves):
+        """Applies one move to every state of a batch in place, the move
+        moves[i] to the state states[i]. 'states' is an array of shape
+        (k, length of the state), laid out contiguously.
+        """
+        if not states.flags.c_contiguous:
+            raise ValueError("the states must be contiguous")
+        moves = numpy.asarray(moves)
+        counts = self.offsets[moves + 1] - self.offsets[moves]
+        ends = numpy.cumsum(counts)
+        entries = numpy.arange(ends[-1] if len(ends) else 0) + \
+            numpy.repeat(self.offsets[moves] - ends + counts, counts)
+        first = numpy.repeat(numpy.arange(len(moves)) * states.shape[1], counts)
+
+        flat = states.reshape(-1)
+        flat[first + self.targets[entries]] = flat[first + self.sources[entries]]
+
+def moveTable(n):
+    """Returns the MoveTable of an n*n*n cube.
+    """
+    if n not in _moveTables:
+        slots, faces, index = layout(n)
+        surface = surfaceBoxes(n)
+        m = n - 1
+
+        rel = numpy.stack([slots % n, slots // n % n, slots // n ** 2], axis=1)
+
+        # Doubled world coordinates keep the box centers on integers
+        world = numpy.stack([2 * rel[:, 0] - m,
+                             m - 2 * rel[:, 1],
+                             m - 2 * rel[:, 2]], axis=1)
+        normal = normals[faces]
+
+        # Look up a face from its direction
+        faceOf = numpy.zeros(27, dtype=int)
+        faceOf[(normals + 1) @ [9, 3, 1]] = numpy.arange(6)
+
+        rows = [None] * (9 * n)
+        for axis in range(3):
+            # The entries of every layer of the axis
+            order = numpy.argsort(rel[:, axis], kind='stable')
+            bounds = numpy.searchsorted(rel[order, axis], numpy.arange(n + 1))
+
+            for turns in range(1, 4):
+                r = numpy.linalg.matrix_power(quarterTurns[axis], turns)
+                w = world @ r.T
+                newSlot = ((w[:, 0] + m) // 2 +
+                           (m - w[:, 1]) // 2 * n +
+                           (m - w[:, 2]) // 2 * n ** 2)
+                newFace = faceOf[(normal @ r.T + 1) @ [9, 3, 1]]
+                dest = index[numpy.searchsorted(surface, newSlot), newFace]
+
+                for layer in range(n):
+                    moving = order[bounds[layer]:bounds[layer + 1]]
+                    moving = moving[dest[moving] != moving]
+                    rows[moveIndex(n, axis, layer, turns)] = (dest[moving], moving)
+
+        _moveTables[n] = MoveTable(len(slots), rows)
+
+    return _moveTables[n]
+
+def parseAction(action):
+    """Splits a named action such as 'UL' or 'DR2' into the tuple (axis,
+    layer, angle) of actionTable, with the layer moved in by the depth.
+    Returns None for anything that isn't an action.
+    """
+    if action[:2] not in actionTable:
+        return None
+
+    depth = action[2:]
+    if depth and not depth.isdigit():
+        return None
+
+    axis, layer, angle = actionTable[action[:2]]
+    depth = int(depth or 0)
+    if layer < 0:
+        depth = -depth
+    return (axis, layer + depth, angle)
+
+def actionMove(n, action):
+    """Finds the row in the move table of an n*n*n cube for a named
+    action such as 'UL' or 'FC2'.
+    """
+    axis, layer, angle = parseAction(action)
+    return moveIndex(n, axis, layer % n, int(angle / 90.) % 4)
+
+def moveActions(n, move):
+    """Names a move of an n*n*n cube (a row of its move table) as a list
+    of actions, turning the layer from the nearest side. Half turns take
+    two actions.
+    """
+    axis, rest = divmod(move, 3 * n)
+    layer, turns = divmod(rest, 3)
+    turns = turns + 1
+
+    depth = layer
+    side = 0
+    if layer > (n - 1) // 2:
+        depth = n - 1 - layer
+        side = -1
+
+    angle = 90. if turns != 3 else -90.
+    for name, action in actionTable.items():
+        if action == (axis, side, angle):
+            break
+    if depth:
+        name = name + str(depth)
+    return [name] * (2 if turns == 2 else 1)
+
+def inverseMove(move):
+    """The row of the move table that undoes a move.
+    """
+    return move - move % 3 + 2 - move % 3
+
+def simplifyMoves(n, moves):
+    """Merges the turns of the same layer of an n*n*n cube, dropping the
+    ones that cancel out. Turns around the same axis don't affect each
+    other, so a turn is merged with the last turn of its layer as long as
+    only turns around its axis come between them.
+    """
+    result = []
+    for move in moves:
+        axis = move // (3 * n)
+        i = len(result) - 1
+        while i >= 0 and result[i] // (3 * n) == axis:
+            if result[i] // 3 == move // 3:
+                break
+            i -= 1
+
+        if i >= 0 and result[i] // 3 == move // 3:
+            turns = (result[i] % 3 + move % 3 + 2) % 4
+            if turns:
+                result[i] = move - move % 3 + turns - 1
+            else:
+                del result[i]
+        else:
+            result.append(move)
+    return result
+
+class MoveSequence:
+    """A sequence of moves of an n*n*n cube, simplified once and composed
+    into a single permutation of the state the first time it's applied.
+    Applying it then costs one gather however long the sequence is.
+    """
+    def __init__(self, n, moves):
+        self.n = n
+        self.moves = simplifyMoves(n, moves)
+        self._permutation = None
+
+    def __len__(self):
+        return len(self.moves)
+
+    @property
+    def permutation(self):
+        """The permutation of the whole sequence, such that the state
+        after it is state[permutation].
+        """
+        if self._permutation is None:
+            table = moveTable(self.n)
+            permutation = numpy.arange(table.length)
+            for move in self.moves:
+                targets, sources = table.rows[move]
+                permutation[targets] = permutation[sources]
+            self._permutation = permutation
+        return self._permutation
+
+    def actions(self):
+        """The simplified sequence as named actions.
+        """
+        actions = []
+        for move in self.moves:
+            actions.extend(moveActions(self.n, move))
+        return actions
+
+class Permutation:
+    """A permutation of the state of an n*n*n cube, such that the state
+    after it is state[array]. Permutations compose with '*' in the order
+    they are applied, so a * b is a followed by b.
+    """
+    def __init__(self, n, array=None):
+        self.n = n
+        if array is None:
+            array = numpy.arange(len(layout(n)[0]))
+        self.array = array
+        self._cycles = None
+
+    @classmethod
+    def fromActions(cls, n, actions):
+        """The permutation of named actions, compiled by compileActions.
+        """
+        return cls(n, compileActions(n, actions).permutation)
+
+    def __mul__(self, other):
+        return Permutation(self.n, self.array[other.array])
+
+    def __pow__(self, k):
+        """Applying the permutation k times, by repeated squaring. A
+        negative k applies the inverse.
+        """
+        base = self if k >= 0 else self.inverse()
+        k = abs(k)
+        result = Permutation(self.n)
+        while k:
+            if k & 1:
+                result = result * base
+            base = base * base
+            k >>= 1
+        return result
+
+    def __eq__(self, other):
+        if not isinstance(other, Permutation):
+            return NotImplemented
+        return self.n == other.n and bool((self.array == other.array).all())
+
+    def __hash__(self):
+        return hash((self.n, self.array.tobytes()))
+
+    def inverse(self):
+        array = numpy.empty_like(self.array)
+        array[self.array] = numpy.arange(len(self.array))
+        return Permutation(self.n, array)
+
+    def conjugate(self, setup):
+        """setup, then this permutation, then setup undone.
+        """
+        return setup * self * setup.inverse()
+
+    def commutator(self, other):
+        """This permutation, then other, then both undone in that order.
+        """
+        return self * other * self.inverse() * other.inverse()
+
+    def isIdentity(self):
+        return bool((self.array == numpy.arange(len(self.array))).all())
+
+    def cycles(self):
+        """The cycles of the permutation of length two or more, each as an
+        array of the entries of the state it moves, in order.
+        """
+        if self._cycles is None:
+            seen = self.array == numpy.arange(len(self.array))
+            cycles = []
+            for start in numpy.nonzero(~seen)[0].tolist():
+                if seen[start]:
+                    continue
+                cycle = [start]
+                seen[start] = True
+                entry = int(self.array[start])
+                while entry != start:
+                    cycle.append(entry)
+                    seen[entry] = True
+                    entry = int(self.array[entry])
+                cycles.append(numpy.array(cycle))
+            self._cycles = cycles
+        return self._cycles
+
+    def order(self):
+        """The number of times the permutation has to be applied to get
+        back to where it started. Every box counts, so a center turned in
+        place isn't back until it faces the way it started.
+        """
+        return reduce(math.lcm, [len(c) for c in self.cycles()], 1)
+
+    def period(self, cells=None):
+        """The number of times the permutation has to be applied to a state,
+        by default the solved state, until its visible facelets look the
+        same again. Facelets of the same color can swap places unseen, so
+        this can be less than the order.
+        """
+        if cells is None:
+            cells = layout(self.n)[1] + 1
+        size = 6 * self.n ** 2
+
+        periods = []
+        for cycle in self.cycles():
+            if cycle[0] >= size:
+                continue
+            colors = cells[cycle]
+            length = len(cycle)
+            for shift in range(1, length + 1):
+                if length % shift == 0 and \
+                        (numpy.roll(colors, shift) == colors).all():
+                    periods.append(shift)
+                    break
+        return reduce(math.lcm, periods, 1)
+
+def compileActions(n, actions, cacheSize=256):
+    """Compiles named actions for an n*n*n cube, given as a list or as one
+    string separated by spaces or dots, into a MoveSequence. The most
+    recently compiled sequences are cached, so replaying a stored solution
+    is a lookup. Raises ValueError for anything that isn't an action.
+    """
+    if isinstance(actions, str):
+        actions = actions.replace('.', ' ').split()
+    key = (n, tuple(actions))
+
+    if key in _sequences:
+        _sequences.move_to_end(key)
+        return _sequences[key]
+
+    moves = []
+    for action in actions:
+        if parseAction(action) is None:
+            raise ValueError("%r is not an action" % (action,))
+        moves.append(actionMove(n, action))
+
+    sequence = MoveSequence(n, moves)
+    _sequences[key] = sequence
+    while len(_sequences) > cacheSize:
+        _sequences.popitem(last=False)
+    return sequence
+
+def packFacelets(facelets):
+    """Packs the facelets of cubes of any size, an array of colors whose
+    last axis holds the 6 * n * n facelets of a cube, three to a byte.
+    """
+    digits = numpy.asarray(facelets, dtype=int) - 1
+    digits = digits.reshape(digits.shape[:-1] + (-1, 3))
+    return (digits @ [36, 6, 1]).astype(numpy.uint8)
+
+def unpackFacelets(packed):
+    """The facelets of packFacelets back as colors.
+    """
+    packed = numpy.asarray(packed, dtype=numpy.uint8)
+    digits = packed[..., None] // numpy.array([36, 6, 1], dtype=numpy.uint8) % 6
+    return (digits + 1).reshape(packed.shape[:-1] + (-1,))
+
+def applyMoves(states, moves, n):
+    """Applies a sequence of moves (rows of the move table) to a batch of
+    states, given as an array of shape (k, length of the state).
+    """
+    table = moveTable(n)
+    states = numpy.array(states)
+    for move in moves:
+        targets, sources = table.rows[move]
+        states[:, targets] = states[:, sources]
+    return states
+
+def faceletCells(n, facelets):
+    """The states of a batch of n*n*n cubes from their visible facelets
+    alone, an array of shape (k, 6 * n * n), as an array of shape (k,
+    length of the state). Every box is turned the way its facelets show,
+    which also tells the faces inside the cube, and a center box that fits
+    several ways is turned the first way that fits. Raises ValueError if a
+    box fits no way.
+    """
+    slots, faces, entries = layout(n)
+    visible = entries < 6 * n ** 2
+    facelets = numpy.asarray(facelets, dtype=numpy.uint8)
+    shown = facelets[:, numpy.where(visible, entries, 0)]
+
+    # The colors a box shows, read as a number, against those of the box
+    # turned every way
+    if n not in _boxKeys:
+        digits = numpy.where(visible, 7 ** numpy.arange(6), 0)
+        _boxKeys[n] = (digits, boxColors().astype(int) @ digits.T)
+    digits, keys = _boxKeys[n]
+    colors = boxColors()
+    fits = keys.T == (shown * digits).sum(axis=2)[:, :, None]
+    if not fits.any(axis=2).all():
+        raise ValueError("the facelets are not a cube")
+
+    cells = numpy.empty((len(facelets), len(faces)), dtype=numpy.uint8)
+    cells[:, entries] = colors[fits.argmax(axis=2)]
+    return cells
+
+def scrambleStates(n, count, seed=None, moves=None, uniform=False, out=None):
+    """Scrambles a batch of 'count' n*n*n cubes at once and returns their
+    states, an array of shape (count, length of the state) like those of
+    applyMoves. The states follow from 'seed' alone, so the same seed
+    always gives the same states.
+
+    Every cube is turned by 'moves' random moves, by default 10 per layer,
+    each turning one layer about another axis than the move before. With
+    'uniform' the states of a 3x3x3 cube are drawn uniformly from all the
+    states it can be in instead, by solver.randomFacelets, so their
+    facelets are those it gives for the same seed. 'out' is an array to
+    write the states to.
+    """
+    if uniform and n != 3:
+        raise ValueError("uniform states need a 3*3*3 cube")
+
+    rng = numpy.random.default_rng(seed)
+    table = moveTable(n)
+    if moves is None:
+        moves = 10 * n
+    if out is None:
+        out = numpy.empty((count, table.length), dtype=numpy.uint8)
+    solved = CubeState(n).cells
+
+    if uniform:
+        facelets = solver.randomFacelets(count, None if seed is None else int(seed))
+        facelets = numpy.frombuffer(facelets, dtype=numpy.uint8).reshape(count, 54)
+
+    # Turns a chunk of cubes at a time, to bound the size of the gathers
+    for start in range(0, count, 4096):
+        k = len(out[start:start + 4096])
+        if uniform:
+            out[start:start + k] = faceletCells(n, facelets[start:start + k])
+            continue
+
+        axes = rng.integers(1, 3, size=(k, moves))
+        if moves:
+            axes[:, 0] = rng.integers(3, size=k)
+        axes = axes.cumsum(axis=1) % 3
+        rows = moveIndex(n, axes, rng.integers(n, size=(k, moves)),
+                         rng.integers(1, 4, size=(k, moves)))
+
+        states = numpy.tile(solved, (k, 1))
+        for j in range(moves):
+            table.applyBatch(states, rows[:, j])
+        out[start:start + k] = states
+
+    return out
+
+class CubeState:
+    """The colors of every face of every box of an n*n*n cube, without any
+    of the drawing state of a Cube.
+    """
+    def __init__(self, n):
+        self.n = n
+        self.slots, self.faces, self.index = layout(n)
+        self.moves = moveTable(n)
+        self.size = 6 * n ** 2
+
+        # Moves update 'cells' in place, so 'facelets' (the visible facelets,
+        # face by face in the order of the solver) stays a view of the
+        # current state that can be handed out once and read directly.
+        self.cells = numpy.empty(len(self.faces), dtype=numpy.uint8)
+        self.facelets = self.cells[:self.size]
+        self.reset()
+
+    def reset(self):
+        """Puts the cube back in its solved state.
+        """
+        self.cells[:] = self.faces + 1
+
+    def side(self, id):
+        """The color facing each side of the cube for the box 'id', in the
+        same form as Box.side.
+        """
+        return self.cells[self.index[boxRows(self.n, id)]].tolist()
+
+    def move(self, move):
+        """Applies a move given by its row in the move table.
+        """
+        targets, sources = self.moves.rows[move]
+        self.cells[targets] = self.cells[sources]
+
+    def rotate(self, axis, layer, angle):
+        """Rotates a layer around the x (0), y (1) or z (2) axis. The angle
+        is in degrees and is rounded to a number of quarter turns.
+        """
+        turns = int(numpy.round(angle / 90.)) % 4
+        if turns:
+            self.move(moveIndex(self.n, axis, layer, turns))
+
+    def doAction(self, action):
+        """Applies a named action such as 'UL' or 'FC'.
+        """
+        self.move(actionMove(self.n, action))
+
+    def apply(self, sequence):
+        """Applies a Permutation, a MoveSequence, or named actions compiled
+        into one.
+        """
+        if isinstance(sequence, Permutation):
+            permutation = sequence.array
+        elif isinstance(sequence, MoveSequence):
+            permutation = sequence.permutation
+        else:
+            permutation = compileActions(self.n, sequence).permutation
+        self.cells.take(permutation, out=self.cells)
+
+    def setFacelets(self, facelets):
+        """Sets the state from its visible facelets alone, see faceletCells.
+        """
+        self.cells[:] = faceletCells(self.n, [facelets])[0]
+
+    def encode(self):
+        """The state as bytes, the same for every state that looks the
+        same, so it can be stored, compared and hashed.
+        """
+        if self.n == 3:
+            return solver.encodeFacelets(bytes(self.facelets))
+        return packFacelets(self.facelets).tobytes()
+
+    def decode(self, code):
+        """Sets the state from the bytes of encode().
+        """
+        if self.n == 3:
+            if len(code) != 9:
+                raise ValueError("not the code of a cube")
+            facelets = numpy.frombuffer(solver.decodeFacelets(code), dtype=numpy.uint8)
+        else:
+            facelets = unpackFacelets(numpy.frombuffer(code, dtype=numpy.uint8))
+            if len(facelets) != self.size:
+                raise ValueError("not the code of a %d*%d*%d cube" % ((self.n,) * 3))
+        self.setFacelets(facelets)
+
+    def __eq__(self, other):
+        """States are equal when they look the same, whichever way their
+        center boxes are turned.
+        """
+        return (isinstance(other, CubeState) and self.n == other.n and
+                (self.facelets == other.facelets).all())
+
+    def __hash__(self):
+        """Hashes the facelets, like __eq__ compares them. Moves change the
+        hash, so a state shouldn't be moved while it's a key of a dict.
+        """
+        return hash(self.facelets.tobytes())
+
+    def isSolved(self):
+        facelets = self.facelets.reshape(6, self.n ** 2)
+        return bool((facelets == facelets[:, :1]).all())
@@ -0,0 +1,157 @@
+"""Timing of the frames drawn by the GLUT client.
+
+A FrameStats keeps the last few hundred frames: what asked for each one
+(a key, a mouse move, the animation), how long each part of it took, and
+whether it was redundant, drawing the same scene as the frame before.
+Redundant frames are the redraw storms of a drag that doesn't move
+anything. While the stats are shown, a GLCallCounter also counts the
+OpenGL calls of every frame.
+
+The stats are shown on screen or printed once a second, and summed up
+when the program ends.
+"""
+
+import collections
+import time
+import numpy
+
+import OpenGL.GL as gl
+import OpenGL.GLU as glu
+
+Frame = collections.namedtuple('Frame', 'source start laps calls redundant')
+
+class GLCallCounter:
+    """Counts the calls made to the functions of OpenGL modules. While
+    installed, every gl function of the modules is replaced by one that
+    counts its calls before making them, so code calling them through the
+    module, like gl.glVertex3f, is counted.
+    """
+    def __init__(self, modules=(gl, glu)):
+        self.modules = modules
+        self.count = 0
+        self.originals = []
+
+    def install(self):
+        if self.originals:
+            return
+        for module in self.modules:
+            for name in dir(module):
+                function = getattr(module, name)
+                if name.startswith('gl') and callable(function):
+                    self.originals.append((module, name, function))
+                    setattr(module, name, self.counted(function))
+
+    def counted(self, function):
+        def call(*args, **kwargs):
+            self.count += 1
+            return function(*args, **kwargs)
+        return call
+
+    def uninstall(self):
+        for module, name, function in self.originals:
+            setattr(module, name, function)
+        self.originals = []
+
+class FrameStats:
+    """The times of the last 'window' frames. A frame begins with the
+    callback asking for it and is timed in laps, named after the part of
+    the frame that just ended, up to its end.
+    """
+    modes = ('off', 'screen', 'stdout')
+
+    def __init__(self, window=300, clock=time.perf_counter, counter=None):
+        self.frames = collections.deque(maxlen=window)
+        self.clock = clock
+        self.counter = counter or GLCallCounter()
+        self.mode = 'off'
+        self.current = None
+        self.scene = None
+        self.printed = 0.
+
+    def begin(self, source):
+        """Begins a frame asked for by 'source', before the model is
+        updated for it.
+        """
+        now = self.clock()
+        self.current = (source, now, [], self.counter.count, now)
+
+    def lap(self, name):
+        """Ends the part of the frame called 'name'.
+        """
+        if self.current is None:
+            self.begin('display')
+        source, start, laps, calls, last = self.current
+        now = self.clock()
+        laps.append((name, now - last))
+        self.current = (source, start, laps, calls, now)
+
+    def end(self, scene=None):
+        """Ends the frame. 'scene' is anything telling what was drawn, the
+        frame is redundant if it's the same as that of the frame before.
+        """
+        if self.current is None:
+            return
+        source, start, laps, calls, last = self.current
+        counted = self.counter.count - calls if self.counter.originals else None
+        redundant = scene is not None and scene == self.scene
+
+        self.frames.append(Frame(source, start, collections.OrderedDict(laps),
+                                 counted, redundant))
+        self.scene = scene
+        self.current = None
+
+        if self.mode == 'stdout' and last - self.printed >= 1.:
+            self.printed = last
+            print(self.summary()[0])
+
+    def invalidate(self):
+        """Makes the next frame count as needed, when something outside
+        the scene, like the size of the window, changed.
+        """
+        self.scene = None
+
+    def toggle(self):
+        """Shows the stats on screen, then on stdout, then not at all. GL
+        calls are only counted while they're shown.
+        """
+        self.mode = self.modes[(self.modes.index(self.mode) + 1) % len(self.modes)]
+        if self.mode == 'off':
+            self.counter.uninstall()
+        else:
+            self.counter.install()
+        return self.mode
+
+    def summary(self):
+        """Lines summing up the frames kept.
+        """
+        frames = list(self.frames)
+        if not frames:
+            return ["no frames"]
+
+        span = frames[-1].start - frames[0].start
+        redundant = len([f for f in frames if f.redundant])
+        lines = ["%d frames, %.1f fps, %d redundant (%.0f%%)" % (
+            len(frames), (len(frames) - 1) / span if span > 0 else 0.,
+            redundant, 100. * redundant / len(frames))]
+
+        names = []
+        for frame in frames:
+            names.extend(name for name in frame.laps if name not in names)
+        for name in names:
+            times = 1000. * numpy.array([f.laps[name] for f in frames
+                                         if name in f.laps])
+            lines.append("%-8s mean %6.2f ms  p95 %6.2f ms  max %6.2f ms" % (
+                name, times.mean(), numpy.percentile(times, 95), times.max()))
+
+        calls = [f.calls for f in frames if f.calls is not None]
+        if calls:
+            lines.append("gl calls mean %.0f  max %d per frame" % (
+                numpy.mean(calls), numpy.max(calls)))
+
+        sources = collections.OrderedDict()
+        for frame in frames:
+            count, wasted = sources.get(frame.source, (0, 0))
+            sources[frame.source] = (count + 1, wasted + frame.redundant)
+        lines.append(', '.join("%s %d (%d redundant)" % (source, count, wasted)
+                               for source, (count, wasted) in sources.items()))
+        return lines
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+"""Microbenchmarks of the moves of the cube model.
+
+Measures how many times a second the model can do the steps a move goes
+through, for every cube size from 2 to 7: the named actions of
+Cube.doAction, a mouse turn of a side through createRotList and
+registerTurn, the moves of the CubeState underneath, turning the boxes
+to match the state when drawing, Box.rotateBox, and the time Cube(n)
+takes to make. The Quaternion operations don't depend on the size and
+are measured once. None of it needs an OpenGL context or a window.
+
+The results are written as JSON, and a run can be compared against the
+JSON of an earlier one.
+
+Run as a program:
+
+    microbenchmark.py [output] [baseline]
+"""
+
+import json
+import platform
+import sys
+import time
+import numpy
+
+from cube import Cube
+from cubestate import moveActions
+from quaternion import Quaternion, fromEuler, fromXYZR
+
+sizes = range(2, 8)
+
+def rate(function, calls, minTime=0.1, repeat=3):
+    """How many times a second 'function' runs, called with every tuple of
+    arguments in 'calls' in turn, over and over for at least 'minTime'
+    seconds. The best of 'repeat' such rounds is taken, since anything
+    slowing the others down is noise. The first call is made before, to
+    warm up any caches.
+    """
+    function(*calls[0])
+    best = 0.
+    for i in range(repeat):
+        count = 0
+        start = time.perf_counter()
+        while True:
+            for args in calls:
+                function(*args)
+            count += len(calls)
+            elapsed = time.perf_counter() - start
+            if elapsed >= minTime:
+                break
+        best = max(best, count / elapsed)
+    return best
+
+def benchmarkSize(n, minTime=0.05, seed=0):
+    """Measures the moves of an n*n*n cube. Returns a dict of the name of
+    every benchmark to the number of times a second it runs.
+    """
+    rng = numpy.random.default_rng(seed)
+    cube = Cube(n)
+    moves = rng.integers(len(cube.state.moves), size=200)
+    actions = [(name, True) for move in moves
+               for name in moveActions(n, move)]
+    turns = [(int(axis), int(layer), 90., True) for axis, layer in
+             zip(rng.integers(3, size=200), rng.integers(n, size=200))]
+    picks = [(int(id), "xyz"[axis]) for id, axis in
+             zip(rng.choice(cube.ids, size=200), rng.integers(3, size=200))]
+
+    def mouseTurn(id, axis):
+        cube.selectedBox = id
+        cube.rotateList = []
+        cube.createRotList(axis)
+        axis = "xyz".index(axis)
+        cube.registerTurn(axis, cube.findRelativePos(id)[axis], 90., True)
+
+    def syncBoxes():
+        cube.dirty = True
+        cube.syncBoxes()
+
+    results = {
+        'construct': rate(Cube, [(n,)] * 2, minTime),
+        'doAction': rate(cube.doAction, actions, minTime),
+        'mouseTurn': rate(mouseTurn, picks, minTime),
+        'registerTurn': rate(cube.registerTurn, turns, minTime),
+        'stateMove': rate(cube.state.move, [(int(m),) for m in moves], minTime),
+        'syncBoxes': rate(syncBoxes, [()], minTime),
+        'rotateBox': rate(lambda id, axis: cube.boxes[id].rotateBox((90., 0., 0.)),
+                          picks, minTime),
+    }
+    return results
+
+def benchmarkQuaternion(minTime=0.05):
+    """Measures the Quaternion operations, returns a dict of the name of
+    every benchmark to the number of times a second it runs.
+    """
+    a = fromEuler(30., -40., 10.)
+    b = fromXYZR((0., 1., 0.), 90.)
+    return {
+        'multiply': rate(a.__mul__, [(b,)], minTime),
+        'normalize': rate(a.normalize, [()], minTime),
+        'rotateEuler': rate(Quaternion().rotateEuler, [((90., 0., 0.),)],
+                            minTime),
+        'matrix': rate(a.matrix, [()], minTime),
+        'slerp': rate(a.slerp, [(b, 0.5)], minTime),
+    }
+
+def runBenchmarks(minTime=0.05, seed=0):
+    """Runs the benchmarks of every size and of the quaternions.
+    """
+    return {
+        'minTime': minTime,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sizes': dict((str(n), benchmarkSize(n, minTime, seed)) for n in sizes),
+        'quaternion': benchmarkQuaternion(minTime),
+    }
+
+def report(results, baseline=None):
+    """Lines of a table of the results in calls a second, with the speedup
+    over the results of a baseline run where it has the same benchmark.
+    """
+    def cell(value, old):
+        if not old:
+            return "%16.0f" % value
+        return "%16s" % ("%.0f x%.2f" % (value, value / old))
+
+    old = baseline or {'sizes': {}, 'quaternion': {}}
+    columns = list(results['sizes'])
+    names = list(results['sizes'][columns[0]])
+
+    lines = ["%-18s" % 'calls/s' + ''.join("%16s" % ("n=" + n)
+                                             for n in columns)]
+    for name in names:
+        lines.append("%-18s" % name + ''.join(
+            cell(results['sizes'][n][name],
+                 old['sizes'].get(n, {}).get(name)) for n in columns))
+    lines.append('')
+    for name, value in results['quaternion'].items():
+        lines.append("%-18s" % ('quat ' + name) +
+                     cell(value, old['quaternion'].get(name)))
+    return lines
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+
+    if len(argv) > 3:
+        print("%s [output] [baseline]" % argv[0])
+        return 1
+
+    output = argv[1] if len(argv) > 1 else 'microbenchmark.json'
+    baseline = None
+    if len(argv) > 2:
+        with open(argv[2]) as f:
+            baseline = json.load(f)
+
+    results = runBenchmarks()
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    for line in report(results, baseline):
+        print(line)
+    print("Wrote %s" % output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+"""Drawing cubes without a window.
+
+The OffscreenRenderer draws into an EGL pbuffer, which needs neither a
+display nor GLUT, so images of cubes can be made on a headless server.
+One context is made per renderer and then reused for every state it
+draws, with the same cube and its instance buffer.
+
+PyOpenGL picks the platform it talks to when it's first imported, so this
+module has to be imported before OpenGL, or the cube module, is. On Mesa
+it asks for the surfaceless EGL platform, which needs no display at all.
+
+Run as a program it writes images of random cubes:
+
+    offscreen.py [size] [count] [directory]
+"""
+
+import os
+os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+import ctypes
+import struct
+import sys
+import zlib
+import numpy
+
+import OpenGL.platform
+import OpenGL.GL as gl
+from OpenGL import EGL
+
+from cube import *
+import rubik
+
+def writePng(path, pixels):
+    """Writes an (height, width, 3) array of 8 bit RGB pixels to a PNG
+    file, top row first.
+    """
+    pixels = numpy.ascontiguousarray(pixels, dtype=numpy.uint8)
+    height, width = pixels.shape[:2]
+
+    # Every row starts with the filter type, 0 for none
+    rows = numpy.zeros((height, width * 3 + 1), dtype=numpy.uint8)
+    rows[:, 1:] = pixels.reshape(height, width * 3)
+
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height,
+                                           8, 2, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(rows.tobytes())))
+        f.write(chunk(b'IEND', b''))
+
+def randomStates(n, count, moves=30, seed=None):
+    """A batch of 'count' random states of an n*n*n cube, as an array of
+    shape (count, length of the state), each 'moves' random moves away
+    from the solved state.
+    """
+    return scrambleStates(n, count, seed, moves)
+
+class OffscreenRenderer:
+    """Draws cubes into an offscreen EGL surface of width * height pixels
+    and reads them back as arrays.
+    """
+    def __init__(self, width=400, height=400):
+        if 'egl' not in type(OpenGL.platform.PLATFORM).__name__.lower():
+            raise RuntimeError("Offscreen rendering needs EGL, import "
+                               "offscreen before OpenGL")
+
+        self.width = width
+        self.height = height
+
+        self.display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        if not EGL.eglInitialize(self.display, ctypes.pointer(major),
+                                 ctypes.pointer(minor)):
+            raise RuntimeError("Offscreen rendering needs EGL, there is "
+                               "no EGL display")
+
+        attributes = [EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+                      EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8,
+                      EGL.EGL_BLUE_SIZE, 8, EGL.EGL_DEPTH_SIZE, 24,
+                      EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+                      EGL.EGL_NONE]
+        config = EGL.EGLConfig()
+        count = EGL.EGLint()
+        if not (EGL.eglChooseConfig(self.display,
+                    (EGL.EGLint * len(attributes))(*attributes),
+                    ctypes.pointer(config), 1, ctypes.pointer(count)) and
+                count.value):
+            raise RuntimeError("Offscreen rendering needs EGL, there is "
+                               "no EGL configuration to draw with")
+
+        size = [EGL.EGL_WIDTH, width, EGL.EGL_HEIGHT, height, EGL.EGL_NONE]
+        self.surface = EGL.eglCreatePbufferSurface(self.display, config,
+                (EGL.EGLint * len(size))(*size))
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        self.context = EGL.eglCreateContext(self.display, config,
+                                            EGL.EGL_NO_CONTEXT, None)
+        EGL.eglMakeCurrent(self.display, self.surface, self.surface,
+                           self.context)
+
+        # The same scene as the window of rubik.py
+        rubik.initGL()
+        rubik.resizeGLScene(width, height)
+
+    def render(self, cube):
+        """Draws a cube and returns the image as an (height, width, 3)
+        array of 8 bit RGB pixels, top row first.
+        """
+        gl.glLoadIdentity()
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
+        cube.drawCube()
+
+        gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+        data = gl.glReadPixels(0, 0, self.width, self.height, gl.GL_RGB,
+                               gl.GL_UNSIGNED_BYTE)
+        pixels = numpy.frombuffer(data, dtype=numpy.uint8)
+        return pixels.reshape(self.height, self.width, 3)[::-1]
+
+    def renderStates(self, n, states, rot=(30., -40., 0.)):
+        """Draws a batch of states of an n*n*n cube, given as an array of
+        shape (k, length of the state) like those of applyMoves, seen from
+        the angles 'rot'. Yields the image of every state in turn.
+        """
+        cube = Cube(n)
+        cube.rot = list(rot)
+        for state in states:
+            cube.state.cells[:] = state
+            cube.dirty = True
+            yield self.render(cube)
+
+    def close(self):
+        EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE,
+                           EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+        EGL.eglDestroyContext(self.display, self.context)
+        EGL.eglDestroySurface(self.display, self.surface)
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+
+    if len(argv) > 4:
+        print("%s [size] [count] [directory]" % argv[0])
+        return 1
+
+    size = int(argv[1]) if len(argv) > 1 else 3
+    count = int(argv[2]) if len(argv) > 2 else 1
+    directory = argv[3] if len(argv) > 3 else '.'
+
+    renderer = OffscreenRenderer()
+    states = randomStates(size, count)
+    for k, pixels in enumerate(renderer.renderStates(size, states)):
+        writePng(os.path.join(directory, 'cube%04d.png' % k), pixels)
+    renderer.close()
+
+    print("Wrote %d images of %d*%d*%d cubes" % (count, size, size, size))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -1,3 +1,4 @@
+import numpy
 from numpy import *
 from math import *
 
@@ -168,6 +169,187 @@ class Quaternion:
         return self.__class__( (sourceScale * self.elements)+(targetScale * target) )
 
 
+# The 24 rotations of a cube as unit quaternions, the index of the product
+# of any two of them and their angle and axis. Filled in by cubeRotations()
+# the first time they're needed.
+_rotations = {}
+
+def multiplyArrays(a, b):
+    """Multiplies arrays of quaternions, given as arrays with the w, x, y
+    and z elements along the last axis. The arrays broadcast like any
+    other numpy arrays.
+    """
+    w1, x1, y1, z1 = numpy.moveaxis(numpy.asarray(a, dtype=float), -1, 0)
+    w2, x2, y2, z2 = numpy.moveaxis(numpy.asarray(b, dtype=float), -1, 0)
+
+    return numpy.stack([w1*w2 - x1*x2 - y1*y2 - z1*z2,
+                        w1*x2 + x1*w2 + y1*z2 - z1*y2,
+                        w1*y2 + y1*w2 + z1*x2 - x1*z2,
+                        w1*z2 + z1*w2 + x1*y2 - y1*x2], axis=-1)
+
+def rotateVectors(quats, vect):
+    """Rotates a vector by every quaternion of an array, the batched
+    version of Quaternion.vertex. Returns an array of shape (k, 3).
+    """
+    vect = vecNormalize(vect)
+    vectQuat = numpy.array([0.0, vect[0], vect[1], vect[2]])
+    conjugate = quats * [1., -1., -1., -1.]
+
+    return multiplyArrays(quats, multiplyArrays(vectQuat, conjugate))[..., 1:]
+
+def angleAxisArrays(quats):
+    """The batched version of Quaternion.getAngleAxis, giving an array of
+    (x, y, z, angle) rows.
+    """
+    quats = numpy.asarray(quats, dtype=float)
+    aw = numpy.arccos(numpy.clip(quats[..., 0], -1., 1.))
+    scale = numpy.sin(aw)
+    still = scale == 0.
+
+    result = numpy.empty(quats.shape)
+    result[..., :3] = quats[..., 1:] / numpy.where(still, 1., scale)[..., None]
+    result[..., 3] = numpy.degrees(2 * aw)
+    result[still] = (0.0, 0.0, 1.0, 0.0)
+    return result
+
+def matrixArrays(quats):
+    """The batched version of Quaternion.matrix, giving a (k, 4, 4) array
+    of matrices in the layout OpenGL expects.
+    """
+    w, x, y, z = numpy.moveaxis(numpy.asarray(quats, dtype=float), -1, 0)
+
+    result = numpy.zeros(w.shape + (4, 4))
+    result[..., 0, :3] = numpy.stack([1-2*y*y-2*z*z, 2*x*y+2*w*z, 2*x*z-2*w*y], -1)
+    result[..., 1, :3] = numpy.stack([2*x*y-2*w*z, 1-2*x*x-2*z*z, 2*y*z+2*w*x], -1)
+    result[..., 2, :3] = numpy.stack([2*x*z+2*w*y, 2*y*z-2*w*x, 1-2*x*x-2*y*y], -1)
+    result[..., 3, 3] = 1.0
+    return result
+
+def cubeRotations():
+    """Returns the tuple (rotations, products). 'rotations' holds the 24
+    rotations of a cube as a (24, 4) array of quaternions, the identity
+    first, and products[i, j] is the index of rotations[i] * rotations[j].
+    """
+    if not _rotations:
+        turns = [fromXYZR(axis, 90.).elements for axis in numpy.eye(3)]
+        found = [Quaternion().elements]
+        for elements in found:
+            for turn in turns:
+                q = multiplyArrays(turn, elements)
+                if numpy.abs(numpy.array(found) @ q).max() < 0.9999:
+                    found.append(q)
+
+        rotations = numpy.array(found)
+        products = multiplyArrays(rotations[:, None], rotations[None, :])
+        products = numpy.abs(products @ rotations.T).argmax(axis=-1)
+        _rotations['rotations'] = rotations
+        _rotations['products'] = products
+        _rotations['angleAxis'] = angleAxisArrays(rotations)
+        _rotations['matrices'] = numpy.round(matrixArrays(rotations))
+
+    return (_rotations['rotations'], _rotations['products'])
+
+def rotationMatrices():
+    """The matrices of the 24 rotations of a cube in the order used by
+    cubeRotations, as a (24, 4, 4) array for OpenGL. The entries are
+    exactly -1, 0 or 1.
+    """
+    cubeRotations()
+    return _rotations['matrices']
+
+def rotationIndex(quats):
+    """Finds the cube rotation of every quaternion of an array, by the
+    index used by cubeRotations. The quaternions must be close to one.
+    """
+    rotations = cubeRotations()[0]
+    quats = numpy.asarray(quats, dtype=float)
+    dots = numpy.abs(quats @ rotations.T)
+    if (dots.max(axis=-1) < 0.9999).any():
+        raise ValueError("not a rotation of the cube")
+    return dots.argmax(axis=-1)
+
+class Orientations:
+    """The orientations of many boxes, kept as one (k, 4) array of
+    quaternions so a whole slice gets rotated with a single multiply.
+
+    With 'exact', the orientations are kept as the indices of the 24 cube
+    rotations instead. Rotating is then a lookup in the product table, and
+    orientations never drift from the quarter turns they're made of, but
+    only rotations of the cube can be applied.
+    """
+    def __init__(self, count, exact=False):
+        self.exact = exact
+        if exact:
+            self.index = numpy.zeros(count, dtype=int)
+        else:
+            self._elements = numpy.tile([1., 0., 0., 0.], (count, 1))
+
+    def __len__(self):
+        if self.exact:
+            return len(self.index)
+        return len(self._elements)
+
+    def __getitem__(self, row):
+        return Quaternion(self.elements[row])
+
+    @property
+    def elements(self):
+        """The orientations as a (k, 4) array of quaternions. Changing the
+        array only changes the orientations if they're not exact.
+        """
+        if self.exact:
+            return cubeRotations()[0][self.index]
+        return self._elements
+
+    def set(self, rows, quats):
+        """Sets the orientation of some rows to the given quaternions.
+        """
+        if self.exact:
+            self.index[rows] = rotationIndex(quats)
+        else:
+            self._elements[rows] = quats
+
+    def apply(self, rows, quat):
+        """Stacks the rotation of a quaternion onto the orientation of some
+        rows, like the rotate methods of a Quaternion do.
+        """
+        if self.exact:
+            products = cubeRotations()[1]
+            turn = rotationIndex(quat.elements)
+            self.index[rows] = products[turn, self.index[rows]]
+        else:
+            quats = multiplyArrays(quat.elements, self._elements[rows])
+            norms = numpy.sqrt((quats ** 2).sum(axis=-1))
+            self._elements[rows] = quats / norms[..., None]
+
+    def rotateVect(self, rows, vect, rot):
+        self.apply(rows, fromXYZR(vect, rot))
+
+    def rotateEuler(self, rows, rot):
+        self.apply(rows, fromEuler(rot[0], rot[1], rot[2]))
+
+    def vertex(self, vect):
+        """Rotates a vector by every orientation, giving a (k, 3) array.
+        """
+        return rotateVectors(self.elements, vect)
+
+    def matrices(self):
+        """The matrix of every orientation, as used by glMultMatrix.
+        """
+        if self.exact:
+            return rotationMatrices()[self.index]
+        return matrixArrays(self._elements)
+
+    def angleAxis(self):
+        """The (x, y, z, angle) of every orientation, as used by
+        glRotatef.
+        """
+        if self.exact:
+            cubeRotations()
+            return _rotations['angleAxis'][self.index]
+        return angleAxisArrays(self._elements)
+
+
 if __name__ == '__main__':
     q = Quaternion()
     print(q.vertex( (0., 0., 1.) ))
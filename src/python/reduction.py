@@ -0,0 +1,356 @@
+"""Solving cubes of any size.
+
+The solver extension solves 2x2x2 and 3x3x3 cubes. Bigger cubes are
+solved by reduction, working on a CubeState:
+
+ 1. The corners, and for odd sizes the middle edges and the centers that
+    can't move, are solved as a 2x2x2 or a 3x3x3 cube by the extension.
+ 2. The wings, the edge pieces off the middle, are put in place one orbit
+    at a time. An orbit is the 24 wings at one depth along the edges.
+ 3. The remaining centers are put in place, one orbit at a time as well.
+
+Steps 2 and 3 only use commutators that cycle three pieces of one orbit
+and leave everything else alone, so they never undo earlier work. A
+slice turn first fixes the parity of a wing orbit, which three-cycles
+can't change. Solutions are much longer than the best ones, but every
+state gets solved.
+"""
+
+import numpy
+
+from cubestate import *
+import solver
+
+_reductions = {}
+
+class Orbit:
+    """The 24 positions of one kind of wing or center piece. Positions are
+    numbered 0 to 23; 'facelets' holds the facelets showing the piece at
+    every position, one per center and two per wing in a fixed order.
+
+    cycles[s, t, u] is the index of a known three-cycle sending the piece
+    at s to t, the piece at t to u and the piece at u to s, or -1 if none
+    is known. 'sequences' holds the cycles by index, either as their moves
+    or as a tuple (setup, parent) for the cycle setup parent setup'; moves()
+    spells them out. 'lengths' holds their number of moves.
+    """
+    def __init__(self, kind, facelets):
+        self.kind = kind
+        self.facelets = facelets
+        self.position = dict((int(f), p) for p, f in enumerate(facelets[:, 0]))
+        count = len(facelets)
+        self.cycles = -numpy.ones((count, count, count), dtype=int)
+        self.sequences = []
+        self.lengths = []
+        self.parityMove = None
+
+    def addCycles(self, triples, lengths, sequence):
+        """Adds the cycles of an array of (s, t, u) triples that aren't
+        known yet, with their 'lengths' and sequence(i) giving the entry of
+        'sequences' of triple i. Returns the indices of the triples that
+        were added.
+        """
+        count = len(self.facelets)
+        s, t, u = triples.T
+        unknown = numpy.nonzero(self.cycles[s, t, u] < 0)[0]
+
+        # A cycle comes up as three triples, keep one of them
+        first = triples[unknown].argmin(axis=1)
+        rolled = triples[unknown[:, None], (first[:, None] + [0, 1, 2]) % 3]
+        keys = rolled @ [count * count, count, 1]
+        new = unknown[numpy.unique(keys, return_index=True)[1]]
+
+        index = len(self.sequences) + numpy.arange(len(new))
+        a, b, c = triples[new].T
+        self.cycles[a, b, c] = self.cycles[b, c, a] = self.cycles[c, a, b] = index
+        self.sequences.extend([sequence(i) for i in new.tolist()])
+        self.lengths.extend(numpy.asarray(lengths)[new].tolist())
+        return new
+
+    def moves(self, index):
+        """The moves of the cycle with the given index.
+        """
+        sequence = self.sequences[index]
+        if isinstance(sequence, list):
+            return sequence
+        setup, parent = sequence
+        return [setup] + self.moves(parent) + [inverseMove(setup)]
+
+    def complete(self):
+        """Tells if there's a cycle for every three positions.
+        """
+        count = len(self.facelets)
+        return (self.cycles >= 0).sum() == count * (count - 1) * (count - 2)
+
+    def pieces(self, facelets):
+        """The piece at every position, as a color for centers and as a
+        pair of colors packed in one number for wings.
+        """
+        colors = facelets[self.facelets].astype(int)
+        if self.kind == 'wing':
+            return (colors[:, 0] * 8 + colors[:, 1]).tolist()
+        return colors[:, 0].tolist()
+
+class Reduction:
+    """The tables of the reduction solver for one cube size.
+    """
+    def __init__(self, n):
+        self.n = n
+        self.size = 6 * n ** 2
+        self.table = moveTable(n).permutations(self.size)
+        self.solver = solver.Solver(engine='twophase')
+        self.orbits = self.findOrbits()
+        self.findCycles()
+
+    def findOrbits(self):
+        """Finds the orbits of wings and centers, leaving out corners,
+        middle edges and fixed centers.
+        """
+        slots = layout(self.n)[0][:self.size]
+
+        # Facelets that moves can take to each other are in one set
+        parent = list(range(self.size))
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        for perm in self.table[2::3]:
+            for i, j in enumerate(perm.tolist()):
+                a, b = find(i), find(j)
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+
+        sets = {}
+        for i in range(self.size):
+            sets.setdefault(find(i), []).append(i)
+        boxes = {}
+        for i in range(self.size):
+            boxes.setdefault(int(slots[i]), []).append(i)
+
+        orbits = []
+        for root, facelets in sorted(sets.items()):
+            box = boxes[int(slots[root])]
+            if len(box) == 1 and len(facelets) == 24:
+                orbits.append(Orbit('center', numpy.array(facelets)[:, None]))
+
+            # A wing shows its facelets in two sets, the middle edges in one
+            elif len(box) == 2 and root < max(find(f) for f in box):
+                pairs = [sorted(boxes[int(slots[f])], key=find)
+                         for f in facelets]
+                orbits.append(Orbit('wing', numpy.array(pairs)))
+
+        # Wings go first, fixing their parity moves the centers
+        orbits.sort(key=lambda orbit: orbit.kind != 'wing')
+        return orbits
+
+    def findCycles(self):
+        """Finds a three-cycle for every three positions of every orbit.
+        The first ones are commutators A B A' B' of a quarter turn A and a
+        conjugated quarter turn B = Y Z Y' of outer layers Y and Z. Moves
+        act on the positions of an orbit like every permutation does, so
+        conjugating the cycles found by one more move, again and again,
+        gives a cycle for every three positions.
+        """
+        n = self.n
+        quarter = [moveIndex(n, axis, layer, turns) for axis in range(3)
+                   for layer in range(n) for turns in (1, 3)]
+        outer = [move for move in quarter if move // 3 % n in (0, n - 1)]
+        identity = numpy.arange(self.size)
+        orbitOf = {}
+        for orbit in self.orbits:
+            for f in orbit.facelets.flat:
+                orbitOf[int(f)] = orbit
+
+        # A commutator of two moves whose supports share a single piece is
+        # a three-cycle, so only those pairs are tried
+        conjugates = [[y, z, inverseMove(y)] for y in quarter for z in outer]
+        perms = []
+        for b in conjugates:
+            perm = identity
+            for move in b:
+                perm = perm[self.table[move]]
+            perms.append(perm)
+        supportA = (self.table[quarter] != identity).astype(numpy.float32)
+        supportB = (numpy.array(perms) != identity).astype(numpy.float32)
+        shared = supportA @ supportB.T
+
+        base = dict((orbit, ([], [])) for orbit in self.orbits)
+        for row, column in zip(*numpy.nonzero((shared > 0) & (shared <= 2))):
+            a, b = quarter[row], conjugates[column]
+            moves = [a] + b + [inverseMove(a)] + \
+                [inverseMove(m) for m in reversed(b)]
+            perm = identity
+            for move in moves:
+                perm = perm[self.table[move]]
+            moved = numpy.nonzero(perm != identity)[0]
+            if not len(moved) or len(moved) > 6:
+                continue
+
+            orbit = orbitOf.get(int(moved[0]))
+            if orbit is None or \
+                    any(orbitOf.get(int(f)) is not orbit for f in moved):
+                continue
+            if len(moved) != 3 * orbit.facelets.shape[1]:
+                continue
+
+            # The piece at perm[i] goes to i
+            step = {}
+            for i in moved.tolist():
+                if i in orbit.position:
+                    step[orbit.position[int(perm[i])]] = orbit.position[i]
+            s = next(iter(step))
+            base[orbit][0].append((s, step[s], step[step[s]]))
+            base[orbit][1].append(moves)
+
+        for orbit in self.orbits:
+            triples, moves = base[orbit]
+            triples = numpy.array(triples)
+            triples = triples[orbit.addCycles(
+                triples, [len(m) for m in moves], moves.__getitem__)]
+
+            # Where every move takes the piece at each position
+            position = -numpy.ones(self.size, dtype=int)
+            position[orbit.facelets[:, 0]] = numpy.arange(len(orbit.facelets))
+            where = position[self.table[:, orbit.facelets[:, 0]]]
+
+            # Conjugating the cycle of (s, t, u) by a move X gives the cycle
+            # of where X^-1 takes s, t and u
+            while len(triples) and not orbit.complete():
+                parents = orbit.cycles[tuple(triples.T)]
+                lengths = numpy.array(orbit.lengths)[parents] + 2
+                count = len(triples)
+                moved = where[:, triples].reshape(-1, 3)
+                new = orbit.addCycles(moved, numpy.tile(lengths, len(where)),
+                    lambda i: (i // count, int(parents[i % count])))
+                triples = moved[new]
+
+        # The parity of a wing orbit changes with a quarter turn of its slice
+        inner = [move for move in quarter if move not in outer]
+        for orbit in self.orbits:
+            if orbit.kind == 'wing':
+                for move in inner:
+                    if (self.table[move][orbit.facelets[:, 0]] !=
+                            orbit.facelets[:, 0]).any():
+                        orbit.parityMove = move
+                        break
+
+    def solveCorners(self, state):
+        """Solves the corners of a state, and for odd sizes the middle edges
+        and fixed centers, as a smaller cube. Returns the moves, or None if
+        the solver finds the state can't be solved.
+        """
+        n = self.n
+        keep = [0, n // 2, n - 1] if n % 2 else [0, n - 1]
+        small = CubeState(len(keep))
+        small.facelets[:] = state.facelets.reshape(6, n, n)[:, keep][:, :, keep].flat
+
+        if not self.solver.loadCube(small):
+            return None
+        actions = self.solver.solveCube()
+        if not actions and not small.isSolved():
+            return None
+
+        moves = [actionMove(n, action) for action in actions]
+        for move in moves:
+            state.move(move)
+        return moves
+
+    def solveOrbit(self, state, orbit, goal):
+        """Puts the pieces of an orbit where the colors in 'goal' want
+        them, returning the moves.
+        """
+        moves = []
+        want = orbit.pieces(goal)
+
+        if orbit.kind == 'wing':
+            home = dict((piece, p) for p, piece in enumerate(want))
+            pieces = orbit.pieces(state.facelets)
+            if len(home) != len(want) or set(pieces) != set(home):
+                raise ValueError("the wings can't be solved")
+
+            # Three-cycles are even, an odd permutation needs a slice turn
+            seen = set()
+            cycles = 0
+            for p in range(len(pieces)):
+                if p not in seen:
+                    cycles = cycles + 1
+                    while p not in seen:
+                        seen.add(p)
+                        p = home[pieces[p]]
+            if (len(pieces) - cycles) % 2:
+                state.move(orbit.parityMove)
+                moves.append(orbit.parityMove)
+
+        while True:
+            pieces = orbit.pieces(state.facelets)
+            correct = [a == b for a, b in zip(pieces, want)]
+            wrong = [p for p in range(len(pieces)) if not correct[p]]
+            if not wrong:
+                return moves
+
+            # Send the first wrong piece home, picking the third position
+            # that fixes the most pieces
+            s = wrong[0]
+            best = None
+            for t in wrong:
+                if t == s or want[t] != pieces[s]:
+                    continue
+                for u, index in enumerate(orbit.cycles[s, t].tolist()):
+                    if index < 0:
+                        continue
+                    gain = 1 + (pieces[t] == want[u]) + \
+                        (pieces[u] == want[s]) - correct[u]
+                    length = orbit.lengths[index]
+                    if best is None or (gain, -length) > best[:2]:
+                        best = (gain, -length, index)
+
+            if best is None or best[0] <= 0:
+                raise ValueError("no three-cycle for the %s orbit" % orbit.kind)
+            cycle = orbit.moves(best[2])
+            for move in cycle:
+                state.move(move)
+            moves.extend(cycle)
+
+    def solve(self, state):
+        """Returns the actions solving a CubeState of this size, or an
+        empty list if it can't be solved.
+        """
+        n = self.n
+        work = CubeState(n)
+        work.cells[:] = state.cells
+
+        moves = self.solveCorners(work)
+        if moves is None:
+            return []
+
+        # The corners now tell the color of every face
+        goal = numpy.repeat(work.facelets[::n * n], n * n)
+        try:
+            for orbit in self.orbits:
+                moves.extend(self.solveOrbit(work, orbit, goal))
+        except ValueError:
+            return []
+
+        actions = []
+        for move in simplifyMoves(n, moves):
+            actions.extend(moveActions(n, move))
+        return actions
+
+def reduction(n):
+    """Returns the reduction solver of an n*n*n cube, made on first use.
+    """
+    if n not in _reductions:
+        _reductions[n] = Reduction(n)
+    return _reductions[n]
+
+def solveState(state):
+    """Returns the actions solving a CubeState of any size, or an empty
+    list if it can't be solved. 2x2x2 and 3x3x3 cubes go straight to the
+    solver extension.
+    """
+    if state.n <= 3:
+        if not solver.loadCube(state):
+            return []
+        return solver.solveCube()
+    return reduction(state.n).solve(state)
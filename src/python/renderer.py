@@ -0,0 +1,235 @@
+"""Instanced drawing of the boxes of a cube.
+
+Drawing a box from its display list takes a handful of OpenGL calls, and
+a cube draws every box every frame. The InstancedRenderer instead keeps
+the geometry of a box in a vertex buffer and the transform of every box
+in an instance buffer, and draws the whole cube with one call per
+primitive type. The instance buffer is only written where it changes:
+all of it when the cube has moved, and only the boxes of the turning
+slice while a turn is animated.
+
+This needs shaders and instanced arrays (OpenGL 3.3, or the ARB
+extensions on older drivers). InstancedRenderer.create returns None where
+they're missing, and the cube then draws its display lists as before.
+"""
+
+import ctypes
+import numpy
+import OpenGL.GL as gl
+from OpenGL.GL import shaders
+
+from box import *
+from quaternion import *
+
+# Per vertex: position, normal, ambient, diffuse, specular and shininess
+vertexFloats = 3 + 3 + 4 + 4 + 4 + 1
+
+vertexShader = """
+#version 120
+
+attribute vec3 position;
+attribute vec3 normal;
+attribute vec4 ambient;
+attribute vec4 diffuse;
+attribute vec4 specular;
+attribute float shininess;
+attribute mat4 model;
+
+varying vec4 color;
+
+// The fixed function lighting of the display lists, for the one light
+// the scene has
+void main()
+{
+    vec4 eye = gl_ModelViewMatrix * model * vec4(position, 1.0);
+    vec3 n = gl_NormalMatrix * mat3(model) * normal;
+    vec3 l = normalize(gl_LightSource[1].position.xyz - eye.xyz);
+    vec3 h = normalize(l + vec3(0.0, 0.0, 1.0));
+
+    float lit = length(n) > 0.0 ? max(dot(normalize(n), l), 0.0) : 0.0;
+    float shine = lit > 0.0 ? pow(max(dot(normalize(n), h), 0.0), shininess) : 0.0;
+
+    color = ambient * (gl_LightModel.ambient + gl_LightSource[1].ambient)
+          + diffuse * gl_LightSource[1].diffuse * lit
+          + specular * gl_LightSource[1].specular * shine;
+    color.a = diffuse.a;
+
+    gl_Position = gl_ProjectionMatrix * eye;
+}
+"""
+
+fragmentShader = """
+#version 120
+
+varying vec4 color;
+
+void main()
+{
+    gl_FragColor = color;
+}
+"""
+
+def boxVertices(size=1):
+    """The vertices of a box for the vertex buffer, as the tuple
+    (triangles, lines) of float32 arrays with vertexFloats columns.
+    """
+    faces, outlines, lineMaterial = boxGeometry(size)
+
+    triangles = []
+    for normal, ambient, diffuse, corners in faces:
+        for k in (0, 1, 2, 0, 2, 3):
+            triangles.append(list(corners[k]) + list(normal) + list(ambient) +
+                             list(diffuse) + faceSpecular + faceShininess)
+
+    # The outlines have no normal, so only their ambient color shows
+    ambient, lineColor = lineMaterial
+    lines = []
+    for corners in outlines:
+        for k in range(4):
+            for corner in (corners[k], corners[(k + 1) % 4]):
+                lines.append(list(corner) + [0., 0., 0.] + list(ambient) +
+                             list(lineColor) + lineSpecular + lineShininess)
+
+    return (numpy.array(triangles, dtype=numpy.float32),
+            numpy.array(lines, dtype=numpy.float32))
+
+def translations(positions):
+    """Matrices moving boxes to their positions, as a (k, 4, 4) array in
+    the layout of OpenGL.
+    """
+    result = numpy.tile(numpy.identity(4), (len(positions), 1, 1))
+    result[:, 3, :3] = positions
+    return result
+
+class InstancedRenderer:
+    """Draws every box of a cube from one vertex buffer holding the box
+    and one instance buffer holding the transform of every box.
+    """
+    def __init__(self, cube):
+        self.ids = cube.ids
+        self.rows = cube.rows
+        self.lineWidth = float(cube.boxSize * 3)
+
+        self.orientations = cube.orientations
+        self.placed = translations([cube.boxes[id].pos for id in self.ids])
+        self.resting = numpy.empty((len(self.ids), 4, 4))
+        self.instances = numpy.empty((len(self.ids), 4, 4), dtype=numpy.float32)
+        self.turning = numpy.zeros(0, dtype=int)
+        self.turningIds = None
+
+        self.program = shaders.compileProgram(
+            shaders.compileShader(vertexShader, gl.GL_VERTEX_SHADER),
+            shaders.compileShader(fragmentShader, gl.GL_FRAGMENT_SHADER))
+
+        triangles, lines = boxVertices(cube.boxSize)
+        self.triangleCount = len(triangles)
+        self.lineCount = len(lines)
+        self.vertexBuffer = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vertexBuffer)
+        vertices = numpy.concatenate([triangles, lines])
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, vertices.nbytes, vertices,
+                        gl.GL_STATIC_DRAW)
+
+        self.instanceBuffer = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.instanceBuffer)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, self.instances.nbytes, None,
+                        gl.GL_DYNAMIC_DRAW)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+        self.update()
+
+    @classmethod
+    def create(cls, cube):
+        """Makes a renderer for a cube, or returns None if the OpenGL
+        context can't do instanced drawing.
+        """
+        try:
+            if not (bool(gl.glDrawArraysInstanced) and
+                    bool(gl.glVertexAttribDivisor)):
+                return None
+            return cls(cube)
+        except (RuntimeError, gl.GLError):
+            return None
+
+    def update(self):
+        """Writes the transform of every box, after the cube has moved.
+        """
+        rotations = self.orientations.matrices()
+        self.resting = rotations @ self.placed
+        self.instances[:] = self.resting
+        self.turning = numpy.zeros(0, dtype=int)
+        self.upload(0, len(self.ids))
+
+    def turn(self, ids, sideRot):
+        """Turns the boxes 'ids' by the Euler angles 'sideRot', putting the
+        boxes turned before back where they rest. A turn is drawn with the
+        same list of ids frame after frame, so its rows are only looked up
+        when the list changes.
+        """
+        if ids is self.turningIds:
+            rows = self.turningRows
+        else:
+            rows = numpy.array([self.rows[id] for id in ids], dtype=int)
+            self.turningIds = ids
+            self.turningRows = rows
+        changed = numpy.union1d(rows, self.turning)
+        if not len(changed):
+            return
+
+        self.instances[self.turning] = self.resting[self.turning]
+        if len(rows):
+            side = fromEuler(sideRot[0], sideRot[1], sideRot[2]).matrix()
+            self.instances[rows] = self.resting[rows] @ side
+        self.turning = rows
+
+        self.upload(changed.min(), changed.max() + 1)
+
+    def upload(self, start, stop):
+        """Copies the rows start to stop of the instances to the buffer.
+        """
+        rowBytes = self.instances[0].nbytes
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.instanceBuffer)
+        gl.glBufferSubData(gl.GL_ARRAY_BUFFER, start * rowBytes,
+                           (stop - start) * rowBytes, self.instances[start:stop])
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+    def draw(self):
+        """Draws all the boxes, with the modelview matrix of the cube.
+        """
+        gl.glUseProgram(self.program)
+        enabled = []
+        stride = vertexFloats * 4
+
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vertexBuffer)
+        offset = 0
+        for name, count in (('position', 3), ('normal', 3), ('ambient', 4),
+                            ('diffuse', 4), ('specular', 4), ('shininess', 1)):
+            location = gl.glGetAttribLocation(self.program, name)
+            if location >= 0:
+                gl.glEnableVertexAttribArray(location)
+                gl.glVertexAttribPointer(location, count, gl.GL_FLOAT,
+                        gl.GL_FALSE, stride, ctypes.c_void_p(offset))
+                enabled.append(location)
+            offset += count * 4
+
+        # A matrix attribute takes a location per column
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.instanceBuffer)
+        model = gl.glGetAttribLocation(self.program, 'model')
+        for column in range(4):
+            gl.glEnableVertexAttribArray(model + column)
+            gl.glVertexAttribPointer(model + column, 4, gl.GL_FLOAT,
+                    gl.GL_FALSE, 64, ctypes.c_void_p(column * 16))
+            gl.glVertexAttribDivisor(model + column, 1)
+            enabled.append(model + column)
+
+        gl.glDrawArraysInstanced(gl.GL_TRIANGLES, 0, self.triangleCount,
+                                 len(self.ids))
+        gl.glLineWidth(self.lineWidth)
+        gl.glDrawArraysInstanced(gl.GL_LINES, self.triangleCount,
+                                 self.lineCount, len(self.ids))
+
+        for location in enabled:
+            gl.glVertexAttribDivisor(location, 0)
+            gl.glDisableVertexAttribArray(location)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        gl.glUseProgram(0)
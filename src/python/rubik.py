@@ -1,39 +1,42 @@
 #!/usr/bin/env python
 
+import atexit
 import sys
 import OpenGL.GL as gl
 import OpenGL.GLU as glu
 import OpenGL.GLUT as glut
 
 from cube import *
-import solver
+from framestats import *
 
 width = 400
 height = 400
 winX = 200
 winY = 200
 
-actions = []
 size = 3
 
+# Times of the frames drawn, shown with 'f'
+stats = FrameStats()
+
 help = """
  Welcome to Rubik's cube in Python
  
  key  action
 -----------------------------------
  n    new cube (reset)
- s    solve cube (only for 3x3x3)
+ s    solve cube
  a    abort solving
  r    randomize cube
  +    increase cube size
  -    decrease cube size
+ f    frame stats on screen, on stdout, off
  h    this text
  q    quit
 
  mouse movements
 -----------------------------------
- - click and drag edges/corners to rotate
- - center blocks cannot be rotated
+ - click and drag any box to rotate its side
  - click and drag outside cube to rotate cube
 
 """
@@ -71,6 +74,10 @@ def resizeGLScene(width, height):
     if height == 0:
         height = 1
 
+    globals()['width'] = width
+    globals()['height'] = height
+    stats.invalidate()
+
     gl.glViewport(0, 0, width, height)
 
     gl.glMatrixMode(gl.GL_PROJECTION)
@@ -81,35 +88,82 @@ def resizeGLScene(width, height):
     gl.glMatrixMode(gl.GL_MODELVIEW)
     gl.glLoadIdentity()
 
-# Paints the scene
+# Paints the scene, timing the frame from the callback that asked for it
 def drawGLScene():
+    cube.syncBoxes()
+    stats.lap('update')
+
     gl.glLoadIdentity()
     gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
-
     cube.drawCube()
+    stats.lap('draw')
+
+    if stats.mode == 'screen':
+        drawStats(stats.summary())
+        stats.lap('overlay')
 
     glut.glutSwapBuffers()
+    stats.lap('swap')
+    stats.end(sceneKey())
+
+# What the scene shows, the same for frames that look the same
+def sceneKey():
+    return (id(cube), tuple(cube.rot), tuple(cube.pos), tuple(cube.sideRot),
+            cube.state.cells.tobytes())
+
+# Writes lines of text over the top left of the scene
+def drawStats(lines):
+    gl.glPushAttrib(gl.GL_ENABLE_BIT | gl.GL_CURRENT_BIT)
+    gl.glDisable(gl.GL_LIGHTING)
+    gl.glDisable(gl.GL_DEPTH_TEST)
+
+    gl.glMatrixMode(gl.GL_PROJECTION)
+    gl.glPushMatrix()
+    gl.glLoadIdentity()
+    glu.gluOrtho2D(0., width, 0., height)
+    gl.glMatrixMode(gl.GL_MODELVIEW)
+    gl.glPushMatrix()
+    gl.glLoadIdentity()
+
+    gl.glColor3f(0., 0., 0.)
+    for i, line in enumerate(lines):
+        gl.glRasterPos2i(5, height - 15 * (i + 1))
+        for c in line:
+            glut.glutBitmapCharacter(glut.GLUT_BITMAP_8_BY_13, ord(c))
+
+    gl.glPopMatrix()
+    gl.glMatrixMode(gl.GL_PROJECTION)
+    gl.glPopMatrix()
+    gl.glMatrixMode(gl.GL_MODELVIEW)
+    gl.glPopAttrib()
+
+# Sums up the frames drawn when the program ends
+def printStats():
+    if stats.frames:
+        print("Frame stats:")
+        for line in stats.summary():
+            print("  " + line)
 
 # Simple keyboard mappings
 def keyboard(key, x, y):
+    stats.begin('keyboard')
     if key == 'q':
         print("Quitting...")
         sys.exit(0)
     elif key == 's':
-        solver.loadCube(cube)
-        if not solver.isSolved():
-            globals()['actions'] = solver.solveCube()
-            print("Solving %d steps" % len(globals()['actions']))
-            solve(0)
+        if not cube.turns and not cube.state.isSolved():
+            actions = solutionCache.solve(cube)
+            print("Solving %d steps" % len(actions))
+            cube.doActions(actions, True, True)
+            animate()
     elif key == 'a':
-        globals()['actions'] = []
+        cube.abortTurns()
     elif key == 'r':
         cube.scramble()
         drawGLScene()
     elif key == 'n':
         rot = globals()['cube'].rot
         globals()['cube'] = Cube(globals()['size'])
-        globals()['actions'] = []
         globals()['cube'].rot = rot
         drawGLScene()
     elif key == '+':
@@ -118,31 +172,34 @@ def keyboard(key, x, y):
     elif key == '-':
         cube.zoomOut()
         drawGLScene()
+    elif key == 'f':
+        print("Frame stats %s" % stats.toggle())
+        drawGLScene()
     elif key == 'h':
         print(help)
 
-# Called ever half second while automatically solving the cube
-def solve(num):
-    actions = globals()['actions']
-    if len(actions) > 0:
-        cube.doAction(actions[0], True, drawGLScene)
-        globals()['actions'] = actions[1:]
-        glut.glutTimerFunc(500, solve, 0)
-        drawGLScene() 
+# Draws the turns of the cube as they are animated. Runs whenever GLUT is
+# idle, so input is still handled in between frames, and unregisters itself
+# once the cube is at rest.
+def animate():
+    stats.begin('animate')
+    if cube.animate():
+        glut.glutIdleFunc(animate)
+    else:
+        glut.glutIdleFunc(None)
+    drawGLScene()
 
 # Takes proper mouse movement action.
 def mouseMove(x, y):
+    stats.begin('mouseMove')
     cube.mouseMove(x, y)
     drawGLScene()
 
 # Yay! The user has clicked somethin'.
 def mouseClick(button, state, x, y):
     if state == glut.GLUT_UP:
-        while 1:
-            drawGLScene()
-            if cube.mouseUp(x, y):
-                break
-        drawGLScene()
+        cube.mouseUp(x, y)
+        animate()
     else:
         cube.mouseDown(x, y)
 
@@ -185,6 +242,7 @@ def main(argv=None):
     glut.glutMotionFunc(mouseMove)
 
     print(help)
+    atexit.register(printStats)
 
     # Run the main event loop
     glut.glutMainLoop()
@@ -0,0 +1,93 @@
+"""Caching of solver solutions.
+
+Solving a cube takes a lot longer than everything else we do after a move,
+and the same states get solved over and over: after every move of the user,
+and again when the user asks for the solution. The cache keeps the
+solutions of the most recently seen states, keyed by their facelets.
+"""
+
+from collections import OrderedDict
+
+from cubestate import *
+from reduction import solveState
+
+class SolutionCache:
+    """A bounded cache of solutions, evicting the least recently used
+    state first. Storing a solution also stores the rest of it for every
+    state along the way, so following a solution move by move only hits
+    the cache.
+    """
+    def __init__(self, size=4096):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key(self, facelets):
+        """The visible facelets are all that matters to the solver, so
+        they are used as they are.
+        """
+        return bytes(facelets)
+
+    def lookup(self, facelets):
+        """Returns the cached solution of a state as a list of moves, or
+        None if the state isn't cached.
+        """
+        key = self.key(facelets)
+        if key not in self.entries:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        moves, start = self.entries[key]
+        return list(moves[start:])
+
+    def store(self, state, solution):
+        """Stores the solution of a CubeState, together with the remaining
+        moves for every state the solution passes through.
+        """
+        moves = tuple(solution)
+
+        current = CubeState(state.n)
+        current.cells[:] = state.cells
+        for i, move in enumerate(moves):
+            if parseAction(move) is None:
+                break
+            current.doAction(move)
+            self.add(current.facelets, moves, i + 1)
+
+        # The state itself goes last, so it's the last to be evicted
+        self.add(state.facelets, moves, 0)
+
+    def add(self, facelets, moves, start):
+        key = self.key(facelets)
+        self.entries[key] = (moves, start)
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def solve(self, cube):
+        """Returns the moves left to solve a Cube, asking the solver only
+        if the state isn't cached. States that can't be solved get an empty
+        list.
+        """
+        moves = self.lookup(cube.facelets)
+        if moves is not None:
+            return moves
+
+        moves = solveState(cube.state)
+        self.store(cube.state, moves)
+        return moves
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+# The cache shared by the cube and the client
+solutionCache = SolutionCache()
@@ -1,7 +1,22 @@
 import unittest
+import threading
+import os
+import sys
+import tempfile
+import subprocess
+import shutil
+import atexit
+
+# Keep the two-phase tables the tests make out of the user's cache
+tableDirectory = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, tableDirectory, True)
+os.environ['PYCUBE_TABLES'] = os.path.join(tableDirectory, 'twophase.tables')
 
 from cube import *
 from quaternion import *
+from cubestate import *
+from solutioncache import *
+from reduction import *
 import solver
 
 class CubeTestCase(unittest.TestCase):
@@ -23,14 +38,30 @@ class CubeTestCase(unittest.TestCase):
         self.testLoadCube()
         assert solver.isSolved() == False
     
-    def testCreateToBig(self):
-        try:
-            Cube(1)
-            Cube(10)
-        except TypeError:
-            pass
-        else:
-            fail("expected a TypeError")
+    def testCreateTooSmall(self):
+        self.assertRaises(TypeError, Cube, 1)
+
+    def testCreateBig(self):
+        cube = Cube(20)
+        assert len(cube.boxes) == 20 ** 3 - 18 ** 3
+        cube.doAction('UL3', True)
+        cube.doAction('FC', True)
+        cube.syncBoxes()
+        for i in cube:
+            assert cube.boxes[i].side == cube.state.side(i)
+        cube.doAction('FA', True)
+        cube.doAction('UR3', True)
+        assert cube.state.isSolved()
+
+    def testSlices(self):
+        cube = Cube(4)
+        for axis in range(3):
+            for layer in range(4):
+                ids = cube.slices[axis][layer]
+                assert len(ids) == (16 if layer in (0, 3) else 12)
+                for i in ids:
+                    assert cube.findRelativePos(i)[axis] == layer
+                    assert cube.findIdFromPos(cube.findRelativePos(i)) == i
     def testRotateAlot(self):
         i=0
         while True:
@@ -62,6 +93,841 @@ class CubeTestCase(unittest.TestCase):
         cube = Cube(5)
         assert solver.loadCube(cube) == False
 
+    def testSolutionSolves(self):
+        self.testNotSolvedRandom()
+        for action in solver.solveCube():
+            self.cube.doAction(action, True)
+
+        self.testLoadCube()
+        assert solver.isSolved() == True
+
+    def testFaceletsFollowMoves(self):
+        facelets = self.cube.facelets
+        self.cube.doAction('UL', True)
+        assert facelets is self.cube.facelets
+        assert (facelets != CubeState(3).facelets).any()
+
+        self.testLoadCube()
+        assert solver.isSolved() == False
+
+    def testBoxesFollowState(self):
+        self.cube.scramble()
+        self.cube.syncBoxes()
+        for i in self.cube:
+            assert self.cube.boxes[i].side == self.cube.state.side(i)
+            expected = orientationFromSide(self.cube.state.side(i))
+            assert abs(dot(self.cube.boxes[i].rot.elements, expected)) > 0.9999
+
+    def testRotList(self):
+        cube = Cube(5)
+        cube.selectedBox = cube.findIdFromPos([4, 1, 3])
+        cube.createRotList("y")
+        expected = [i for i in cube if cube.findYFromId(i) == 1]
+        assert sorted(cube.rotateList) == expected
+
+    def testAnimatedTurns(self):
+        cube = Cube(3)
+        cube.doAction('UL', True, True)
+        cube.doAction('FC', True, True)
+        assert cube.state.isSolved()
+
+        cube.animate(0.)
+        assert cube.animate(cube.turnTime / 2)
+        assert cube.sideRot == [0., -45., 0.]
+        assert cube.rotateList == cube.slices[1][0]
+        assert cube.state.isSolved()
+
+        # A late frame finishes the first turn and carries on with the next
+        assert cube.animate(cube.turnTime * 1.75)
+        assert cube.sideRot == [-67.5, 0., 0.]
+        assert not cube.animate(cube.turnTime * 2)
+        assert cube.rotateList == []
+
+        expected = CubeState(3)
+        expected.doAction('UL')
+        expected.doAction('FC')
+        assert (cube.facelets == expected.facelets).all()
+
+    def testPipelinedTurns(self):
+        cube = Cube(4)
+        actions = ['UL', 'RD1', 'FA', 'BC', 'DR1'] * 4
+        for action in actions:
+            cube.doAction(action, True, True)
+        cube.animate(0.)
+        assert not cube.animate(cube.turnTime * len(actions))
+
+        expected = CubeState(4)
+        for action in actions:
+            expected.doAction(action)
+        assert (cube.facelets == expected.facelets).all()
+
+    def testDecodeDuringTurn(self):
+        other = Cube(3)
+        other.scramble(7)
+        code = other.encode()
+
+        for replace in (lambda cube: cube.decode(code),
+                        lambda cube: cube.scramble(7)):
+            cube = Cube(3)
+            cube.doAction('UL', True, True)
+            cube.doAction('FC', True, True)
+            cube.animate(0.)
+            cube.animate(cube.turnTime / 2)
+
+            # The turn on screen is dropped with the rest
+            replace(cube)
+            assert not cube.turns
+            assert cube.rotateList == [] and cube.sideRot == [0., 0., 0.]
+            assert not cube.animate(cube.turnTime)
+            assert cube.encode() == code
+
+    def testMouseUpFinishesTurn(self):
+        cube = Cube(3)
+        cube.selectedBox = cube.findIdFromPos([2, 0, 2])
+        cube.createRotList("y")
+        cube.rotateSide("y", 60.)
+        cube.mouseUp(0, 0)
+        assert cube.rotateList == []
+
+        cube.animate(0.)
+        assert not cube.animate(cube.turnTime)
+        expected = CubeState(3)
+        expected.rotate(1, 0, 90.)
+        assert (cube.facelets == expected.facelets).all()
+
+    def testDoActions(self):
+        actions = ['UL', 'FC', 'FC', 'RD', 'RU', 'BA']
+        self.cube.doActions(actions, True)
+
+        animated = Cube(3)
+        animated.doActions(actions, True, True)
+        assert len(animated.turns) == 3
+        animated.animate(0.)
+        animated.animate(animated.turnTime * 4)
+        assert (animated.facelets == self.cube.facelets).all()
+
+        expected = CubeState(3)
+        for action in actions:
+            expected.doAction(action)
+        assert (self.cube.facelets == expected.facelets).all()
+
+    def testCreateWithoutGL(self):
+        # Nothing is built for OpenGL until the cube is drawn
+        assert self.cube.listId is None
+        assert self.cube.renderer is None
+        self.cube.scramble()
+        self.cube.syncBoxes()
+
+    def testPickBox(self):
+        cube = Cube(3)
+
+        # The center of the front face, which used to be unclickable
+        assert cube.pickBox([0.2, 0.3, 10.], [0., 0., -1.]) == (4, 1)
+
+        # A corner seen from above, at an angle
+        id, face = cube.pickBox([1.2, 10., -1.2], [0., -1., -0.01])
+        assert face == 0
+        assert cube.findRelativePos(id) == [2, 0, 2]
+
+        assert cube.pickBox([0., 10., 0.], [1., 0., 0.]) == (-1, None)
+        assert cube.pickBox([0., 0., 10.], [0., 0., 1.]) == (-1, None)
+
+    def testDragAxis(self):
+        cube = Cube(3)
+
+        # Dragging across the front face turns the rows and columns of it,
+        # dragging right across the top face turns a slice around z
+        assert cube.dragAxis(1, 1, 0) == ("y", 1)
+        assert cube.dragAxis(1, 0, 1) == ("x", 1)
+        assert cube.dragAxis(0, 1, 0) == ("z", -1)
+        cube.rot = [0., 90., 0.]
+        assert cube.dragAxis(4, 0, 1) == ("z", 1)
+
+        id, face = cube.pickBox([1.2, 10., -1.2], [0., -1., -0.01])
+        cube.selectedBox, cube.selectedFace = id, face
+        cube.rot = [0., 0., 0.]
+        for x in (12, 15, 18):
+            cube.mouseMove(x, 0)
+        assert cube.moveDir == "x"
+        assert cube.sideRot[2] < 0 and cube.sideRot[:2] == [0., 0.]
+        assert len(cube.rotateList) == 9
+
+    def testPickBigCube(self):
+        cube = Cube(20)
+        for face, normal in enumerate(normals):
+            id, picked = cube.pickBox(normal * 30. + 0.25, -normal)
+            assert picked == face
+            assert cube.state.index[boxRows(20, id), face] >= 0
+
+    def testBoxVertices(self):
+        triangles, lines = boxVertices()
+        assert triangles.shape == (36, vertexFloats)
+        assert lines.shape == (48, vertexFloats)
+
+        # Every corner of a face is on the face its normal points to
+        for vertex in triangles:
+            normal = vertex[3:6]
+            assert abs(dot(vertex[:3], normal) - 0.49) < 1e-6
+
+class SolverTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cube = Cube(3)
+        self.cube.scramble()
+
+    def testSeparateSolvers(self):
+        a = solver.Solver()
+        b = solver.Solver()
+        assert a.loadCube(self.cube) == True
+        assert a.isSolved() == False
+        assert b.isSolved() == True
+
+        b.loadCube(self.cube)
+        b.reset()
+        assert b.isSolved() == True
+        assert a.isSolved() == False
+
+    def testSolveInThreads(self):
+        expected = solver.Solver()
+        expected.loadCube(self.cube)
+        expected = expected.solveCube()
+
+        results = []
+        def solve():
+            s = solver.Solver()
+            s.loadCube(self.cube)
+            results.append(s.solveCube())
+
+        threads = [threading.Thread(target=solve) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == [expected] * 4
+
+    def testSolveMany(self):
+        cubes = [self.cube, Cube(3), Cube(3)]
+        cubes[1].scramble()
+        facelets = b''.join([c.facelets for c in cubes])
+        moves, lengths = solver.solveMany(facelets, workers=2)
+
+        start = 0
+        for cube, length in zip(cubes, lengths):
+            solver.loadCube(cube)
+            solution = solver.solveCube()
+            assert length == len(solution)
+            assert moves[start:start + length * 2] == ''.join(solution).encode()
+            start = start + length * 2
+
+        assert solver.solveMany(facelets) == (moves, lengths)
+        self.assertRaises(ValueError, solver.solveMany, facelets[:-1])
+
+    def testTwoPhaseSolves(self):
+        s = solver.Solver(engine='twophase')
+        assert s.engine == 'twophase'
+        assert s.loadCube(self.cube) == True
+
+        solution = s.solveCube()
+        assert s.moves == len(solution)
+        assert s.searchTime >= 0
+        for action in solution:
+            self.cube.doAction(action, True)
+        assert self.cube.state.isSolved()
+
+    def testTwoPhaseBudget(self):
+        s = solver.Solver(engine='twophase', maxMoves=30, timeout=0.5)
+        s.loadCube(self.cube)
+        solution = s.solveCube()
+
+        # Half turns come as two quarter turns of the same action
+        turns = 0
+        previous = None
+        for action in solution:
+            if action != previous:
+                turns = turns + 1
+                previous = action
+            else:
+                previous = None
+        assert 0 < turns <= 30
+
+        s.maxMoves = 20
+        s.solveCube()
+        assert s.searchTime < 5
+
+    def testTwoPhaseMany(self):
+        facelets = bytes(self.cube.facelets) + bytes(Cube(3).facelets)
+        moves, lengths = solver.solveMany(facelets, engine='twophase')
+        assert lengths[1] == 0
+        for i in range(lengths[0]):
+            self.cube.doAction(moves[i * 2:i * 2 + 2].decode(), True)
+        assert self.cube.state.isSolved()
+
+    def testTableFile(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'cache', 'twophase.tables')
+        env = dict(os.environ, PYCUBE_TABLES=path)
+        script = ('import solver; solver.init(verify=%s); '
+                  'print(solver.tableStatus()[0]); '
+                  'solver.setEngine("twophase"); solver.solveCube(); '
+                  'print(solver.tableStatus()[0])')
+
+        def status(verify=False):
+            output = subprocess.check_output(
+                [sys.executable, '-c', script % verify], env=env,
+                cwd=os.path.dirname(os.path.abspath(__file__)))
+            return output.decode().split()
+
+        # Nothing is made before the first two-phase solve, then the tables
+        # are built once and mapped by every later process
+        assert status() == ['unloaded', 'built']
+        assert open(path, 'rb').read(8) == b'PyCube2P'
+        assert status() == ['unloaded', 'mapped']
+
+        # A file changed since its checksum was checked is checked again,
+        # so a corrupt one gets built and written again
+        assert os.path.exists(path + '.verified')
+        def corrupt():
+            with open(path, 'r+b') as f:
+                f.seek(-1, 2)
+                last = f.read(1)
+                f.seek(-1, 2)
+                f.write(bytes([last[0] ^ 1]))
+        corrupt()
+        assert status() == ['unloaded', 'built']
+        assert status() == ['unloaded', 'mapped']
+
+        # Unless the change hides from its stamp, then only verifying
+        # catches it
+        stat = os.stat(path)
+        corrupt()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert status() == ['unloaded', 'mapped']
+        assert status(True) == ['unloaded', 'built']
+        assert status(True) == ['unloaded', 'mapped']
+
+        # A file of the wrong size is caught without checking its checksum
+        with open(path, 'ab') as f:
+            f.write(b'\0')
+        assert status() == ['unloaded', 'built']
+        assert status() == ['unloaded', 'mapped']
+
+    def testPocketSolves(self):
+        cube = Cube(2)
+        cube.scramble()
+        assert solver.loadCube(cube) == True
+        assert solver.isSolved() == False
+
+        solution = solver.solveCube()
+        assert 0 < len(solution) <= 28
+        for action in solution:
+            cube.doAction(action, True)
+        assert cube.state.isSolved()
+
+    def testUnknownEngine(self):
+        self.assertRaises(ValueError, solver.Solver, engine='beginner')
+        s = solver.Solver()
+        assert s.engine == 'cubex'
+        def setEngine():
+            s.engine = 'beginner'
+        self.assertRaises(ValueError, setEngine)
+
+class SolutionCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cube = Cube(3)
+        self.cube.scramble()
+        self.cache = SolutionCache()
+
+    def testHitAfterMiss(self):
+        solution = self.cache.solve(self.cube)
+        assert self.cache.misses == 1
+        assert self.cache.hits == 0
+
+        assert self.cache.solve(self.cube) == solution
+        assert self.cache.hits == 1
+
+    def testRestOfSolution(self):
+        solution = self.cache.solve(self.cube)
+        self.cube.doAction(solution[0], True)
+        assert self.cache.solve(self.cube) == solution[1:]
+        assert self.cache.hits == 1
+
+        for action in solution[1:]:
+            self.cube.doAction(action, True)
+        assert self.cube.state.isSolved()
+        assert self.cache.solve(self.cube) == []
+
+    def testEviction(self):
+        self.cache = SolutionCache(size=1)
+        self.cache.solve(self.cube)
+        assert len(self.cache) == 1
+        assert self.cache.lookup(self.cube.facelets) is not None
+
+        other = Cube(3)
+        other.scramble()
+        self.cache.solve(other)
+        assert len(self.cache) == 1
+        assert self.cache.lookup(self.cube.facelets) is None
+
+class ReductionTestCase(unittest.TestCase):
+    def testSolveBigCubes(self):
+        for n in (4, 5):
+            cube = Cube(n)
+            cube.scramble()
+            solution = solveState(cube.state)
+            assert len(solution) > 0
+            for action in solution:
+                cube.doAction(action, True)
+            assert cube.state.isSolved()
+
+    def testCompleteCycles(self):
+        for orbit in reduction(4).orbits:
+            assert orbit.complete()
+            assert (orbit.kind == 'wing') == (orbit.parityMove is not None)
+
+    def testCachedSolution(self):
+        cube = Cube(4)
+        cube.scramble()
+        cache = SolutionCache()
+        solution = cache.solve(cube)
+        cube.doAction(solution[0], True)
+        assert cache.solve(cube) == solution[1:]
+        assert cache.hits == 1
+
+    def testProgressOnlyFromCache(self):
+        cube = Cube(4)
+        cube.scramble()
+        solutionCache.clear()
+        self.addCleanup(solutionCache.clear)
+
+        # A move of the user doesn't solve the big cube
+        cube.doAction('UL')
+        assert len(solutionCache) == 0
+        assert solutionCache.misses == 1
+
+        # Once the solution is known, following it hits the cache
+        solution = solutionCache.solve(cube)
+        cube.doAction(solution[0])
+        assert solutionCache.hits == 1
+        assert solutionCache.misses == 2
+
+class OffscreenTestCase(unittest.TestCase):
+    def testRenderStates(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        # The EGL platform has to be picked before OpenGL is imported, so
+        # this runs in a process of its own. It exits with 77 if there is
+        # no EGL to draw with.
+        script = """
+import os, sys
+os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+try:
+    from OpenGL import EGL
+    EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+except Exception as error:
+    print(error, file=sys.stderr)
+    sys.exit(77)
+
+import offscreen, numpy
+try:
+    renderer = offscreen.OffscreenRenderer(64, 48)
+except RuntimeError as error:
+    print(error, file=sys.stderr)
+    sys.exit(77)
+states = offscreen.randomStates(3, 3)
+states[0] = offscreen.CubeState(3).cells
+images = list(renderer.renderStates(3, states))
+offscreen.writePng(%r, images[1])
+print(images[0].shape, (images[0] != images[1]).any())
+""" % os.path.join(directory, 'cube.png')
+        process = subprocess.run([sys.executable, '-c', script],
+                                 capture_output=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__)))
+        if process.returncode == 77:
+            self.skipTest("no EGL to draw with")
+
+        assert process.returncode == 0, process.stderr.decode()
+        assert process.stdout.decode().split() == ['(48,', '64,', '3)', 'True']
+        png = open(os.path.join(directory, 'cube.png'), 'rb').read()
+        assert png.startswith(b'\x89PNG')
+
+class CubeStateTestCase(unittest.TestCase):
+    def testFourQuarterTurns(self):
+        for n in range(2, 8):
+            state = CubeState(n)
+            for axis in range(3):
+                for layer in range(n):
+                    for i in range(4):
+                        state.rotate(axis, layer, 90.)
+                        assert state.isSolved() == (i == 3)
+
+    def testScrambleStates(self):
+        for n in [2, 5, 3]:
+            states = scrambleStates(n, 300, seed=42)
+            assert (states == scrambleStates(n, 300, seed=42)).all()
+            assert not (states == scrambleStates(n, 300, seed=43)).all()
+            assert len(set(map(bytes, states))) == 300
+
+        # the solver takes them all as cubes
+        solver.encodeFacelets(states[:, :54].tobytes())
+
+        out = numpy.zeros((5000, len(CubeState(3).cells)), dtype=numpy.uint8)
+        assert scrambleStates(3, 5000, seed=1, uniform=True, out=out) is out
+        assert out[:, :54].tobytes() == solver.randomFacelets(5000, seed=1)
+        self.assertRaises(ValueError, scrambleStates, 4, 1, uniform=True)
+
+        # no moves leave the cubes solved
+        states = scrambleStates(4, 3, seed=1, moves=0)
+        assert (states == CubeState(4).cells).all()
+
+        cube = Cube(3)
+        cube.scramble(7)
+        other = Cube(3)
+        other.scramble(7)
+        assert cube.encode() == other.encode() != Cube(3).encode()
+
+    def testInverseMove(self):
+        state = CubeState(4)
+        state.doAction('FC')
+        state.doAction('UL')
+        assert state.isSolved() == False
+        state.doAction('UR')
+        state.doAction('FA')
+        assert state.isSolved() == True
+
+    def testHalfTurn(self):
+        a = CubeState(3)
+        b = CubeState(3)
+        a.rotate(1, 0, 180.)
+        b.rotate(1, 0, 90.)
+        b.rotate(1, 0, 90.)
+        assert (a.cells == b.cells).all()
+
+    def testInnerActions(self):
+        assert parseAction('UL') == (1, 0, -90.)
+        assert parseAction('DR2') == (1, -3, 90.)
+        assert parseAction('UX') is None
+        assert parseAction('ULx') is None
+
+        for n in (2, 3, 4, 5):
+            for move in range(9 * n):
+                a = CubeState(n)
+                b = CubeState(n)
+                a.move(move)
+                for action in moveActions(n, move):
+                    b.doAction(action)
+                assert (a.cells == b.cells).all()
+
+    def testBatchMoves(self):
+        state = CubeState(3)
+        moves = [actionMove(3, a) for a in ('UL', 'RU', 'FC')]
+        for move in moves:
+            state.move(move)
+
+        states = array([CubeState(3).cells] * 5)
+        states = applyMoves(states, moves, 3)
+        assert (states == state.cells).all()
+
+    def testSparseMoveTable(self):
+        for n in [2, 3, 4, 6]:
+            table = moveTable(n)
+            state = CubeState(n)
+            state.cells[:] = numpy.arange(len(state.cells)) % 251
+            for move in range(len(table)):
+                permutation = table[move]
+                assert (numpy.sort(permutation) == numpy.arange(table.length)).all()
+
+                cells = state.cells[permutation]
+                state.move(move)
+                assert (state.cells == cells).all()
+
+            # Only the entries of the boxes of one layer are kept for a move
+            assert len(table.targets) <= 9 * 2 * 6 * n * n + 9 * (n - 2) * 24 * (n - 1)
+
+    def testSimplifyMoves(self):
+        assert len(compileActions(3, 'UL UR')) == 0
+        assert len(compileActions(3, ['FC'] * 4)) == 0
+        assert compileActions(3, 'FC.FC').actions() == ['FA', 'FA']
+        assert compileActions(3, 'FC FC FC').actions() == ['FA']
+
+        # Turns of other layers around the same axis don't get in the way
+        assert compileActions(4, 'UL DL1 DR UR').actions() == ['DL1', 'DR']
+        assert compileActions(4, 'UL FC UR').actions() == ['UL', 'FC', 'UR']
+
+    def testCompiledSequence(self):
+        actions = ['UL', 'RD1', 'FA', 'FA', 'BC', 'DR1', 'DR1', 'LU'] * 3
+        state = CubeState(4)
+        for action in actions:
+            state.doAction(action)
+
+        compiled = CubeState(4)
+        compiled.apply(actions)
+        assert (compiled.cells == state.cells).all()
+        assert compileActions(4, actions) is compileActions(4, actions)
+        self.assertRaises(ValueError, compileActions, 4, ['UL', 'XX'])
+
+class PermutationTestCase(unittest.TestCase):
+    def testPeriod(self):
+        macro = Permutation.fromActions(3, 'RU UL')
+        assert macro.period() == 105
+        assert macro.order() == 420
+
+        state = CubeState(3)
+        for i in range(104):
+            state.apply(macro)
+            assert not state.isSolved()
+        state.apply(macro)
+        assert state.isSolved()
+        assert (macro ** macro.order()).isIdentity()
+
+    def testPowerAndInverse(self):
+        macro = Permutation.fromActions(4, 'RU UL1 FC')
+        assert macro ** 3 == macro * macro * macro
+        assert macro ** -2 == (macro * macro).inverse()
+        assert (macro * macro.inverse()).isIdentity()
+        assert macro ** 0 == Permutation(4)
+
+        state = CubeState(4)
+        state.apply(macro ** 1000003)
+        expected = CubeState(4)
+        expected.apply(macro ** (1000003 % macro.order()))
+        assert (state.cells == expected.cells).all()
+
+    def testConjugateAndCommutator(self):
+        a = Permutation.fromActions(3, 'RU')
+        b = Permutation.fromActions(3, 'UL')
+        assert a.commutator(b) == Permutation.fromActions(3, 'RU UL RD UR')
+        assert b.conjugate(a) == Permutation.fromActions(3, 'RU UL RD')
+        assert a.commutator(a).isIdentity()
+
+    def testEquality(self):
+        a = Permutation.fromActions(3, 'RU UL')
+        b = Permutation.fromActions(3, 'RU') * Permutation.fromActions(3, 'UL')
+        assert a == b and hash(a) == hash(b)
+        assert len({a, b, Permutation(3)}) == 2
+        assert a != 'RU UL' and not a == None
+        assert a != Permutation(4)
+
+    def testCubeApply(self):
+        cube = Cube(3)
+        cube.apply(cube.permutation('FC LU') ** 2, True)
+        expected = CubeState(3)
+        expected.apply('FC LU FC LU')
+        assert (cube.facelets == expected.facelets).all()
+
+class StateCodeTestCase(unittest.TestCase):
+    def testRandomFacelets(self):
+        facelets = solver.randomFacelets(500, seed=11)
+        assert facelets == solver.randomFacelets(500, seed=11)
+        assert len(solver.randomFacelets(500)) == 500 * 54
+        codes = solver.encodeFacelets(facelets)
+        assert len(set(codes[i:i + 9] for i in range(0, len(codes), 9))) == 500
+
+        solved = bytes(CubeState(3).facelets)
+        for i in range(0, len(facelets), 54):
+            assert facelets[i + 4:i + 54:9] == solved[4::9]
+
+        moves, lengths = solver.solveMany(facelets[:54 * 5])
+        assert min(lengths) > 0
+
+    def testSolverCodes(self):
+        state = CubeState(3)
+        assert state.encode() == bytes(9)
+        for actions in ['RU UL1 FC', 'LU1 FC FA BC']:
+            state.apply(actions)
+            code = state.encode()
+            assert len(code) == 9
+            assert solver.encodeFacelets(bytes(state.facelets)) == code
+            assert solver.decodeFacelets(code) == bytes(state.facelets)
+
+        codes = solver.encodeFacelets(bytes(CubeState(3).facelets) +
+                                      bytes(state.facelets))
+        assert codes == bytes(9) + code
+
+    def testRoundTrip(self):
+        for n in [2, 3, 4, 5]:
+            state = CubeState(n)
+            for move in numpy.random.randint(len(state.moves), size=40):
+                state.move(move)
+            decoded = CubeState(n)
+            decoded.decode(state.encode())
+            assert decoded == state
+            assert decoded.encode() == state.encode()
+            assert decoded != CubeState(n)
+
+            # the faces inside the cube follow the facelets too
+            decoded.apply('FA UL')
+            state.apply('FA UL')
+            assert decoded == state
+            assert hash(decoded) == hash(state)
+            assert len({decoded, state, CubeState(n)}) == 2
+
+        cube = Cube(4)
+        cube.doActions('RU UL1', True)
+        other = Cube(4)
+        other.decode(cube.encode())
+        assert (other.facelets == cube.facelets).all()
+        assert len(cube.encode()) == 32
+
+    def testCanonical(self):
+        solved = bytes(CubeState(3).facelets)
+        for symmetry in range(48):
+            assert solver.symmetryFacelets(solved, symmetry) == solved
+
+        state = CubeState(3)
+        state.apply('RU UL1 FC LU')
+        facelets = bytes(state.facelets)
+        code, symmetries = solver.canonicalFacelets(facelets)
+        turned = solver.symmetryFacelets(facelets, symmetries[0])
+        assert solver.encodeFacelets(turned) == code
+        for symmetry in range(48):
+            turned = solver.symmetryFacelets(facelets, symmetry)
+            assert solver.canonicalFacelets(turned)[0] == code
+
+        # the same moves made after turning the whole cube
+        conjugate = CubeState(3)
+        conjugate.apply('FC FC1 FC2 RU UL1 FC LU FA FA1 FA2')
+        assert conjugate != state
+        assert solver.canonicalFacelets(bytes(conjugate.facelets))[0] == code
+
+        # without relabeling only turning the whole cube is the same state
+        state.apply('FC FC1 FC2')
+        rotated = bytes(state.facelets)
+        assert (solver.canonicalFacelets(rotated, relabel=False)[0] ==
+                solver.canonicalFacelets(facelets, relabel=False)[0])
+        self.assertRaises(ValueError, solver.symmetryFacelets, facelets, 48)
+
+    def testInvalidStates(self):
+        facelets = CubeState(3).facelets.copy()
+        facelets[0], facelets[9] = facelets[9], facelets[0]
+        self.assertRaises(ValueError, solver.encodeFacelets, bytes(facelets))
+        self.assertRaises(ValueError, CubeState(3).decode, b'\xff' * 9)
+        self.assertRaises(ValueError, CubeState(3).setFacelets, facelets)
+
+        # two edges swapped
+        facelets = CubeState(3).facelets.copy()
+        facelets[[10, 19]] = facelets[[19, 10]]
+        self.assertRaises(ValueError, solver.encodeFacelets, bytes(facelets))
+
+        # the code of two edges swapped
+        code = (2048).to_bytes(9, 'big')
+        self.assertRaises(ValueError, solver.decodeFacelets, code)
+        self.assertRaises(ValueError, CubeState(3).decode, code)
+        self.assertRaises(ValueError, Cube(3).decode, code)
+
+class BenchmarkTestCase(unittest.TestCase):
+    def testRunBenchmarks(self):
+        import benchmark, json
+        directory = tempfile.mkdtemp()
+        try:
+            output = os.path.join(directory, 'benchmark.json')
+            assert benchmark.main(['benchmark.py', '4', '3', output]) == 0
+            with open(output) as f:
+                results = json.load(f)
+            assert benchmark.main(['benchmark.py', '4', '3', output, output]) == 0
+        finally:
+            shutil.rmtree(directory)
+
+        assert sorted(results['engines']) == ['cubex', 'pocket', 'twophase']
+        for name, result in results['engines'].items():
+            assert result['count'] == 4
+            assert result['failed'] == result['wrong'] == 0
+            assert result['latency']['p50'] <= result['latency']['p99']
+            assert numpy.sum(list(result['moves']['histogram'].values())) == 4
+            assert len(result['phases']) == len(benchmark.engines[name][2])
+
+    def testTwoPhaseSplit(self):
+        s = solver.Solver(engine='twophase')
+        for cells in scrambleStates(3, 10, seed=5, uniform=True):
+            state = CubeState(3)
+            state.cells[:] = cells
+            s.loadCube(state)
+            solution = s.solveCube()
+            phase1, phase2 = s.phases
+            assert phase1 + phase2 == len(solution)
+
+            # Phase 1 ends with the U and D facelets all U or D colors, and
+            # the F and B facelets of the middle layer all F or B colors
+            state.apply(solution[:phase1])
+            faces = state.facelets.reshape(6, 9)
+            assert numpy.isin(faces[[0, 5]], [1, 6]).all()
+            assert numpy.isin(faces[[1, 3]][:, [3, 5]], [2, 4]).all()
+
+            # Phase 2 only turns U and D, and the other faces by half turns
+            rest = solution[phase1:]
+            i = 0
+            while i < len(rest):
+                if rest[i][0] in 'UD':
+                    i += 1
+                else:
+                    assert rest[i + 1] == rest[i]
+                    i += 2
+            state.apply(rest)
+            assert state.isSolved()
+
+class MicrobenchmarkTestCase(unittest.TestCase):
+    def testRunBenchmarks(self):
+        import microbenchmark
+        results = microbenchmark.runBenchmarks(minTime=0.001)
+        assert sorted(results['sizes']) == ['2', '3', '4', '5', '6', '7']
+        for rates in results['sizes'].values():
+            assert len(rates) == 7
+            assert numpy.min(list(rates.values())) > 0
+
+        lines = microbenchmark.report(results, results)
+        assert len(lines) == 1 + 7 + 1 + len(results['quaternion'])
+        assert 'x1.00' in lines[1]
+
+class FrameStatsTestCase(unittest.TestCase):
+    def setUp(self):
+        import framestats, types
+        self.now = [0.]
+        self.module = types.SimpleNamespace(glBegin=lambda: 'begun', GL_NONE=0)
+        self.counter = framestats.GLCallCounter([self.module])
+        self.stats = framestats.FrameStats(window=10, clock=lambda: self.now[0],
+                                           counter=self.counter)
+
+    def frame(self, source, scene, calls=0):
+        self.stats.begin(source)
+        for name in ['update', 'draw', 'swap']:
+            self.now[0] += 0.001
+            self.stats.lap(name)
+        for i in range(calls):
+            assert self.module.glBegin() == 'begun'
+        self.stats.end(scene)
+        self.now[0] += 0.013
+
+    def testFrames(self):
+        for i in range(20):
+            self.frame('mouseMove', i // 4)
+        assert len(self.stats.frames) == 10
+        frame = self.stats.frames[-1]
+        assert list(frame.laps) == ['update', 'draw', 'swap']
+        assert abs(frame.laps['draw'] - 0.001) < 1e-9
+        assert frame.calls is None
+
+        lines = self.stats.summary()
+        assert lines[0] == "10 frames, 62.5 fps, 8 redundant (80%)"
+        assert lines[-1] == "mouseMove 10 (8 redundant)"
+
+        self.stats.invalidate()
+        self.frame('display', 4)
+        assert not self.stats.frames[-1].redundant
+
+    def testCountCalls(self):
+        assert self.stats.toggle() == 'screen'
+        self.frame('keyboard', 0, calls=3)
+        assert self.stats.frames[-1].calls == 3
+        assert "gl calls mean 3  max 3 per frame" in self.stats.summary()
+
+        assert self.stats.toggle() == 'stdout'
+        assert self.stats.toggle() == 'off'
+        self.frame('keyboard', 1, calls=2)
+        assert self.stats.frames[-1].calls is None
+        assert self.counter.count == 3
+
 class QuaternionTestCase(unittest.TestCase):
     def setUp(self):
         self.quat = Quaternion()
@@ -103,6 +969,45 @@ class QuaternionTestCase(unittest.TestCase):
         assert z == 0.0
         assert r % 360 < 0.0001 or r % 360 > 359.9999
 
+    def testBatchedMultiply(self):
+        a = fromEuler(90., 0., 30.)
+        b = fromXYZR([1., 2., 3.], 45.)
+        c = multiplyArrays([a.elements] * 3, b.elements)
+        assert (abs(c - (a * b).elements) < 1e-12).all()
+
+    def testCubeRotations(self):
+        rotations, products = cubeRotations()
+        assert rotations.shape == (24, 4)
+        assert (products[0] == range(24)).all()
+        for i in range(24):
+            assert sorted(products[i]) == list(range(24))
+
+    def testOrientations(self):
+        quats = Orientations(4)
+        exact = Orientations(4, exact=True)
+        for rows, rot in (([0, 1], [90., 0., 0.]), ([1, 2], [0., -90., 0.]),
+                          ([0, 2, 3], [0., 0., 90.])):
+            quats.rotateEuler(rows, rot)
+            exact.rotateEuler(rows, rot)
+
+        q = Quaternion()
+        q.rotateEuler([90., 0., 0.])
+        q.rotateEuler([0., 0., 90.])
+        assert (abs(quats.elements[0] - q.elements) < 1e-12).all()
+        assert (abs(abs((quats.elements * exact.elements).sum(1)) - 1) < 1e-9).all()
+        self.assertRaises(ValueError, exact.rotateEuler, [0], [30., 0., 0.])
+
+    def testNoDrift(self):
+        # Two quarter turns around different axes make a third of a turn
+        box = Box(0, 0, [0., 0., 0.])
+        for i in range(3000):
+            box.rotateBox([90., 0., 0.])
+            box.rotateBox([0., 0., -90.])
+            if i % 3 == 0:
+                assert box.side != [1, 2, 3, 4, 5, 6]
+        assert box.side == [1, 2, 3, 4, 5, 6]
+        assert (box.orientations.matrices()[0] == identity(4)).all()
+
     def testFromEuler(self):
         q = fromEuler(90., 0., 0.)
         x, y, z, r = q.getAngleAxis()
@@ -114,9 +1019,29 @@ class QuaternionTestCase(unittest.TestCase):
 
 if __name__ == '__main__':
     cubeSuite = unittest.makeSuite(CubeTestCase, 'test')
+    solverSuite = unittest.makeSuite(SolverTestCase, 'test')
+    cacheSuite = unittest.makeSuite(SolutionCacheTestCase, 'test')
+    reductionSuite = unittest.makeSuite(ReductionTestCase, 'test')
+    offscreenSuite = unittest.makeSuite(OffscreenTestCase, 'test')
+    stateSuite = unittest.makeSuite(CubeStateTestCase, 'test')
+    permutationSuite = unittest.makeSuite(PermutationTestCase, 'test')
+    codeSuite = unittest.makeSuite(StateCodeTestCase, 'test')
+    benchmarkSuite = unittest.makeSuite(BenchmarkTestCase, 'test')
+    microbenchmarkSuite = unittest.makeSuite(MicrobenchmarkTestCase, 'test')
+    frameStatsSuite = unittest.makeSuite(FrameStatsTestCase, 'test')
     quatSuite = unittest.makeSuite(QuaternionTestCase, 'test')
 
     runner = unittest.TextTestRunner()
     runner.run(cubeSuite)
+    runner.run(solverSuite)
+    runner.run(cacheSuite)
+    runner.run(reductionSuite)
+    runner.run(offscreenSuite)
+    runner.run(stateSuite)
+    runner.run(permutationSuite)
+    runner.run(codeSuite)
+    runner.run(benchmarkSuite)
+    runner.run(microbenchmarkSuite)
+    runner.run(frameStatsSuite)
     runner.run(quatSuite)
 
@@ -12,6 +12,7 @@
 #include <string>
 using namespace std;
 #include "cubex.h"
+#include "statecode.h"
 
 // definition of cube class
 // Cubex constructor & destructor & count
@@ -29,7 +30,7 @@ Cubex::~Cubex()
 {
   numcubes--;
 }
-int Cubex::numcubes = 0;
+atomic<int> Cubex::numcubes(0);
 // version & author of the solver
 const char* Cubex::ver = ".505";
 const char* Cubex::author = "Eric Dietz (root@wrongway.org)";
@@ -1824,4 +1825,66 @@ const int Cubex::SolveCube()
   solution = s;
   return 0;
 }
+// read the 54 facelets off the cube as colors, in the order of the facelets
+// given to loadCube by the Python module
+const void Cubex::GetFacelets(unsigned char *v)
+{
+  for (int i = -1; i <= 1; i++) {
+    for (int j = -1; j <= 1; j++) {
+      v[i*3+j+4] = *face(j, 2, -i);
+      v[i*3+j+13] = *face(-2, -i, -j);
+      v[i*3+j+22] = *face(j, -i, -2);
+      v[i*3+j+31] = *face(2, -i, j);
+      v[i*3+j+40] = *face(-j, -i, 2);
+      v[i*3+j+49] = *face(j, -2, i);
+    }
+  }
+}
+// set the cube from 54 facelets as colors, see GetFacelets
+const void Cubex::SetFacelets(const unsigned char *v)
+{
+  cubeinit = false;
+  for (int i = -1; i <= 1; i++) {
+    for (int j = -1; j <= 1; j++) {
+      *face(j, 2, -i) = v[i*3+j+4];
+      *face(-2, -i, -j) = v[i*3+j+13];
+      *face(j, -i, -2) = v[i*3+j+22];
+      *face(2, -i, j) = v[i*3+j+31];
+      *face(-j, -i, 2) = v[i*3+j+40];
+      *face(j, -2, i) = v[i*3+j+49];
+    }
+  }
+  cubeinit = true;
+}
+// pack the cube into the STATE_CODE_SIZE bytes of statecode.h, returns 0
+// or the error of encodeFacelets
+const int Cubex::Encode(unsigned char *code)
+{
+  unsigned char v[54];
+  GetFacelets(v);
+  return encodeFacelets(v, code);
+}
+// set the cube from a code of Encode, returns false if it isn't one
+const bool Cubex::Decode(const unsigned char *code)
+{
+  unsigned char v[54];
+  if (decodeFacelets(code, v) != 0) return false;
+  SetFacelets(v);
+  return true;
+}
+// pack the smallest code of the cube turned by any of the symmetries, with
+// the colors turned along if 'relabel', see canonicalFacelets
+const int Cubex::Canonical(unsigned char *code, bool relabel)
+{
+  unsigned char v[54];
+  GetFacelets(v);
+  return canonicalFacelets(v, code, relabel, NULL);
+}
+// set the cube to a state drawn uniformly from all states, see randomFacelets
+const void Cubex::RandomState(std::mt19937_64 &rng)
+{
+  unsigned char v[54];
+  randomFacelets(rng, v);
+  SetFacelets(v);
+}
 // end of cube class definitions
@@ -13,6 +13,8 @@
 
 // required includes/namespace
 #include <string>
+#include <random>
+#include <atomic>
 using namespace std;
 
 // Class declaration - class members/methods, some encapsulated
@@ -21,7 +23,7 @@ class Cubex
 public:
   Cubex();
   virtual ~Cubex();
-  static int numcubes;
+  static atomic<int> numcubes; // cubes are made by several threads
   const static char* ver;
   const static char* author;
   const static int N = 3; // <-- size of the cube (NxNxN)
@@ -83,6 +85,12 @@ public:
   const int FindCorn(int a, int b, int c);
   const string Concise(string a);
   const string Efficient(string a);
+  const void GetFacelets(unsigned char *v);
+  const void SetFacelets(const unsigned char *v);
+  const int Encode(unsigned char *code);
+  const bool Decode(const unsigned char *code);
+  const int Canonical(unsigned char *code, bool relabel);
+  const void RandomState(std::mt19937_64 &rng);
   int fx;
   int fy;
   int fz;
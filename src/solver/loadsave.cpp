@@ -6,6 +6,7 @@
 
 // includes
 #include "loadsave.h"
+#include "statecode.h"
 
 // declarations
 
@@ -81,4 +82,22 @@ cube->Cub[-1+2][-2+2][ 1+2], cube->Cub[ 0+2][-2+2][ 1+2], cube->Cub[ 1+2][-2+2][
   return 0;
 }
 
+// binary loader, returns 1 if there is no cube to read
+int loadbinary (FILE *fp, Cubex *cube)
+{
+  unsigned char code[STATE_CODE_SIZE];
+  if (fread(code, 1, STATE_CODE_SIZE, fp) != (size_t) STATE_CODE_SIZE) return 1;
+  return cube->Decode(code) ? 0 : 1;
+}
+
+// binary saver, returns the error of Cubex::Encode
+int savebinary (FILE *fp, Cubex *cube)
+{
+  unsigned char code[STATE_CODE_SIZE];
+  int error = cube->Encode(code);
+  if (error != 0) return error;
+  if (fwrite(code, 1, STATE_CODE_SIZE, fp) != (size_t) STATE_CODE_SIZE) return 1;
+  return 0;
+}
+
 //
@@ -11,4 +11,8 @@
 int loadcube (FILE *fp, Cubex *cube);
 int savecube (FILE *fp, Cubex *cube);
 
+// binary, STATE_CODE_SIZE bytes per cube as made by Cubex::Encode
+int loadbinary (FILE *fp, Cubex *cube);
+int savebinary (FILE *fp, Cubex *cube);
+
 //
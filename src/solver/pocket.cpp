@@ -0,0 +1,268 @@
+/*
+ * pocket.cpp
+ * An optimal solver for the 2x2x2 cube. See pocket.h.
+ */
+
+#include <cstring>
+#include <vector>
+using namespace std;
+#include "pocket.h"
+
+/* Corners, in the order used by the coordinates */
+enum { URF, UFL, ULB, UBR, DFR, DLF, DBL, DRB };
+
+/* Faces, numbered like the facelets given to loadCube */
+enum { FACE_U, FACE_F, FACE_R, FACE_B, FACE_L, FACE_D };
+
+/* The faces of every corner, clockwise from the U or D face */
+static const int cornerFaces[8][3] = {
+  { FACE_U, FACE_R, FACE_F }, { FACE_U, FACE_F, FACE_L },
+  { FACE_U, FACE_L, FACE_B }, { FACE_U, FACE_B, FACE_R },
+  { FACE_D, FACE_F, FACE_R }, { FACE_D, FACE_L, FACE_F },
+  { FACE_D, FACE_B, FACE_L }, { FACE_D, FACE_R, FACE_B }
+};
+
+/* Colors of the opposite faces of a solved cube */
+static const int oppositeColor[7] = { 0, 6, 4, 5, 2, 3, 1 };
+
+/* The moves are numbered face * 3 + turns - 1, with the faces in the */
+/* order U, R, F. These are the actions of Cube.doAction that turn each */
+/* face clockwise and anticlockwise. */
+static const char *clockwise[3] = { "UL", "FC", "LD" };
+static const char *anticlockwise[3] = { "UR", "FA", "LU" };
+
+/* The face turns, as the permutation and orientation each one applies */
+static const unsigned char turnPerm[3][8] = {
+  { UBR, URF, UFL, ULB, DFR, DLF, DBL, DRB },
+  { DFR, UFL, ULB, URF, DRB, DLF, DBL, UBR },
+  { UFL, DLF, ULB, UBR, URF, DFR, DBL, DRB }
+};
+static const unsigned char turnTwist[3][8] = {
+  { 0, 0, 0, 0, 0, 0, 0, 0 },
+  { 2, 0, 0, 1, 1, 0, 0, 2 },
+  { 1, 2, 0, 0, 2, 1, 0, 0 }
+};
+
+/* The corners that move, all but DBL */
+static const int moving[7] = { URF, UFL, ULB, UBR, DFR, DLF, DRB };
+
+/* Move tables, and the distance of every state from the solved state */
+static unsigned short (*permMove)[N_POCKET_MOVES] = NULL;
+static unsigned short (*twistMove)[N_POCKET_MOVES] = NULL;
+static signed char *distances = NULL;
+
+/* Apply the face turn 'f' to the corners */
+static void turn(unsigned char *cp, unsigned char *co, int f)
+{
+  unsigned char p[8], o[8];
+  for (int i = 0; i < 8; i++) {
+    p[i] = cp[turnPerm[f][i]];
+    o[i] = (co[turnPerm[f][i]] + turnTwist[f][i]) % 3;
+  }
+  memcpy(cp, p, 8); memcpy(co, o, 8);
+}
+
+/* Coordinates of the moving corners, and their inverses */
+static int getPerm(const unsigned char *cp)
+{
+  int index = 0;
+  for (int i = 0; i < 7; i++) {
+    int smaller = 0;
+    for (int j = i + 1; j < 7; j++) if (cp[moving[j]] < cp[moving[i]]) smaller++;
+    index = index * (7 - i) + smaller;
+  }
+  return index;
+}
+static void setPerm(unsigned char *cp, int index)
+{
+  int digits[7];
+  unsigned char left[7];
+  for (int i = 6; i >= 0; i--) { digits[i] = index % (7 - i); index /= 7 - i; }
+  for (int i = 0; i < 7; i++) left[i] = moving[i];
+  for (int i = 0; i < 7; i++) {
+    cp[moving[i]] = left[digits[i]];
+    for (int j = digits[i]; j < 6 - i; j++) left[j] = left[j + 1];
+  }
+  cp[DBL] = DBL;
+}
+static int getTwist(const unsigned char *co)
+{
+  int t = 0;
+  for (int i = 0; i < 6; i++) t = 3 * t + co[moving[i]];
+  return t;
+}
+static void setTwist(unsigned char *co, int t)
+{
+  int sum = 0;
+  for (int i = 5; i >= 0; i--) { co[moving[i]] = t % 3; sum += co[moving[i]]; t /= 3; }
+  co[DBL] = 0;
+  co[DRB] = (3 - sum % 3) % 3;
+}
+
+// definition of the solver class
+Pocket::Pocket()
+{
+  solution = "";
+  moves = 0;
+  seconds = 0;
+  for (int i = 0; i < 8; i++) { cp[i] = i; co[i] = 0; }
+}
+
+bool Pocket::TablesReady()
+{
+  return distances != NULL;
+}
+
+// build the move tables and the distances, only done once
+void Pocket::InitTables()
+{
+  if (distances != NULL) return;
+
+  unsigned short (*pm)[N_POCKET_MOVES] = new unsigned short[N_POCKET_PERM][N_POCKET_MOVES];
+  unsigned short (*tm)[N_POCKET_MOVES] = new unsigned short[N_POCKET_TWIST][N_POCKET_MOVES];
+  unsigned char p[8], o[8];
+
+  for (int i = 0; i < N_POCKET_PERM; i++) {
+    for (int f = 0; f < 3; f++) {
+      setPerm(p, i); memset(o, 0, 8);
+      for (int k = 0; k < 3; k++) {
+        turn(p, o, f);
+        pm[i][f * 3 + k] = getPerm(p);
+      }
+    }
+  }
+  for (int i = 0; i < N_POCKET_TWIST; i++) {
+    for (int f = 0; f < 3; f++) {
+      for (int j = 0; j < 8; j++) p[j] = j;
+      setTwist(o, i);
+      for (int k = 0; k < 3; k++) {
+        turn(p, o, f);
+        tm[i][f * 3 + k] = getTwist(o);
+      }
+    }
+  }
+
+  // breadth first from the solved state
+  signed char *d = new signed char[N_POCKET_PERM * N_POCKET_TWIST];
+  memset(d, -1, N_POCKET_PERM * N_POCKET_TWIST);
+  vector<int> frontier(1, 0), next;
+  d[0] = 0;
+  for (int depth = 1; !frontier.empty(); depth++) {
+    next.clear();
+    for (size_t k = 0; k < frontier.size(); k++) {
+      int perm = frontier[k] / N_POCKET_TWIST, twist = frontier[k] % N_POCKET_TWIST;
+      for (int m = 0; m < N_POCKET_MOVES; m++) {
+        int j = pm[perm][m] * N_POCKET_TWIST + tm[twist][m];
+        if (d[j] < 0) { d[j] = depth; next.push_back(j); }
+      }
+    }
+    frontier.swap(next);
+  }
+
+  permMove = pm;
+  twistMove = tm;
+  distances = d;
+}
+
+// read the corners off the facelets of a 2x2x2 cube, returns 1 if they
+// are not the corners of a cube and 7 if they are twisted
+int Pocket::LoadFacelets(const unsigned char *facelets)
+{
+  int color[24], face[7], cornerAt[8][3];
+  bool seen[8];
+
+  for (int i = 0; i < 24; i++) {
+    color[i] = facelets[i] >= '0' ? facelets[i] - '0' : facelets[i];
+    if (color[i] < 1 || color[i] > 6) return 1;
+  }
+
+  // find the facelets of every corner position, the layout is that of
+  // Cube.facelets with the rows and columns of the face
+  for (int i = 0; i < 8; i++) {
+    int x = 0, y = 0, z = 0;
+    for (int l = 0; l < 3; l++) {
+      switch (cornerFaces[i][l]) {
+        case FACE_D: y = 1; break;
+        case FACE_B: z = 1; break;
+        case FACE_R: x = 1; break;
+      }
+    }
+    for (int k = 0; k < 3; k++) {
+      int r, c;
+      switch (cornerFaces[i][k]) {
+        case FACE_U: r = x; c = z; break;
+        case FACE_F: r = y; c = x; break;
+        case FACE_R: r = y; c = z; break;
+        case FACE_B: r = y; c = 1 - x; break;
+        case FACE_L: r = y; c = 1 - z; break;
+        default: r = 1 - x; c = z; break;
+      }
+      cornerAt[i][k] = color[cornerFaces[i][k] * 4 + r * 2 + c];
+    }
+  }
+
+  // there are no centers, the DBL corner stays put and tells the faces
+  for (int i = 0; i < 7; i++) face[i] = -1;
+  for (int k = 0; k < 3; k++) {
+    int c = cornerAt[DBL][k], f = cornerFaces[DBL][k];
+    if (face[c] >= 0 || face[oppositeColor[c]] >= 0) return 1;
+    face[c] = f;
+    face[oppositeColor[c]] = f == FACE_D ? FACE_U : f == FACE_B ? FACE_F : FACE_R;
+  }
+
+  // identify the corners
+  for (int j = 0; j < 8; j++) seen[j] = false;
+  int twist = 0;
+  for (int i = 0; i < 8; i++) {
+    int f[3];
+    for (int k = 0; k < 3; k++) f[k] = face[cornerAt[i][k]];
+    int ori;
+    for (ori = 0; ori < 3; ori++)
+      if (f[ori] == FACE_U || f[ori] == FACE_D) break;
+    if (ori == 3) return 1;
+    int j;
+    for (j = 0; j < 8; j++)
+      if (cornerFaces[j][0] == f[ori] && cornerFaces[j][1] == f[(ori + 1) % 3] &&
+          cornerFaces[j][2] == f[(ori + 2) % 3]) break;
+    if (j == 8 || seen[j]) return 1;
+    seen[j] = true;
+    cp[i] = j; co[i] = ori;
+    twist += ori;
+  }
+  if (twist % 3) return 7;
+  return 0;
+}
+
+// find a shortest solution of the loaded cube, returns 0 when one was
+// found
+int Pocket::Solve()
+{
+  if (distances == NULL) return 1;
+
+  chrono::steady_clock::time_point start = chrono::steady_clock::now();
+  int perm = getPerm(cp), twist = getTwist(co);
+
+  solution = "";
+  moves = 0;
+  for (int d = distances[perm * N_POCKET_TWIST + twist]; d > 0; d--) {
+    int m;
+    for (m = 0; m < N_POCKET_MOVES; m++) {
+      int p = permMove[perm][m], t = twistMove[twist][m];
+      if (distances[p * N_POCKET_TWIST + t] == d - 1) {
+        perm = p; twist = t;
+        break;
+      }
+    }
+    if (m == N_POCKET_MOVES) return 1;
+
+    int f = m / 3, turns = m % 3 + 1;
+    if (turns == 3) { solution += anticlockwise[f]; solution += "."; }
+    else {
+      for (int k = 0; k < turns; k++) { solution += clockwise[f]; solution += "."; }
+    }
+    moves++;
+  }
+
+  seconds = chrono::duration<double>(chrono::steady_clock::now() - start).count();
+  return 0;
+}
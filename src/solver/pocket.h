@@ -0,0 +1,35 @@
+/*
+ * pocket.h
+ * An optimal solver for the 2x2x2 cube. With the down-back-left corner
+ * kept in place, the cube has 7! * 3^6 states, few enough to keep the
+ * distance to the solved state of every one of them. Solving is then
+ * just following the distances down.
+ */
+
+#ifndef _POCKET_H_
+#define _POCKET_H_
+
+#include <string>
+#include <chrono>
+using namespace std;
+
+const int N_POCKET_PERM = 5040;  /* 7! permutations of the moving corners */
+const int N_POCKET_TWIST = 729;  /* 3^6 orientations of the moving corners */
+const int N_POCKET_MOVES = 9;    /* U, R and F, each turned 1, 2 or 3 times */
+
+class Pocket
+{
+public:
+  Pocket();
+  static void InitTables();
+  static bool TablesReady();
+  int LoadFacelets(const unsigned char *facelets);
+  int Solve();
+  string solution; /* moves in the notation of Cubex, e.g. "UL.FC." */
+  int moves;       /* number of face turns in the solution */
+  double seconds;  /* time spent searching */
+private:
+  unsigned char cp[8], co[8];
+};
+
+#endif /* _POCKET_H_ */
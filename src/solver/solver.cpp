@@ -8,23 +8,185 @@
  */
 
 /* More or less just to see what we can access from Python */
-static PyObject *init( PyObject * self, PyObject * args ); 
+static PyObject *init( PyObject * self, PyObject * args, PyObject * kwds );
 static PyObject *solveCube( PyObject * self, PyObject * args ); 
 static PyObject *loadCube( PyObject * self, PyObject * args ); 
 static PyObject *isSolved( PyObject * self, PyObject * args ); 
+static PyObject *solveMany( PyObject * self, PyObject * args, PyObject * kwds );
+static PyObject *setEngine( PyObject * self, PyObject * args );
+static PyObject *tableStatus( PyObject * self, PyObject * args );
+static PyObject *encodeStates( PyObject * self, PyObject * args );
+static PyObject *decodeStates( PyObject * self, PyObject * args );
+static PyObject *canonicalStates( PyObject * self, PyObject * args, PyObject * kwds );
+static PyObject *symmetryStates( PyObject * self, PyObject * args, PyObject * kwds );
+static PyObject *randomStates( PyObject * self, PyObject * args, PyObject * kwds );
+static bool prepareTables( const string &path );
+static void readyTables();
+
+/* Methods of the Solver type */
+static PyObject *Solver_new( PyTypeObject * type, PyObject * args, PyObject * kwds );
+static void Solver_dealloc( SolverObject * self );
+static PyObject *Solver_reset( SolverObject * self, PyObject * args );
+static PyObject *Solver_solveCube( SolverObject * self, PyObject * args );
+static PyObject *Solver_loadCube( SolverObject * self, PyObject * args );
+static PyObject *Solver_isSolved( SolverObject * self, PyObject * args );
+static PyObject *Solver_getEngine( SolverObject * self, void * closure );
+static PyObject *Solver_getPhases( SolverObject * self, void * closure );
+static void setPhases( SolverObject * self, int result );
+static int Solver_setEngine( SolverObject * self, PyObject * value, void * closure );
+
+/* The solver behind the module level functions */
+static SolverObject *defaultSolver = NULL;
+
+/* The table file of the two-phase search, and the file the tables in */
+/* memory were mapped from or saved to. The tables are got ready without */
+/* the GIL, so these and the tables are guarded by 'tablesLock'. */
+static string tablePath;
+static string tablesFile;
+static bool verifyTables = false;
+static PyThread_type_lock tablesLock = NULL;
  
 /* Python module stuff */
 PyDoc_STRVAR( solver_module__doc__, "A Rubik's cube solver wrapper written in C++" ); 
 PyDoc_STRVAR( solver__doc__, "A Rubik's cube solver wrapper written in C++" ); 
+PyDoc_STRVAR( Solver__doc__,
+    "Solver(engine='cubex', maxMoves=22, timeout=1.0)\n\n"
+    "A solver with a cube of its own. Solving releases the GIL, so separate\n"
+    "Solver objects can solve cubes in parallel from several threads.\n\n"
+    "'engine' is 'cubex' for the layer by layer solver, or 'twophase' for a\n"
+    "Kociemba style two-phase search. The two-phase search stops at the\n"
+    "first solution of at most 'maxMoves' face turns, or once it has a\n"
+    "solution and has searched for 'timeout' seconds. After every solve,\n"
+    "'moves' holds the length of the solution and 'searchTime' the seconds\n"
+    "it took." );
+PyDoc_STRVAR( init__doc__,
+    "init(tables=None, verify=False)\n\n"
+    "Reset the cube of the module level functions. The tables of the\n"
+    "two-phase search are got ready by its first solve: mapped from the\n"
+    "table file, or built and written to it if it is missing, out of date\n"
+    "or of the wrong size. 'tables' is the path of the table file, by\n"
+    "default $PYCUBE_TABLES or pycube/twophase.tables in the user's cache\n"
+    "directory. If it can't be written the tables are kept in memory. A\n"
+    "table file is checked against its checksum, reading every page of it,\n"
+    "the first time it is used and whenever it changed since, as recorded\n"
+    "in a '.verified' stamp file next to it. With 'verify' it is checked\n"
+    "every time." );
+PyDoc_STRVAR( tableStatus__doc__,
+    "tableStatus() -> (status, path)\n\n"
+    "How the tables of the two-phase search were made: 'unloaded', 'built'\n"
+    "in memory or 'mapped' from a table file. 'path' is the table file\n"
+    "backing them, or None." );
+PyDoc_STRVAR( engine__doc__, "The search engine, 'cubex' or 'twophase'" );
+PyDoc_STRVAR( phases__doc__,
+    "The moves of every phase of the last solution: the 8 steps of the layer\n"
+    "by layer solver, counted before the solution is shortened, the 2\n"
+    "phases of the two-phase search, adding up to 'moves' as half turns\n"
+    "count twice there too, or the single search of a 2x2x2 cube.\n"
+    "Empty if the last solve failed." );
+PyDoc_STRVAR( setEngine__doc__,
+    "setEngine(engine)\n\n"
+    "Set the search engine of the module level functions" );
+PyDoc_STRVAR( solveMany__doc__,
+    "solveMany(facelets, workers=1, engine='cubex', maxMoves=22, timeout=1.0)\n"
+    "    -> (moves, lengths)\n\n"
+    "Solve every cube in a buffer of packed facelets, 54 bytes per cube in\n"
+    "the order of loadCube, as colors (1-6) or color digits ('1'-'6').\n"
+    "'moves' holds the two-char moves of all solutions back to back and\n"
+    "'lengths' the number of moves of each solution, or -1 if a cube\n"
+    "could not be solved. 'workers' threads are used, 0 means one per CPU.\n"
+    "The other arguments are those of Solver." );
+
+PyDoc_STRVAR( encodeFacelets__doc__,
+    "encodeFacelets(facelets) -> bytes\n\n"
+    "Encode every cube in a buffer of packed facelets, 54 bytes per cube as\n"
+    "for solveMany, into the 9 byte codes of statecode.h, back to back. The\n"
+    "codes are the same as those of CubeState.encode. Raises ValueError if\n"
+    "a cube can't be encoded." );
+PyDoc_STRVAR( decodeFacelets__doc__,
+    "decodeFacelets(codes) -> bytes\n\n"
+    "Decode a buffer of 9 byte codes back into facelets, 54 colors (1-6)\n"
+    "per cube." );
+PyDoc_STRVAR( canonicalFacelets__doc__,
+    "canonicalFacelets(facelets, relabel=True) -> (codes, symmetries)\n\n"
+    "Encode every cube in a buffer of packed facelets into the smallest code\n"
+    "of the cubes it turns into under the 48 symmetries of the cube, with\n"
+    "the colors turned along ('relabel'), or under the 24 rotations with the\n"
+    "colors left as they are. Symmetric cubes get the same code. 'symmetries'\n"
+    "holds one byte per cube, the symmetry of symmetryFacelets giving its\n"
+    "code. Raises ValueError if a cube can't be encoded." );
+PyDoc_STRVAR( symmetryFacelets__doc__,
+    "symmetryFacelets(facelets, symmetry, relabel=True) -> bytes\n\n"
+    "Turn every cube in a buffer of packed facelets by a symmetry: 0 is the\n"
+    "identity, 1-23 the other rotations and 24-47 the mirror images. With\n"
+    "'relabel' the colors are turned too, so the solved cube stays solved." );
+PyDoc_STRVAR( randomFacelets__doc__,
+    "randomFacelets(count, seed=None) -> bytes\n\n"
+    "Draw 'count' cubes uniformly from all states with the centers in place,\n"
+    "as packed facelets for solveMany, 54 colors (1-6) per cube. The same\n"
+    "'seed' always gives the same cubes." );
 
 /* Methods accessable from module */
 static PyMethodDef SolverMethods[] = {
-    { "init", init, METH_VARARGS, solver__doc__ }, 
+    { "init", (PyCFunction) init, METH_VARARGS | METH_KEYWORDS, init__doc__ },
     { "solveCube", solveCube, METH_VARARGS, solver__doc__ }, 
     { "loadCube", loadCube, METH_VARARGS, solver__doc__ }, 
     { "isSolved", isSolved, METH_VARARGS, solver__doc__ }, 
+    { "solveMany", (PyCFunction) solveMany, METH_VARARGS | METH_KEYWORDS, solveMany__doc__ },
+    { "setEngine", setEngine, METH_VARARGS, setEngine__doc__ },
+    { "tableStatus", tableStatus, METH_NOARGS, tableStatus__doc__ },
+    { "encodeFacelets", encodeStates, METH_VARARGS, encodeFacelets__doc__ },
+    { "decodeFacelets", decodeStates, METH_VARARGS, decodeFacelets__doc__ },
+    { "canonicalFacelets", (PyCFunction) canonicalStates,
+        METH_VARARGS | METH_KEYWORDS, canonicalFacelets__doc__ },
+    { "symmetryFacelets", (PyCFunction) symmetryStates,
+        METH_VARARGS | METH_KEYWORDS, symmetryFacelets__doc__ },
+    { "randomFacelets", (PyCFunction) randomStates,
+        METH_VARARGS | METH_KEYWORDS, randomFacelets__doc__ },
     { NULL, NULL, 0, NULL } 
 };
+
+/* Methods accessable from Solver objects */
+static PyMethodDef SolverObjectMethods[] = {
+    { "reset", (PyCFunction) Solver_reset, METH_NOARGS, solver__doc__ },
+    { "solveCube", (PyCFunction) Solver_solveCube, METH_NOARGS, solver__doc__ },
+    { "loadCube", (PyCFunction) Solver_loadCube, METH_VARARGS, solver__doc__ },
+    { "isSolved", (PyCFunction) Solver_isSolved, METH_NOARGS, solver__doc__ },
+    { NULL, NULL, 0, NULL }
+};
+
+/* Attributes of Solver objects */
+static PyMemberDef SolverObjectMembers[] = {
+    { (char *) "maxMoves", T_INT, offsetof(SolverObject, maxMoves), 0, NULL },
+    { (char *) "timeout", T_DOUBLE, offsetof(SolverObject, timeout), 0, NULL },
+    { (char *) "moves", T_INT, offsetof(SolverObject, moves), READONLY, NULL },
+    { (char *) "searchTime", T_DOUBLE, offsetof(SolverObject, searchTime), READONLY, NULL },
+    { NULL, 0, 0, 0, NULL }
+};
+
+static PyGetSetDef SolverObjectGetSet[] = {
+    { (char *) "engine", (getter) Solver_getEngine, (setter) Solver_setEngine,
+        engine__doc__, NULL },
+    { (char *) "phases", (getter) Solver_getPhases, NULL, phases__doc__, NULL },
+    { NULL, NULL, NULL, NULL, NULL }
+};
+
+static PyType_Slot SolverSlots[] = {
+    { Py_tp_new, (void *) Solver_new },
+    { Py_tp_dealloc, (void *) Solver_dealloc },
+    { Py_tp_methods, (void *) SolverObjectMethods },
+    { Py_tp_members, (void *) SolverObjectMembers },
+    { Py_tp_getset, (void *) SolverObjectGetSet },
+    { Py_tp_doc, (void *) Solver__doc__ },
+    { 0, NULL }
+};
+
+static PyType_Spec SolverSpec = {
+    "solver.Solver",            /* name */
+    sizeof(SolverObject),       /* basicsize */
+    0,                          /* itemsize */
+    Py_TPFLAGS_DEFAULT,         /* flags */
+    SolverSlots,                /* slots */
+};
  
 /* Setup method for the module */
 PyMODINIT_FUNC PyInit_solver( void )
@@ -40,103 +202,692 @@ PyMODINIT_FUNC PyInit_solver( void )
         NULL,                 /* m_clear */
         NULL,                 /* m_free */
     };
-    return PyModule_Create(&moduledef);
+    PyObject *module = PyModule_Create(&moduledef);
+    if (module == NULL) return NULL;
+
+    PyObject *type = PyType_FromSpec(&SolverSpec);
+    if (type == NULL || PyModule_AddObject(module, "Solver", type) < 0) {
+        Py_XDECREF(type);
+        Py_DECREF(module);
+        return NULL;
+    }
+
+    /* The tables are mapped or built by the first two-phase solve */
+    tablePath = defaultTablePath();
+    tablesLock = PyThread_allocate_lock();
+    if (tablesLock == NULL) {
+        PyErr_NoMemory();
+        Py_DECREF(module);
+        return NULL;
+    }
+
+    /* The module level functions keep working on a solver of their own */
+    defaultSolver = (SolverObject *) PyObject_CallObject(type, NULL);
+    if (defaultSolver == NULL) {
+        Py_DECREF(module);
+        return NULL;
+    }
+    Py_INCREF(defaultSolver);
+    if (PyModule_AddObject(module, "defaultSolver", (PyObject *) defaultSolver) < 0) {
+        Py_DECREF(defaultSolver);
+        Py_DECREF(module);
+        return NULL;
+    }
+
+    return module;
 }
 
-/* Init method, not _really_ neccassary */
-PyObject *init( PyObject * self, PyObject * args )
+/* Create a solver with a cube in the starting position */
+PyObject *Solver_new( PyTypeObject * type, PyObject * args, PyObject * kwds )
 {
-    Py_DECREF(args);
+    static const char *kwlist[] = { "engine", "maxMoves", "timeout", NULL };
+    const char *engineName = engineNames[ENGINE_CUBEX];
+    int maxMoves = defaultMaxMoves;
+    double timeout = defaultTimeout;
 
-    /* Starting position */
-    insertValues("111111111222222222333333333444444444555555555666666666");
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|sid:Solver",
+                (char **) kwlist, &engineName, &maxMoves, &timeout))
+        return NULL;
     
-    if (cube.cubeinit) return pyTrue();
+    int engine = engineIndex(engineName);
+    if (engine < 0) {
+        PyErr_Format(PyExc_ValueError, "unknown engine '%s'", engineName);
+        return NULL;
+    }
+
+    SolverObject *self = (SolverObject *) type->tp_alloc(type, 0);
+    if (self == NULL) return NULL;
+
+    self->lock = PyThread_allocate_lock();
+    if (self->lock == NULL) {
+        Py_DECREF(self);
+        return PyErr_NoMemory();
+    }
+
+    self->cube = new Cubex();
+    self->twophase = new TwoPhase();
+    self->pocket = new Pocket();
+    self->size = N;
+    self->engine = engine;
+    self->maxMoves = maxMoves;
+    self->timeout = timeout;
+    self->moves = 0;
+    self->searchTime = 0;
+    self->phaseCount = 0;
+    memcpy(self->facelets, startPosition, N*N*6);
+    insertValues(*self->cube, startPosition);
+
+    return (PyObject *) self;
+}
+
+void Solver_dealloc( SolverObject * self )
+{
+    PyTypeObject *type = Py_TYPE(self);
+
+    delete self->cube;
+    delete self->twophase;
+    delete self->pocket;
+    if (self->lock != NULL) PyThread_free_lock(self->lock);
+
+    type->tp_free((PyObject *) self);
+    Py_DECREF(type);
+}
+
+/* Put the solver's cube back in the starting position */
+PyObject *Solver_reset( SolverObject * self, PyObject * args )
+{
+    ACQUIRE_LOCK(self);
+    insertValues(*self->cube, startPosition);
+    memcpy(self->facelets, startPosition, N*N*6);
+    self->size = N;
+    bool ok = self->cube->cubeinit;
+    RELEASE_LOCK(self);
+
+    if (ok) return pyTrue();
     else return pyFalse();
 }
 
-/* Check if cube is solved */
-PyObject *isSolved( PyObject * self, PyObject * args )
+/* Check if the solver's cube is solved */
+PyObject *Solver_isSolved( SolverObject * self, PyObject * args )
 {
-    Py_DECREF(args);
+    ACQUIRE_LOCK(self);
+    bool solved;
+    if (self->size == 2) solved = faceletsSolved(self->facelets, 2);
+    else solved = self->cube->IsSolved();
+    RELEASE_LOCK(self);
 
-    if ( cube.IsSolved() ) return pyTrue();
+    if (solved) return pyTrue();
     else return pyFalse();
 }
 
-/* Load cube from Python into the Cubex class */
-PyObject *loadCube ( PyObject * self, PyObject * args )
+/* Load cube from Python into the solver's Cubex */
+PyObject *Solver_loadCube( SolverObject * self, PyObject * args )
 {
     /* Python object of type Cube */
     PyObject *pyCube;
-    PyArg_ParseTuple(args, "O", &pyCube);
+    if (!PyArg_ParseTuple(args, "O", &pyCube)) return NULL;
 
-    /* Get boxes list */
-    PyObject *boxes = PyObject_GetAttrString(pyCube, "boxes");
+    /* The cube keeps its facelets in a buffer, read them in place */
+    PyObject *facelets = PyObject_GetAttrString(pyCube, "facelets");
+    if (facelets == NULL) return NULL;
 
-    /* We only support 3^3 cubes at this time, get of our back! */
-    if (PyList_Size(boxes) != N*N*N) {
-        Py_DECREF(boxes);
+    Py_buffer view;
+    if (PyObject_GetBuffer(facelets, &view, PyBUF_SIMPLE) < 0) {
+        Py_DECREF(facelets);
+        return NULL;
+    }
+
+    /* We only support 2^3 and 3^3 cubes, get of our back! */
+    if (view.len != N*N*6 && view.len != 2*2*6) {
+        PyBuffer_Release(&view);
+        Py_DECREF(facelets);
         return pyFalse();
     }
-    
-    /* Number of faces */
-    int length = N*N*6;
-    char values[length];
-    
-    int level = 0;
-    for ( int i = 0; i < length; i++ ) {
-        /* New side */
-        if (( i % 9 == 0 ) && ( i != 0 )) level++;
-        
-        /* Figure out how the box is oriented */
-        PyObject *item = PyList_GetItem(boxes, idMap[i]);
-        Py_INCREF(item);
 
-        PyObject *sides = PyObject_GetAttrString( item, "side" );
-        /* Grab orientation for this side */
-        long int side = PyLong_AsLong( PyList_GetItem(sides, level) );
+    /* Insert the values into the Cubex class, Cubex doesn't do 2^3 cubes */
+    ACQUIRE_LOCK(self);
+    if (view.len == N*N*6) {
+        insertFacelets( *self->cube, (const unsigned char *) view.buf );
+        self->size = N;
+    }
+    else {
+        self->size = 2;
+    }
+    memcpy( self->facelets, view.buf, view.len );
+    RELEASE_LOCK(self);
 
-        /* Making a Cubex-compatable string */
-        values[i] = ((char) side + '0');
+    PyBuffer_Release(&view);
+    Py_DECREF(facelets);
+    return pyTrue();
+}
+
+/* Solve the cube loaded into the solver's Cubex */
+PyObject *Solver_solveCube( SolverObject * self, PyObject * args )
+{
+    int result;
+    string solution;
+
+    /* The small tables of the 2x2x2 cube are made while holding the GIL */
+    if (self->size == 2) Pocket::InitTables();
+
+    /* Solving only touches our own cube and the shared tables, which have */
+    /* a lock of their own, let other threads run */
+    ACQUIRE_LOCK(self);
+    Py_BEGIN_ALLOW_THREADS
+    if (self->size != 2 && self->engine == ENGINE_TWOPHASE) readyTables();
+    if (self->size == 2)
+        result = solvePocket(*self->pocket, self->facelets, solution,
+                self->searchTime);
+    else
+        result = solveFacelets(self->engine, *self->cube, *self->twophase,
+                self->facelets, self->maxMoves, self->timeout, solution,
+                self->searchTime);
+    Py_END_ALLOW_THREADS
+    self->moves = result == 0 ? solution.length() / 3 : 0;
+    setPhases(self, result);
+    RELEASE_LOCK(self);
 
-        Py_DECREF(sides);
+    /* Return empty list on failure */
+    if (result != 0) return PyList_New(0);
+
+    /* Every move is two chars and a dot */
+    Py_ssize_t moves = solution.length() / 3;
+    PyObject *list = PyList_New(moves);
+    if (list == NULL) return NULL;
+
+    for (Py_ssize_t i = 0; i < moves; i++) {
+        PyObject *pyString = PyUnicode_FromStringAndSize(solution.c_str() + i*3, 2);
+        if (pyString == NULL) {
+            Py_DECREF(list);
+            return NULL;
+        }
+        PyList_SET_ITEM(list, i, pyString);
     }
-    
-    /* Insert the values into the Cubex class */
-    insertValues( string(values, length) );
 
-    Py_DECREF(boxes);    
-    return pyTrue();
+    return list;
+}
+
+/* Keep the moves of every phase of a solve, holding the lock */
+void setPhases( SolverObject * self, int result )
+{
+    self->phaseCount = 0;
+    if (result != 0) return;
+
+    if (self->size == 2) {
+        self->phases[self->phaseCount++] = self->moves;
+    } else if (self->engine == ENGINE_TWOPHASE) {
+        self->phases[self->phaseCount++] = self->twophase->phase1;
+        self->phases[self->phaseCount++] = self->twophase->phase2;
+    } else {
+        for (int i = 1; i <= Cubex::MOV; i++)
+            self->phases[self->phaseCount++] = self->cube->mov[i];
+    }
+}
+
+PyObject *Solver_getPhases( SolverObject * self, void * closure )
+{
+    ACQUIRE_LOCK(self);
+    PyObject *phases = PyTuple_New(self->phaseCount);
+    for (int i = 0; phases != NULL && i < self->phaseCount; i++) {
+        PyObject *moves = PyLong_FromLong(self->phases[i]);
+        if (moves == NULL) Py_CLEAR(phases);
+        else PyTuple_SET_ITEM(phases, i, moves);
+    }
+    RELEASE_LOCK(self);
+    return phases;
+}
+
+PyObject *Solver_getEngine( SolverObject * self, void * closure )
+{
+    return PyUnicode_FromString(engineNames[self->engine]);
+}
+
+int Solver_setEngine( SolverObject * self, PyObject * value, void * closure )
+{
+    if (value == NULL) {
+        PyErr_SetString(PyExc_AttributeError, "cannot delete engine");
+        return -1;
+    }
+    const char *name = PyUnicode_AsUTF8(value);
+    if (name == NULL) return -1;
+
+    int engine = engineIndex(name);
+    if (engine < 0) {
+        PyErr_Format(PyExc_ValueError, "unknown engine '%s'", name);
+        return -1;
+    }
+
+    ACQUIRE_LOCK(self);
+    self->engine = engine;
+    RELEASE_LOCK(self);
+    return 0;
+}
+
+/* Get the tables of the two-phase search ready, mapping them from 'path' */
+/* or building them and saving them there. Returns false if they could */
+/* not be saved. */
+static bool prepareTables( const string &path )
+{
+    if (!TwoPhase::TablesReady() && !path.empty() &&
+            TwoPhase::LoadTables(path.c_str(), verifyTables)) {
+        tablesFile = path;
+        return true;
+    }
+
+    TwoPhase::InitTables();
+    if (path.empty() || path == tablesFile) return true;
+
+    string previous = tablesFile;
+    tablesFile = path;
+    makeParentDirs(path);
+    if (TwoPhase::SaveTables(path.c_str())) return true;
+
+    tablesFile = previous;
+    return false;
+}
+
+/* Get the tables ready for a solve, from the table file if possible. If */
+/* it can't be written the tables work as well from memory, so we don't */
+/* try again. Called without the GIL, mapping or building the tables */
+/* can take a while. */
+static void readyTables()
+{
+    PyThread_acquire_lock(tablesLock, 1);
+    if (!prepareTables(tablePath)) tablePath.clear();
+    PyThread_release_lock(tablesLock);
+}
+
+/* Init method, tells where the two-phase tables are found. Getting them */
+/* ready waits for the first two-phase solve. */
+PyObject *init( PyObject * self, PyObject * args, PyObject * kwds )
+{
+    static const char *kwlist[] = { "tables", "verify", NULL };
+    PyObject *path = NULL;
+    int verify = 0;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|O&p:init", (char **) kwlist,
+                PyUnicode_FSConverter, &path, &verify))
+        return NULL;
+
+    ACQUIRE(tablesLock);
+    if (path != NULL) {
+        tablePath = PyBytes_AS_STRING(path);
+        Py_DECREF(path);
+    }
+    verifyTables = verify;
+    PyThread_release_lock(tablesLock);
+
+    return Solver_reset(defaultSolver, NULL);
+}
+
+/* Tell how the tables were made and where they live */
+PyObject *tableStatus( PyObject * self, PyObject * args )
+{
+    const char *status = "unloaded";
+    ACQUIRE(tablesLock);
+    if (TwoPhase::TablesMapped()) status = "mapped";
+    else if (TwoPhase::TablesReady()) status = "built";
+    string file = tablesFile;
+    PyThread_release_lock(tablesLock);
+
+    if (file.empty()) return Py_BuildValue("(sO)", status, Py_None);
+    return Py_BuildValue("(sN)", status,
+            PyUnicode_DecodeFSDefault(file.c_str()));
+}
+
+/* Check if cube is solved */
+PyObject *isSolved( PyObject * self, PyObject * args )
+{
+    return Solver_isSolved(defaultSolver, NULL);
+}
+
+/* Load cube from Python into the Cubex class */
+PyObject *loadCube ( PyObject * self, PyObject * args )
+{
+    return Solver_loadCube(defaultSolver, args);
 }
 
 /* Solve the cube loaded into the Cubex class */
 PyObject *solveCube( PyObject * self, PyObject * args )
 {
-    /* Try to solve cube */
-    if (cube.SolveCube() != 0) {
-        /* Return empty list on failure */
-        return PyList_New(0);
+    return Solver_solveCube(defaultSolver, NULL);
+}
+
+/* Choose the engine of the module level functions */
+PyObject *setEngine( PyObject * self, PyObject * args )
+{
+    PyObject *name;
+    if (!PyArg_ParseTuple(args, "U:setEngine", &name)) return NULL;
+
+    if (Solver_setEngine(defaultSolver, name, NULL) < 0) return NULL;
+    Py_RETURN_NONE;
+}
+
+/* Solve every 'step'th cube of 'data', starting at 'first' */
+static void solveEvery( const unsigned char *data, Py_ssize_t first,
+        Py_ssize_t step, Py_ssize_t count, int engine, int maxMoves,
+        double timeout, vector<string> *solutions, vector<int> *lengths )
+{
+    Cubex cube;
+    TwoPhase twophase;
+    double seconds;
+    for (Py_ssize_t i = first; i < count; i += step) {
+        if (solveFacelets(engine, cube, twophase, data + i*N*N*6, maxMoves,
+                    timeout, (*solutions)[i], seconds) == 0) {
+            (*lengths)[i] = (*solutions)[i].length() / 3;
+        }
+        else {
+            (*lengths)[i] = -1;
+        }
+    }
+}
+
+/* Solve a whole buffer of cubes in one call */
+PyObject *solveMany( PyObject * self, PyObject * args, PyObject * kwds )
+{
+    static const char *kwlist[] = { "facelets", "workers", "engine",
+        "maxMoves", "timeout", NULL };
+    Py_buffer view;
+    int workers = 1;
+    const char *engineName = engineNames[ENGINE_CUBEX];
+    int maxMoves = defaultMaxMoves;
+    double timeout = defaultTimeout;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "y*|isid:solveMany",
+                (char **) kwlist, &view, &workers, &engineName, &maxMoves,
+                &timeout))
+        return NULL;
+
+    int engine = engineIndex(engineName);
+    if (engine < 0) {
+        PyBuffer_Release(&view);
+        PyErr_Format(PyExc_ValueError, "unknown engine '%s'", engineName);
+        return NULL;
+    }
+
+    if (view.len % (N*N*6) != 0) {
+        PyBuffer_Release(&view);
+        PyErr_Format(PyExc_ValueError,
+                "facelets must hold a multiple of %d bytes", N*N*6);
+        return NULL;
     }
     
-    /* Grab solution */
-    char *solution = (char*) cube.solution.c_str();
-    char move[3] = {'\0', '\0', '\0'};
+    Py_ssize_t count = view.len / (N*N*6);
+    if (workers <= 0) workers = thread::hardware_concurrency();
+    if (workers > count) workers = count;
+    if (workers < 1) workers = 1;
     
-    /* Empty list */
-    PyObject *list = PyList_New(0);
+    vector<string> solutions(count);
+    vector<int> lengths(count);
+    const unsigned char *data = (const unsigned char *) view.buf;
     
-    if ( strlen(solution) > 0 ) do {
-        /* Get next move from string (two chars) */
-        move[0] = (solution++)[0];
-        move[1] = (solution++)[0];
+    /* Each worker has a cube of its own, no need for the GIL */
+    Py_BEGIN_ALLOW_THREADS
+    if (engine == ENGINE_TWOPHASE) readyTables();
+    vector<thread> threads;
+    threads.reserve(workers);
+    int started = 1;
+    for (; started < workers; started++) {
+        try {
+            threads.push_back(thread(solveEvery, data, started, workers,
+                        count, engine, maxMoves, timeout, &solutions,
+                        &lengths));
+        }
+        catch (const system_error &) {
+            /* Out of threads, the cubes of the rest are solved here */
+            break;
+        }
+    }
+    for (int w = 0; w < workers; w++)
+        if (w == 0 || w >= started)
+            solveEvery(data, w, workers, count, engine, maxMoves, timeout,
+                    &solutions, &lengths);
+    for (size_t w = 0; w < threads.size(); w++)
+        threads[w].join();
+    Py_END_ALLOW_THREADS
 
-        /* Append this move to the list */
-        PyObject *pyString = PyUnicode_FromString(move);
-        PyList_Append( list, pyString );
-    } while ( (++solution)[0] != '\0' );
+    PyBuffer_Release(&view);
 
-    Py_DECREF(args);
-    return list;
+    /* Pack the moves of every solution into one bytes object */
+    Py_ssize_t total = 0;
+    for (Py_ssize_t i = 0; i < count; i++)
+        if (lengths[i] > 0) total += lengths[i];
+
+    PyObject *moves = PyBytes_FromStringAndSize(NULL, total * 2);
+    PyObject *lengthList = PyList_New(count);
+    if (moves == NULL || lengthList == NULL) {
+        Py_XDECREF(moves);
+        Py_XDECREF(lengthList);
+        return NULL;
+    }
+
+    char *out = PyBytes_AS_STRING(moves);
+    for (Py_ssize_t i = 0; i < count; i++) {
+        for (int j = 0; j < lengths[i]; j++) {
+            *out++ = solutions[i][j*3];
+            *out++ = solutions[i][j*3+1];
+        }
+        PyObject *length = PyLong_FromLong(lengths[i]);
+        if (length == NULL) {
+            Py_DECREF(moves);
+            Py_DECREF(lengthList);
+            return NULL;
+        }
+        PyList_SET_ITEM(lengthList, i, length);
+    }
+
+    return Py_BuildValue("(NN)", moves, lengthList);
+}
+
+/* Encode a buffer of facelets, 54 bytes per cube */
+PyObject *encodeStates( PyObject * self, PyObject * args )
+{
+    Py_buffer view;
+    if (!PyArg_ParseTuple(args, "y*:encodeFacelets", &view)) return NULL;
+
+    if (view.len % (N*N*6) != 0) {
+        PyBuffer_Release(&view);
+        PyErr_Format(PyExc_ValueError,
+                "facelets must hold a multiple of %d bytes", N*N*6);
+        return NULL;
+    }
+
+    Py_ssize_t count = view.len / (N*N*6);
+    PyObject *codes = PyBytes_FromStringAndSize(NULL, count * STATE_CODE_SIZE);
+    if (codes == NULL) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+
+    const unsigned char *data = (const unsigned char *) view.buf;
+    unsigned char *out = (unsigned char *) PyBytes_AS_STRING(codes);
+    Py_ssize_t bad = -1;
+    int error = 0;
+
+    Py_BEGIN_ALLOW_THREADS
+    for (Py_ssize_t i = 0; i < count && bad < 0; i++) {
+        error = encodeFacelets(data + i * N*N*6, out + i * STATE_CODE_SIZE);
+        if (error != 0) bad = i;
+    }
+    Py_END_ALLOW_THREADS
+
+    PyBuffer_Release(&view);
+    if (bad >= 0) {
+        Py_DECREF(codes);
+        PyErr_Format(PyExc_ValueError, "cube %zd can't be encoded (error %d)",
+                bad, error);
+        return NULL;
+    }
+    return codes;
+}
+
+/* Decode a buffer of codes into 54 facelets per cube */
+PyObject *decodeStates( PyObject * self, PyObject * args )
+{
+    Py_buffer view;
+    if (!PyArg_ParseTuple(args, "y*:decodeFacelets", &view)) return NULL;
+
+    if (view.len % STATE_CODE_SIZE != 0) {
+        PyBuffer_Release(&view);
+        PyErr_Format(PyExc_ValueError,
+                "codes must hold a multiple of %d bytes", STATE_CODE_SIZE);
+        return NULL;
+    }
+
+    Py_ssize_t count = view.len / STATE_CODE_SIZE;
+    PyObject *facelets = PyBytes_FromStringAndSize(NULL, count * N*N*6);
+    if (facelets == NULL) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+
+    const unsigned char *data = (const unsigned char *) view.buf;
+    unsigned char *out = (unsigned char *) PyBytes_AS_STRING(facelets);
+    Py_ssize_t bad = -1;
+
+    Py_BEGIN_ALLOW_THREADS
+    for (Py_ssize_t i = 0; i < count && bad < 0; i++)
+        if (decodeFacelets(data + i * STATE_CODE_SIZE, out + i * N*N*6) != 0)
+            bad = i;
+    Py_END_ALLOW_THREADS
+
+    PyBuffer_Release(&view);
+    if (bad >= 0) {
+        Py_DECREF(facelets);
+        PyErr_Format(PyExc_ValueError, "code %zd is not a cube", bad);
+        return NULL;
+    }
+    return facelets;
+}
+
+/* Encode a buffer of 54 facelets per cube into their canonical codes */
+PyObject *canonicalStates( PyObject * self, PyObject * args, PyObject * kwds )
+{
+    static const char *kwlist[] = { "facelets", "relabel", NULL };
+    Py_buffer view;
+    int relabel = 1;
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "y*|p:canonicalFacelets",
+                (char **) kwlist, &view, &relabel))
+        return NULL;
+
+    if (view.len % (N*N*6) != 0) {
+        PyBuffer_Release(&view);
+        PyErr_Format(PyExc_ValueError,
+                "facelets must hold a multiple of %d bytes", N*N*6);
+        return NULL;
+    }
+
+    Py_ssize_t count = view.len / (N*N*6);
+    PyObject *codes = PyBytes_FromStringAndSize(NULL, count * STATE_CODE_SIZE);
+    PyObject *symmetries = PyBytes_FromStringAndSize(NULL, count);
+    if (codes == NULL || symmetries == NULL) {
+        Py_XDECREF(codes);
+        Py_XDECREF(symmetries);
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+
+    const unsigned char *data = (const unsigned char *) view.buf;
+    unsigned char *out = (unsigned char *) PyBytes_AS_STRING(codes);
+    unsigned char *syms = (unsigned char *) PyBytes_AS_STRING(symmetries);
+    Py_ssize_t bad = -1;
+    int error = 0;
+
+    Py_BEGIN_ALLOW_THREADS
+    for (Py_ssize_t i = 0; i < count && bad < 0; i++) {
+        int sym;
+        error = canonicalFacelets(data + i * N*N*6, out + i * STATE_CODE_SIZE,
+                                  relabel, &sym);
+        syms[i] = sym;
+        if (error != 0) bad = i;
+    }
+    Py_END_ALLOW_THREADS
+
+    PyBuffer_Release(&view);
+    if (bad >= 0) {
+        Py_DECREF(codes);
+        Py_DECREF(symmetries);
+        PyErr_Format(PyExc_ValueError, "cube %zd can't be encoded (error %d)",
+                bad, error);
+        return NULL;
+    }
+    return Py_BuildValue("(NN)", codes, symmetries);
 }
 
+/* Turn a buffer of 54 facelets per cube by one of the symmetries */
+PyObject *symmetryStates( PyObject * self, PyObject * args, PyObject * kwds )
+{
+    static const char *kwlist[] = { "facelets", "symmetry", "relabel", NULL };
+    Py_buffer view;
+    int symmetry, relabel = 1;
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "y*i|p:symmetryFacelets",
+                (char **) kwlist, &view, &symmetry, &relabel))
+        return NULL;
+
+    if (symmetry < 0 || symmetry >= SYMMETRIES) {
+        PyBuffer_Release(&view);
+        PyErr_Format(PyExc_ValueError, "symmetry must be 0 to %d",
+                SYMMETRIES - 1);
+        return NULL;
+    }
+    if (view.len % (N*N*6) != 0) {
+        PyBuffer_Release(&view);
+        PyErr_Format(PyExc_ValueError,
+                "facelets must hold a multiple of %d bytes", N*N*6);
+        return NULL;
+    }
+
+    PyObject *turned = PyBytes_FromStringAndSize(NULL, view.len);
+    if (turned == NULL) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+
+    const unsigned char *data = (const unsigned char *) view.buf;
+    unsigned char *out = (unsigned char *) PyBytes_AS_STRING(turned);
+
+    Py_BEGIN_ALLOW_THREADS
+    for (Py_ssize_t i = 0; i < view.len; i += N*N*6)
+        symmetryFacelets(symmetry, data + i, out + i, relabel);
+    Py_END_ALLOW_THREADS
+
+    PyBuffer_Release(&view);
+    return turned;
+}
+
+/* Draw cubes uniformly from all states into 54 facelets per cube */
+PyObject *randomStates( PyObject * self, PyObject * args, PyObject * kwds )
+{
+    static const char *kwlist[] = { "count", "seed", NULL };
+    Py_ssize_t count;
+    PyObject *seedObject = Py_None;
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "n|O:randomFacelets",
+                (char **) kwlist, &count, &seedObject))
+        return NULL;
+
+    if (count < 0) {
+        PyErr_SetString(PyExc_ValueError, "count must not be negative");
+        return NULL;
+    }
+
+    uint64_t seed;
+    if (seedObject == Py_None) {
+        std::random_device device;
+        seed = ((uint64_t) device() << 32) | device();
+    } else {
+        seed = PyLong_AsUnsignedLongLongMask(seedObject);
+        if (PyErr_Occurred()) return NULL;
+    }
+
+    PyObject *facelets = PyBytes_FromStringAndSize(NULL, count * N*N*6);
+    if (facelets == NULL) return NULL;
+    unsigned char *out = (unsigned char *) PyBytes_AS_STRING(facelets);
+
+    Py_BEGIN_ALLOW_THREADS
+    std::mt19937_64 rng(seed);
+    for (Py_ssize_t i = 0; i < count; i++)
+        randomFacelets(rng, out + i * N*N*6);
+    Py_END_ALLOW_THREADS
+
+    return facelets;
+}
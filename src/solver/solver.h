@@ -2,19 +2,71 @@
 #define _SOLVER_H_
 
 #include <Python.h>
+#include <structmember.h>
+#include <pythread.h>
 #include <string>
+#include <vector>
+#include <thread>
+#include <system_error>
 #include <iostream>
+#include <cstdlib>
+#include <cerrno>
+#include <sys/stat.h>
 
 #include "cubex.h"
+#include "twophase.h"
+#include "pocket.h"
+#include "statecode.h"
 
 using namespace std;
 
-/* The cube */
-Cubex cube;
-
 /* Cube size */
 int N = Cubex::N;
 
+/* Facelets of a solved cube */
+const char *startPosition =
+    "111111111222222222333333333444444444555555555666666666";
+
+/* The search engines a solver can use */
+enum { ENGINE_CUBEX, ENGINE_TWOPHASE };
+const char *engineNames[] = { "cubex", "twophase", NULL };
+
+/* Defaults of the two-phase search budget */
+const int defaultMaxMoves = 22;
+const double defaultTimeout = 1.0;
+
+/* A solver object owns its own Cubex, so several of them can solve at */
+/* the same time in different threads. The lock guards the Cubex while */
+/* the GIL is released during a solve. */
+typedef struct {
+    PyObject_HEAD
+    Cubex *cube;
+    TwoPhase *twophase;
+    Pocket *pocket;
+    PyThread_type_lock lock;
+    int engine;
+    int maxMoves;       /* stop at the first solution this short */
+    double timeout;     /* or after this many seconds */
+    int moves;          /* length of the last solution */
+    double searchTime;  /* seconds the last solve took */
+    int size;           /* size of the loaded cube, 2 or 3 */
+    int phases[Cubex::MOV];  /* moves of every phase of the last solution */
+    int phaseCount;
+    unsigned char facelets[6*3*3];
+} SolverObject;
+
+/* Take a lock, without holding the GIL if we have to wait for it */
+#define ACQUIRE(lock) do { \
+    if (!PyThread_acquire_lock((lock), 0)) { \
+        Py_BEGIN_ALLOW_THREADS \
+        PyThread_acquire_lock((lock), 1); \
+        Py_END_ALLOW_THREADS \
+    } } while (0)
+
+/* Take the lock of a solver object */
+#define ACQUIRE_LOCK(obj) ACQUIRE((obj)->lock)
+#define RELEASE_LOCK(obj) PyThread_release_lock((obj)->lock)
+
 /* Helpers for returining true/false */
 /* Removes those nasty memory leaks! */
 PyObject *pyTrue() {
@@ -29,32 +81,101 @@ PyObject *pyFalse() {
 }
 
 /* Helper function from cubex.cpp */
-void insertValues(string data)
-{
-    cube.cubeinit = false;
-    for (int i = -1; i <= 1; i++) {
-        for (int j = -1; j <= 1; j++) {
-            *cube.face(j, 2, -i) = data.at(i*3+j+4)-48;
-            *cube.face(-2, -i, -j) = data.at(i*3+j+13)-48;
-            *cube.face(j, -i, -2) = data.at(i*3+j+22)-48;
-            *cube.face(2, -i, j) = data.at(i*3+j+31)-48;
-            *cube.face(-j, -i, 2) = data.at(i*3+j+40)-48;
-            *cube.face(j, -2, i) = data.at(i*3+j+49)-48;
-        }
+/* Facelets may be given as color digits ('1'-'6') or as the colors */
+/* themselves (1-6), one byte per facelet */
+void insertFacelets(Cubex &cube, const unsigned char *data)
+{
+    unsigned char v[6*3*3];
+    for (int i = 0; i < 6*3*3; i++)
+        v[i] = data[i] >= '0' ? data[i] - '0' : data[i];
+
+    cube.SetFacelets(v);
+}
+
+void insertValues(Cubex &cube, string data)
+{
+    insertFacelets(cube, (const unsigned char *) data.c_str());
+}
+
+/* Index of an engine by name, -1 if there is no such engine */
+int engineIndex(const char *name)
+{
+    for (int i = 0; engineNames[i] != NULL; i++)
+        if (strcmp(engineNames[i], name) == 0) return i;
+    return -1;
+}
+
+/* Solve the facelets with one of the engines, timing the search. */
+/* Returns 0 if 'solution' was set. */
+int solveFacelets(int engine, Cubex &cube, TwoPhase &twophase,
+        const unsigned char *facelets, int maxMoves, double timeout,
+        string &solution, double &seconds)
+{
+    int result;
+    if (engine == ENGINE_TWOPHASE) {
+        seconds = 0;
+        result = twophase.LoadFacelets(facelets);
+        if (result != 0) return result;
+        result = twophase.Solve(maxMoves, timeout);
+        if (result == 0) solution = twophase.solution;
+        seconds = twophase.seconds;
+        return result;
     }
-    cube.cubeinit = true;
+
+    chrono::steady_clock::time_point start = chrono::steady_clock::now();
+    insertFacelets(cube, facelets);
+    result = cube.SolveCube();
+    if (result == 0) solution = cube.solution;
+    seconds = chrono::duration<double>(chrono::steady_clock::now() - start).count();
+    return result;
 }
 
-/* Map Python-Cube id to C++-cube id */
-/* This will map each box to multiple faces */
-unsigned char idMap[] = {
-     0,  9, 18,  1, 10, 19,  2, 11, 20, /* top */
-     0,  1,  2,  3,  4,  5,  6,  7,  8, /* front */
-     2, 11, 20,  5, 14, 23,  8, 17, 26, /* right */
-    20, 19, 18, 23, 22, 21, 26, 25, 24, /* back */
-    18,  9,  0, 21, 12,  3, 24, 15,  6, /* left */
-     8, 17, 26,  7, 16, 25,  6, 15, 24  /* bottom */
-};
+/* Solve the facelets of a 2x2x2 cube. Returns 0 if 'solution' was set. */
+int solvePocket(Pocket &pocket, const unsigned char *facelets,
+        string &solution, double &seconds)
+{
+    seconds = 0;
+    int result = pocket.LoadFacelets(facelets);
+    if (result != 0) return result;
+    result = pocket.Solve();
+    if (result == 0) solution = pocket.solution;
+    seconds = pocket.seconds;
+    return result;
+}
 
-#endif
+/* Check that every face of an n*n*n cube shows a single color */
+bool faceletsSolved(const unsigned char *facelets, int n)
+{
+    for (int f = 0; f < 6; f++)
+        for (int i = 1; i < n*n; i++)
+            if (facelets[f*n*n + i] != facelets[f*n*n]) return false;
+    return true;
+}
+
+/* Where the two-phase tables are kept if nothing else is asked for */
+string defaultTablePath()
+{
+    const char *path = getenv("PYCUBE_TABLES");
+    if (path != NULL) return path;
+
+    const char *cache = getenv("XDG_CACHE_HOME");
+    if (cache != NULL && cache[0] != '\0')
+        return string(cache) + "/pycube/twophase.tables";
 
+    const char *home = getenv("HOME");
+    if (home != NULL && home[0] != '\0')
+        return string(home) + "/.cache/pycube/twophase.tables";
+
+    return "";
+}
+
+/* Create the missing directories leading up to a file */
+void makeParentDirs(const string &path)
+{
+    for (size_t i = path.find('/', 1); i != string::npos; i = path.find('/', i + 1)) {
+        string dir = path.substr(0, i);
+        if (mkdir(dir.c_str(), 0777) < 0 && errno != EEXIST) return;
+    }
+}
+
+#endif
@@ -0,0 +1,400 @@
+/*
+ * statecode.cpp
+ * A compact binary code for the states of a 3x3x3 cube. See statecode.h.
+ */
+
+#include <cstring>
+using namespace std;
+#include "statecode.h"
+
+/* Faces, numbered like the facelets given to loadCube */
+enum { FACE_U, FACE_F, FACE_R, FACE_B, FACE_L, FACE_D };
+
+/* The faces of every corner and edge, clockwise from the U or D face, */
+/* in the order of twophase.cpp */
+static const int cornerFaces[8][3] = {
+  { FACE_U, FACE_R, FACE_F }, { FACE_U, FACE_F, FACE_L },
+  { FACE_U, FACE_L, FACE_B }, { FACE_U, FACE_B, FACE_R },
+  { FACE_D, FACE_F, FACE_R }, { FACE_D, FACE_L, FACE_F },
+  { FACE_D, FACE_B, FACE_L }, { FACE_D, FACE_R, FACE_B }
+};
+static const int edgeFaces[12][2] = {
+  { FACE_U, FACE_R }, { FACE_U, FACE_F }, { FACE_U, FACE_L }, { FACE_U, FACE_B },
+  { FACE_D, FACE_R }, { FACE_D, FACE_F }, { FACE_D, FACE_L }, { FACE_D, FACE_B },
+  { FACE_F, FACE_R }, { FACE_F, FACE_L }, { FACE_B, FACE_L }, { FACE_B, FACE_R }
+};
+
+/* World direction of every face */
+static const int faceNormal[6][3] = {
+  { 0, 1, 0 }, { 0, 0, 1 }, { 1, 0, 0 }, { 0, 0, -1 }, { -1, 0, 0 }, { 0, -1, 0 }
+};
+
+/* Colors of the opposite faces of a solved cube */
+static const int oppositeColor[7] = { 0, 6, 4, 5, 2, 3, 1 };
+
+/* Sizes of the parts of a code */
+static const uint64_t N_CENTERS = 24, N_CPERM = 40320, N_TWIST = 2187;
+static const uint64_t N_EPERM = 479001600, N_FLIP = 2048;
+
+/* A code is the 72 bit number high * N_EPERM * N_FLIP + low in big endian */
+/* bytes, where 'high' holds the centers, corner permutation and twist and */
+/* 'low' the edge permutation and flip. It is worked out a byte at a time, */
+/* as not every compiler has an integer type that wide. */
+static void packCode(uint64_t high, uint64_t low, unsigned char *code)
+{
+  // long multiplication by the bytes of 'high', the carry stays below 2^41
+  uint64_t carry = low;
+  for (int i = STATE_CODE_SIZE - 1; i >= 0; i--) {
+    carry += (high & 0xff) * (N_EPERM * N_FLIP);
+    code[i] = (unsigned char) (carry & 0xff);
+    carry >>= 8;
+    high >>= 8;
+  }
+}
+
+/* Split a code into 'high' and 'low' again, by long division */
+static void unpackCode(const unsigned char *code, uint64_t &high, uint64_t &low)
+{
+  high = low = 0;
+  for (int i = 0; i < STATE_CODE_SIZE; i++) {
+    low = (low << 8) | code[i];
+    high = (high << 8) | low / (N_EPERM * N_FLIP);
+    low %= N_EPERM * N_FLIP;
+  }
+}
+
+/* Index of the facelet on face 'f' of the cubie at x, y and z, each 0-2 */
+/* from the L, U and F faces */
+static int positionIndex(int f, int x, int y, int z)
+{
+  int r, c;
+  switch (f) {
+    case FACE_U: r = x; c = z; break;
+    case FACE_F: r = y; c = x; break;
+    case FACE_R: r = y; c = z; break;
+    case FACE_B: r = y; c = 2 - x; break;
+    case FACE_L: r = y; c = 2 - z; break;
+    default: r = 2 - x; c = z; break;
+  }
+  return f * 9 + r * 3 + c;
+}
+
+/* Index of the facelet on face 'faces[k]' of the cubie between 'faces' */
+static int faceletIndex(const int *faces, int count, int k)
+{
+  int x = 1, y = 1, z = 1;
+  for (int l = 0; l < count; l++) {
+    switch (faces[l]) {
+      case FACE_U: y = 0; break;
+      case FACE_D: y = 2; break;
+      case FACE_F: z = 0; break;
+      case FACE_B: z = 2; break;
+      case FACE_L: x = 0; break;
+      case FACE_R: x = 2; break;
+    }
+  }
+  return positionIndex(faces[k], x, y, z);
+}
+
+static int permIndex(const unsigned char *p, int n)
+{
+  int index = 0;
+  for (int i = 0; i < n; i++) {
+    int smaller = 0;
+    for (int j = i + 1; j < n; j++) if (p[j] < p[i]) smaller++;
+    index = index * (n - i) + smaller;
+  }
+  return index;
+}
+static int parity(const unsigned char *p, int n)
+{
+  int odd = 0;
+  for (int i = 0; i < n; i++)
+    for (int j = i + 1; j < n; j++) if (p[j] < p[i]) odd ^= 1;
+  return odd;
+}
+
+static void setPerm(unsigned char *p, int n, int index)
+{
+  int digits[12];
+  unsigned char left[12];
+  for (int i = n - 1; i >= 0; i--) { digits[i] = index % (n - i); index /= n - i; }
+  for (int i = 0; i < n; i++) left[i] = i;
+  for (int i = 0; i < n; i++) {
+    p[i] = left[digits[i]];
+    for (int j = digits[i]; j < n - i - 1; j++) left[j] = left[j + 1];
+  }
+}
+
+/* The colors of the centers for a center code. The code is the color on */
+/* top times 4 plus the rank of the color in front among the 4 colors */
+/* that can be next to it, the rest follows. Returns 1 if the code is bad. */
+static int centerColors(int centers, int *colorAt)
+{
+  if (centers < 0 || centers >= (int) N_CENTERS) return 1;
+  int top = centers / 4 + 1, rank = centers % 4, front = 0;
+  for (int c = 1; c <= 6; c++) {
+    if (c == top || c == oppositeColor[top]) continue;
+    if (rank-- == 0) { front = c; break; }
+  }
+
+  // the faces of the solved cube that are now up, in front and right
+  const int *a = faceNormal[top - 1], *b = faceNormal[front - 1];
+  int c[3] = { a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2],
+               a[0] * b[1] - a[1] * b[0] };
+
+  for (int g = 0; g < 6; g++) {
+    const int *n = faceNormal[g];
+    int v[3];
+    for (int l = 0; l < 3; l++) v[l] = n[1] * a[l] + n[2] * b[l] + n[0] * c[l];
+    for (int h = 0; h < 6; h++)
+      if (faceNormal[h][0] == v[0] && faceNormal[h][1] == v[1] &&
+          faceNormal[h][2] == v[2]) colorAt[g] = h + 1;
+  }
+  return 0;
+}
+
+int encodeFacelets(const unsigned char *facelets, unsigned char *code)
+{
+  int color[54], face[7], colorAt[6], expected[6];
+  int cornerAt[8][3], edgeAt[12][2];
+  unsigned char cp[8], co[8], ep[12], eo[12];
+  bool seen[12];
+
+  for (int i = 0; i < 54; i++) {
+    color[i] = facelets[i] >= '0' ? facelets[i] - '0' : facelets[i];
+    if (color[i] < 1 || color[i] > 6) return 1;
+  }
+
+  // the centers tell which face a color belongs to
+  for (int i = 0; i < 7; i++) face[i] = -1;
+  for (int f = 0; f < 6; f++) {
+    colorAt[f] = color[f * 9 + 4];
+    if (face[colorAt[f]] >= 0) return 1;
+    face[colorAt[f]] = f;
+  }
+
+  int centers = 0;
+  for (int c = 1; c <= 6; c++) {
+    if (c == colorAt[FACE_F]) break;
+    if (c != colorAt[FACE_U] && c != oppositeColor[colorAt[FACE_U]]) centers++;
+  }
+  centers += (colorAt[FACE_U] - 1) * 4;
+  if (centerColors(centers, expected) || memcmp(expected, colorAt, sizeof(expected)))
+    return 1;
+
+  for (int i = 0; i < 8; i++)
+    for (int k = 0; k < 3; k++)
+      cornerAt[i][k] = face[color[faceletIndex(cornerFaces[i], 3, k)]];
+  for (int i = 0; i < 12; i++)
+    for (int k = 0; k < 2; k++)
+      edgeAt[i][k] = face[color[faceletIndex(edgeFaces[i], 2, k)]];
+
+  // identify the corners and edges, like TwoPhase::LoadFacelets
+  for (int j = 0; j < 8; j++) seen[j] = false;
+  for (int i = 0; i < 8; i++) {
+    int ori;
+    for (ori = 0; ori < 3; ori++)
+      if (cornerAt[i][ori] == FACE_U || cornerAt[i][ori] == FACE_D) break;
+    if (ori == 3) return 1;
+    int j;
+    for (j = 0; j < 8; j++)
+      if (cornerFaces[j][0] == cornerAt[i][ori] &&
+          cornerFaces[j][1] == cornerAt[i][(ori + 1) % 3] &&
+          cornerFaces[j][2] == cornerAt[i][(ori + 2) % 3]) break;
+    if (j == 8 || seen[j]) return 1;
+    seen[j] = true;
+    cp[i] = j; co[i] = ori;
+  }
+
+  for (int j = 0; j < 12; j++) seen[j] = false;
+  for (int i = 0; i < 12; i++) {
+    int j;
+    for (j = 0; j < 12; j++) {
+      if (edgeFaces[j][0] == edgeAt[i][0] && edgeFaces[j][1] == edgeAt[i][1]) {
+        eo[i] = 0; break;
+      }
+      if (edgeFaces[j][0] == edgeAt[i][1] && edgeFaces[j][1] == edgeAt[i][0]) {
+        eo[i] = 1; break;
+      }
+    }
+    if (j == 12 || seen[j]) return 1;
+    seen[j] = true;
+    ep[i] = j;
+  }
+
+  // the last twist and flip follow from the others
+  int twist = 0, flip = 0, twists = 0, flips = 0;
+  for (int i = 0; i < 7; i++) twist = 3 * twist + co[i];
+  for (int i = 0; i < 11; i++) flip = 2 * flip + eo[i];
+  for (int i = 0; i < 8; i++) twists += co[i];
+  for (int i = 0; i < 12; i++) flips += eo[i];
+  if (flips % 2) return 5;
+  if (parity(cp, 8) != parity(ep, 12)) return 6;
+  if (twists % 3) return 7;
+
+  packCode((centers * N_CPERM + permIndex(cp, 8)) * N_TWIST + twist,
+           permIndex(ep, 12) * N_FLIP + flip, code);
+  return 0;
+}
+
+int decodeFacelets(const unsigned char *code, unsigned char *facelets)
+{
+  int colorAt[6];
+  unsigned char cp[8], co[8], ep[12], eo[12];
+
+  uint64_t high, low;
+  unpackCode(code, high, low);
+  if (high >= N_CENTERS * N_CPERM * N_TWIST) return 1;
+
+  int flip = low % N_FLIP, eperm = low / N_FLIP;
+  int twist = high % N_TWIST, cperm = high / N_TWIST % N_CPERM;
+  int centers = high / N_TWIST / N_CPERM;
+
+  int sum = 0;
+  for (int i = 6; i >= 0; i--) { co[i] = twist % 3; sum += co[i]; twist /= 3; }
+  co[7] = (3 - sum % 3) % 3;
+  sum = 0;
+  for (int i = 10; i >= 0; i--) { eo[i] = flip % 2; sum += eo[i]; flip /= 2; }
+  eo[11] = sum % 2;
+  setPerm(cp, 8, cperm);
+  setPerm(ep, 12, eperm);
+  if (parity(cp, 8) != parity(ep, 12)) return 1;
+  if (centerColors(centers, colorAt)) return 1;
+
+  for (int f = 0; f < 6; f++) facelets[f * 9 + 4] = colorAt[f];
+  for (int i = 0; i < 8; i++)
+    for (int k = 0; k < 3; k++)
+      facelets[faceletIndex(cornerFaces[i], 3, (co[i] + k) % 3)] =
+          colorAt[cornerFaces[cp[i]][k]];
+  for (int i = 0; i < 12; i++)
+    for (int k = 0; k < 2; k++)
+      facelets[faceletIndex(edgeFaces[i], 2, (eo[i] + k) % 2)] =
+          colorAt[edgeFaces[ep[i]][k]];
+  return 0;
+}
+
+/* Where the symmetries take the facelets and colors */
+struct SymmetryTables {
+  unsigned char facelet[SYMMETRIES][54];
+  unsigned char color[SYMMETRIES][7];
+  SymmetryTables();
+};
+
+SymmetryTables::SymmetryTables()
+{
+  static const int axes[6][3] = {
+    { 0, 1, 2 }, { 0, 2, 1 }, { 1, 0, 2 }, { 1, 2, 0 }, { 2, 0, 1 }, { 2, 1, 0 }
+  };
+  static const int parity[6] = { 1, -1, -1, 1, 1, -1 };
+
+  // every signed permutation of the axes, the rotations first
+  int count[2] = { 0, ROTATIONS };
+  for (int a = 0; a < 6; a++) {
+    for (int signs = 0; signs < 8; signs++) {
+      int m[3][3] = { { 0 } }, det = parity[a];
+      for (int i = 0; i < 3; i++) {
+        m[i][axes[a][i]] = signs & (1 << i) ? -1 : 1;
+        det *= m[i][axes[a][i]];
+      }
+      int sym = count[det < 0]++;
+
+      // the facelets by position and direction, x right, y up, z front
+      for (int f = 0; f < 6; f++) {
+        int p[3], n[3];
+        for (int i = 0; i < 3; i++) {
+          n[i] = 0;
+          for (int j = 0; j < 3; j++) n[i] += m[i][j] * faceNormal[f][j];
+        }
+        int g = 0;
+        while (faceNormal[g][0] != n[0] || faceNormal[g][1] != n[1] ||
+               faceNormal[g][2] != n[2]) g++;
+        color[sym][f + 1] = g + 1;
+
+        for (int r = 0; r < 3; r++) {
+          for (int c = 0; c < 3; c++) {
+            int x, y, z;
+            switch (f) {
+              case FACE_U: x = r; y = 0; z = c; break;
+              case FACE_F: x = c; y = r; z = 0; break;
+              case FACE_R: x = 2; y = r; z = c; break;
+              case FACE_B: x = 2 - c; y = r; z = 2; break;
+              case FACE_L: x = 0; y = r; z = 2 - c; break;
+              default: x = 2 - r; y = 2; z = c; break;
+            }
+            int q[3] = { x - 1, 1 - y, 1 - z };
+            for (int i = 0; i < 3; i++) {
+              p[i] = 0;
+              for (int j = 0; j < 3; j++) p[i] += m[i][j] * q[j];
+            }
+            facelet[sym][f * 9 + r * 3 + c] =
+                positionIndex(g, p[0] + 1, 1 - p[1], 1 - p[2]);
+          }
+        }
+      }
+      color[sym][0] = 0;
+    }
+  }
+}
+
+static const SymmetryTables &symmetryTables()
+{
+  static const SymmetryTables tables;
+  return tables;
+}
+
+void symmetryFacelets(int sym, const unsigned char *facelets,
+                      unsigned char *out, bool relabel)
+{
+  const SymmetryTables &tables = symmetryTables();
+  for (int i = 0; i < 54; i++) {
+    int color = facelets[i] >= '0' ? facelets[i] - '0' : facelets[i];
+    if (relabel && color >= 1 && color <= 6) color = tables.color[sym][color];
+    out[tables.facelet[sym][i]] = color;
+  }
+}
+
+int canonicalFacelets(const unsigned char *facelets, unsigned char *code,
+                      bool relabel, int *sym)
+{
+  unsigned char turned[54], candidate[STATE_CODE_SIZE];
+  int error = encodeFacelets(facelets, code);
+  if (error != 0) return error;
+  if (sym != NULL) *sym = 0;
+
+  for (int s = 1; s < (relabel ? SYMMETRIES : ROTATIONS); s++) {
+    symmetryFacelets(s, facelets, turned, relabel);
+    if (encodeFacelets(turned, candidate) != 0) continue;
+    if (memcmp(candidate, code, STATE_CODE_SIZE) < 0) {
+      memcpy(code, candidate, STATE_CODE_SIZE);
+      if (sym != NULL) *sym = s;
+    }
+  }
+  return 0;
+}
+
+void randomFacelets(std::mt19937_64 &rng, unsigned char *facelets)
+{
+  unsigned char cp[8], ep[12], code[STATE_CODE_SIZE];
+  setPerm(cp, 8, rng() % N_CPERM);
+  setPerm(ep, 12, rng() % N_EPERM);
+
+  // the corner and edge permutations must be both odd or both even
+  if (parity(cp, 8) != parity(ep, 12)) {
+    unsigned char t = ep[10]; ep[10] = ep[11]; ep[11] = t;
+  }
+
+  uint64_t high = permIndex(cp, 8) * N_TWIST + rng() % N_TWIST;
+  packCode(high, permIndex(ep, 12) * N_FLIP + rng() % N_FLIP, code);
+  decodeFacelets(code, facelets);
+}
+
+uint64_t hashCode(const unsigned char *code)
+{
+  uint64_t hash = 14695981039346656037ULL;
+  for (int i = 0; i < STATE_CODE_SIZE; i++) {
+    hash ^= code[i];
+    hash *= 1099511628211ULL;
+  }
+  return hash;
+}
@@ -0,0 +1,65 @@
+/*
+ * statecode.h
+ * A compact binary code for the states of a 3x3x3 cube. The code holds
+ * which of the 24 ways the centers are turned, and the corners and edges
+ * relative to the centers as Kociemba's coordinates: the corner and edge
+ * permutations, 7 corner twists and 11 edge flips. Packed as the number
+ *
+ *   ((((centers * 8! + cperm) * 3^7 + twist) * 12! + eperm) * 2^11 + flip
+ *
+ * it takes 71 bits, stored big endian in 9 bytes. Every state has exactly
+ * one code, so codes can be compared and hashed as they are. The Python
+ * module cubestate makes the same codes.
+ *
+ * States that are the same up to one of the 48 symmetries of the cube,
+ * the 24 rotations and their mirror images, can share the smallest of
+ * their codes as a canonical code, so tables of states need to store
+ * only one state of every class.
+ */
+
+#ifndef _STATECODE_H_
+#define _STATECODE_H_
+
+#include <stdint.h>
+#include <random>
+
+const int STATE_CODE_SIZE = 9;
+const int SYMMETRIES = 48;
+const int ROTATIONS = 24;
+
+/* Encode 54 facelets in the order of loadCube, as colors (1-6) or color */
+/* digits ('1'-'6'). Returns 0, or an error like Cubex if the facelets */
+/* are not a cube: 1-improper cubelets, 5-edge flip parity, 6-edge swap */
+/* parity, 7-corner rotation parity. */
+int encodeFacelets(const unsigned char *facelets, unsigned char *code);
+
+/* Decode a code into 54 facelets as colors (1-6). Returns 0, or 1 if the */
+/* code is out of range or its corner and edge permutations differ in */
+/* parity, which no cube has. */
+int decodeFacelets(const unsigned char *code, unsigned char *facelets);
+
+/* Turn 54 facelets by symmetry 'sym', where 0 is the identity, 1-23 the */
+/* other rotations and 24-47 the mirror images. With 'relabel' the colors */
+/* are turned along with the cube, so the solved cube stays solved and a */
+/* state turns into the same state seen from another side. Without it */
+/* the colors stay, which only makes a cube for the rotations. */
+void symmetryFacelets(int sym, const unsigned char *facelets,
+                      unsigned char *out, bool relabel);
+
+/* Encode the smallest code of the states that 54 facelets can be turned */
+/* into by the 48 symmetries with 'relabel', or the 24 rotations without */
+/* it. Sets 'sym' to the symmetry giving the code if it isn't NULL, and */
+/* returns 0 or an error of encodeFacelets. */
+int canonicalFacelets(const unsigned char *facelets, unsigned char *code,
+                      bool relabel, int *sym);
+
+/* Draw a state uniformly from all states of a 3x3x3 cube with its centers */
+/* in place, with the random numbers of 'rng', as 54 facelets as colors */
+/* (1-6). Draws the corner and edge coordinates and fixes up the parity, */
+/* so it takes the same time for every state. */
+void randomFacelets(std::mt19937_64 &rng, unsigned char *facelets);
+
+/* FNV-1a hash of a code, for hash tables of states */
+uint64_t hashCode(const unsigned char *code);
+
+#endif /* _STATECODE_H_ */
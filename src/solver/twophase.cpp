@@ -0,0 +1,690 @@
+/*
+ * twophase.cpp
+ * A two-phase solver for the 3x3x3 cube, after Herbert Kociemba's
+ * algorithm. See twophase.h.
+ */
+
+#include <cstring>
+#include <cstdio>
+#include <cerrno>
+#include <vector>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+using namespace std;
+#include "twophase.h"
+
+/* Corners and edges, in the order used by the coordinates */
+enum { URF, UFL, ULB, UBR, DFR, DLF, DBL, DRB };
+enum { UR, UF, UL, UB, DR, DF, DL, DB, FR, FL, BL, BR };
+
+/* Faces, numbered like the facelets given to loadCube */
+enum { FACE_U, FACE_F, FACE_R, FACE_B, FACE_L, FACE_D };
+
+/* The faces of every corner and edge, clockwise from the U or D face */
+static const int cornerFaces[8][3] = {
+  { FACE_U, FACE_R, FACE_F }, { FACE_U, FACE_F, FACE_L },
+  { FACE_U, FACE_L, FACE_B }, { FACE_U, FACE_B, FACE_R },
+  { FACE_D, FACE_F, FACE_R }, { FACE_D, FACE_L, FACE_F },
+  { FACE_D, FACE_B, FACE_L }, { FACE_D, FACE_R, FACE_B }
+};
+static const int edgeFaces[12][2] = {
+  { FACE_U, FACE_R }, { FACE_U, FACE_F }, { FACE_U, FACE_L }, { FACE_U, FACE_B },
+  { FACE_D, FACE_R }, { FACE_D, FACE_F }, { FACE_D, FACE_L }, { FACE_D, FACE_B },
+  { FACE_F, FACE_R }, { FACE_F, FACE_L }, { FACE_B, FACE_L }, { FACE_B, FACE_R }
+};
+
+/* The moves are numbered face * 3 + turns - 1, with the faces in the */
+/* order U, R, F, D, L, B. These are the actions of Cube.doAction that */
+/* turn each face clockwise and anticlockwise. */
+static const char *clockwise[6] = { "UL", "FC", "LD", "DR", "BA", "RU" };
+static const char *anticlockwise[6] = { "UR", "FA", "LU", "DL", "BC", "RD" };
+
+/* The moves of phase 2: U, D, R2, L2, F2 and B2 */
+static const int phase2Moves[N_MOVES2] = { 0, 1, 2, 9, 10, 11, 4, 13, 7, 16 };
+
+/* A cube on the level of its corners and edges */
+struct CubieCube {
+  unsigned char cp[8], co[8], ep[12], eo[12];
+};
+
+/* The face turns, as the permutation and orientation each one applies */
+static const CubieCube faceTurns[6] = {
+  /* U */
+  { { UBR, URF, UFL, ULB, DFR, DLF, DBL, DRB }, { 0, 0, 0, 0, 0, 0, 0, 0 },
+    { UB, UR, UF, UL, DR, DF, DL, DB, FR, FL, BL, BR },
+    { 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0 } },
+  /* R */
+  { { DFR, UFL, ULB, URF, DRB, DLF, DBL, UBR }, { 2, 0, 0, 1, 1, 0, 0, 2 },
+    { FR, UF, UL, UB, BR, DF, DL, DB, DR, FL, BL, UR },
+    { 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0 } },
+  /* F */
+  { { UFL, DLF, ULB, UBR, URF, DFR, DBL, DRB }, { 1, 2, 0, 0, 2, 1, 0, 0 },
+    { UR, FL, UL, UB, DR, FR, DL, DB, UF, DF, BL, BR },
+    { 0, 1, 0, 0, 0, 1, 0, 0, 1, 1, 0, 0 } },
+  /* D */
+  { { URF, UFL, ULB, UBR, DLF, DBL, DRB, DFR }, { 0, 0, 0, 0, 0, 0, 0, 0 },
+    { UR, UF, UL, UB, DF, DL, DB, DR, FR, FL, BL, BR },
+    { 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0 } },
+  /* L */
+  { { URF, ULB, DBL, UBR, DFR, UFL, DLF, DRB }, { 0, 1, 2, 0, 0, 2, 1, 0 },
+    { UR, UF, BL, UB, DR, DF, FL, DB, FR, UL, DL, BR },
+    { 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0 } },
+  /* B */
+  { { URF, UFL, UBR, DRB, DFR, DLF, ULB, DBL }, { 0, 0, 1, 2, 0, 0, 2, 1 },
+    { UR, UF, UL, BR, DR, DF, DL, BL, FR, FL, UB, DB },
+    { 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 1, 1 } }
+};
+
+/* All 18 moves as cubie cubes, filled in by InitTables() */
+static CubieCube moveCube[N_MOVES];
+
+/* The tables, either built in memory or mapped from a table file */
+static const TwoPhaseTables *tables = NULL;
+static bool tablesMapped = false;
+
+/* Apply the move 'b' to the cube 'a' */
+static void cornerMultiply(CubieCube &a, const CubieCube &b)
+{
+  unsigned char cp[8], co[8];
+  for (int i = 0; i < 8; i++) {
+    cp[i] = a.cp[b.cp[i]];
+    co[i] = (a.co[b.cp[i]] + b.co[i]) % 3;
+  }
+  memcpy(a.cp, cp, 8); memcpy(a.co, co, 8);
+}
+static void edgeMultiply(CubieCube &a, const CubieCube &b)
+{
+  unsigned char ep[12], eo[12];
+  for (int i = 0; i < 12; i++) {
+    ep[i] = a.ep[b.ep[i]];
+    eo[i] = (a.eo[b.ep[i]] + b.eo[i]) % 2;
+  }
+  memcpy(a.ep, ep, 12); memcpy(a.eo, eo, 12);
+}
+static void multiply(CubieCube &a, const CubieCube &b)
+{
+  cornerMultiply(a, b);
+  edgeMultiply(a, b);
+}
+
+static void identity(CubieCube &c)
+{
+  for (int i = 0; i < 8; i++) { c.cp[i] = i; c.co[i] = 0; }
+  for (int i = 0; i < 12; i++) { c.ep[i] = i; c.eo[i] = 0; }
+}
+
+static int binomial(int n, int k)
+{
+  if (n < k) return 0;
+  int r = 1;
+  for (int i = 1; i <= k; i++) r = r * (n - k + i) / i;
+  return r;
+}
+
+/* Coordinates, and the inverse functions used to build the move tables */
+static int getTwist(const CubieCube &c)
+{
+  int t = 0;
+  for (int i = 0; i < 7; i++) t = 3 * t + c.co[i];
+  return t;
+}
+static void setTwist(CubieCube &c, int t)
+{
+  int sum = 0;
+  for (int i = 6; i >= 0; i--) { c.co[i] = t % 3; sum += c.co[i]; t /= 3; }
+  c.co[7] = (3 - sum % 3) % 3;
+}
+static int getFlip(const CubieCube &c)
+{
+  int f = 0;
+  for (int i = 0; i < 11; i++) f = 2 * f + c.eo[i];
+  return f;
+}
+static void setFlip(CubieCube &c, int f)
+{
+  int sum = 0;
+  for (int i = 10; i >= 0; i--) { c.eo[i] = f % 2; sum += c.eo[i]; f /= 2; }
+  c.eo[11] = sum % 2;
+}
+/* Which 4 of the 12 edge positions hold middle slice edges, 0 if solved */
+static int getSlice(const CubieCube &c)
+{
+  int s = 0, x = 0;
+  for (int j = 11; j >= 0; j--) {
+    if (c.ep[j] >= FR) { s += binomial(11 - j, x + 1); x++; }
+  }
+  return s;
+}
+static void setSlice(CubieCube &c, int s)
+{
+  int x = 3, other = UR;
+  for (int j = 0; j < 12; j++) {
+    if (x >= 0 && s - binomial(11 - j, x + 1) >= 0) {
+      c.ep[j] = BR - x; s -= binomial(11 - j, x + 1); x--;
+    }
+    else {
+      c.ep[j] = other++;
+    }
+  }
+}
+/* Index of a permutation of n items, 0 for the identity */
+static int permIndex(const unsigned char *p, int n)
+{
+  int index = 0;
+  for (int i = 0; i < n; i++) {
+    int smaller = 0;
+    for (int j = i + 1; j < n; j++) if (p[j] < p[i]) smaller++;
+    index = index * (n - i) + smaller;
+  }
+  return index;
+}
+static void setPerm(unsigned char *p, int n, int index, int first)
+{
+  int digits[12];
+  unsigned char left[12];
+  for (int i = n - 1; i >= 0; i--) { digits[i] = index % (n - i); index /= n - i; }
+  for (int i = 0; i < n; i++) left[i] = first + i;
+  for (int i = 0; i < n; i++) {
+    p[i] = left[digits[i]];
+    for (int j = digits[i]; j < n - i - 1; j++) left[j] = left[j + 1];
+  }
+}
+
+/* Index of the facelet on face 'faces[k]' of the cubie between 'faces' */
+static int faceletIndex(const int *faces, int count, int k)
+{
+  int x = 1, y = 1, z = 1, r, c;
+  for (int l = 0; l < count; l++) {
+    switch (faces[l]) {
+      case FACE_U: y = 0; break;
+      case FACE_D: y = 2; break;
+      case FACE_F: z = 0; break;
+      case FACE_B: z = 2; break;
+      case FACE_L: x = 0; break;
+      case FACE_R: x = 2; break;
+    }
+  }
+  switch (faces[k]) {
+    case FACE_U: r = x; c = z; break;
+    case FACE_F: r = y; c = x; break;
+    case FACE_R: r = y; c = z; break;
+    case FACE_B: r = y; c = 2 - x; break;
+    case FACE_L: r = y; c = 2 - z; break;
+    default: r = 2 - x; c = z; break;
+  }
+  return faces[k] * 9 + r * 3 + c;
+}
+
+/* Distances from the solved state, found breadth first */
+static void buildPruning(signed char *table, const unsigned short *move1,
+    int size1, const unsigned short *move2, int size2, int moves)
+{
+  memset(table, -1, size1 * size2);
+  vector<int> frontier(1, 0), next;
+  table[0] = 0;
+  for (int depth = 1; !frontier.empty(); depth++) {
+    next.clear();
+    for (size_t k = 0; k < frontier.size(); k++) {
+      int i1 = frontier[k] % size1, i2 = frontier[k] / size1;
+      for (int m = 0; m < moves; m++) {
+        int j = move2[i2 * moves + m] * size1 + move1[i1 * moves + m];
+        if (table[j] < 0) { table[j] = depth; next.push_back(j); }
+      }
+    }
+    frontier.swap(next);
+  }
+}
+
+// definition of the solver class
+TwoPhase::TwoPhase()
+{
+  solution = "";
+  moves = phase1 = phase2 = 0;
+  seconds = 0;
+  CubieCube c; identity(c);
+  memcpy(cp, c.cp, 8); memcpy(co, c.co, 8);
+  memcpy(ep, c.ep, 12); memcpy(eo, c.eo, 12);
+}
+
+bool TwoPhase::TablesReady()
+{
+  return tables != NULL;
+}
+
+bool TwoPhase::TablesMapped()
+{
+  return tablesMapped;
+}
+
+/* The moves as cubie cubes, needed however the tables were made */
+static void initMoves()
+{
+  for (int f = 0; f < 6; f++) {
+    identity(moveCube[f * 3]);
+    multiply(moveCube[f * 3], faceTurns[f]);
+    for (int i = 1; i < 3; i++) {
+      moveCube[f * 3 + i] = moveCube[f * 3 + i - 1];
+      multiply(moveCube[f * 3 + i], faceTurns[f]);
+    }
+  }
+}
+
+/* FNV-1a over 64 bit words */
+static uint64_t checksum(const void *data, size_t size)
+{
+  const unsigned char *bytes = (const unsigned char *) data;
+  uint64_t hash = 14695981039346656037ULL, word;
+  size_t i = 0;
+  // a word at a time, to keep checking a whole table file quick
+  for (; i + sizeof(word) <= size; i += sizeof(word)) {
+    memcpy(&word, bytes + i, sizeof(word));
+    hash ^= word;
+    hash *= 1099511628211ULL;
+  }
+  for (; i < size; i++) {
+    hash ^= bytes[i];
+    hash *= 1099511628211ULL;
+  }
+  return hash;
+}
+
+// a table file whose checksum was checked gets a stamp file next to it,
+// holding the identity and modification time of the table file and its
+// checksum. while the stamp matches, the file hasn't changed since.
+static string stampPath(const char *path)
+{
+  return string(path) + ".verified";
+}
+
+static string stampOf(const struct stat &st, uint64_t sum)
+{
+#ifdef __APPLE__
+  long nsec = st.st_mtimespec.tv_nsec;
+#else
+  long nsec = st.st_mtim.tv_nsec;
+#endif
+  char stamp[128];
+  snprintf(stamp, sizeof(stamp), "%llu %llu %llu %lld.%09ld %016llx\n",
+           (unsigned long long) st.st_dev, (unsigned long long) st.st_ino,
+           (unsigned long long) st.st_size, (long long) st.st_mtime, nsec,
+           (unsigned long long) sum);
+  return stamp;
+}
+
+static bool stampMatches(const char *path, const struct stat &st, uint64_t sum)
+{
+  string stamp = stampOf(st, sum);
+  char found[128];
+  FILE *file = fopen(stampPath(path).c_str(), "r");
+  if (file == NULL) return false;
+  bool same = fgets(found, sizeof(found), file) != NULL && stamp == found;
+  fclose(file);
+  return same;
+}
+
+// failing to write the stamp only means checking the file again next time
+static void writeStamp(const char *path, const struct stat &st, uint64_t sum)
+{
+  FILE *file = fopen(stampPath(path).c_str(), "w");
+  if (file == NULL) return;
+  fputs(stampOf(st, sum).c_str(), file);
+  if (fclose(file) != 0) remove(stampPath(path).c_str());
+}
+
+// map the tables read-only from a file written by SaveTables(), so
+// processes using the same file share its pages and only read the ones
+// a search touches. returns false if the file is missing, of another
+// version or size, or fails its checksum. checking the checksum reads
+// every page, so it's done once for every file, and again when the file
+// was changed since, as told by its stamp. with 'verify' it's always done.
+bool TwoPhase::LoadTables(const char *path, bool verify)
+{
+  if (tables != NULL) return false;
+
+  int fd = open(path, O_RDONLY);
+  if (fd < 0) return false;
+
+  struct stat st;
+  size_t size = sizeof(TableHeader) + sizeof(TwoPhaseTables);
+  if (fstat(fd, &st) < 0 || (size_t) st.st_size != size) {
+    close(fd);
+    return false;
+  }
+
+  void *data = mmap(NULL, size, PROT_READ, MAP_SHARED, fd, 0);
+  close(fd);
+  if (data == MAP_FAILED) return false;
+
+  const TableHeader *header = (const TableHeader *) data;
+  const TwoPhaseTables *t = (const TwoPhaseTables *) (header + 1);
+  bool check = verify || !stampMatches(path, st, header->checksum);
+  if (memcmp(header->magic, TABLE_MAGIC, sizeof(TABLE_MAGIC)) != 0 ||
+      header->version != TABLE_VERSION ||
+      header->headerSize != sizeof(TableHeader) ||
+      header->size != sizeof(TwoPhaseTables) ||
+      (check && header->checksum != checksum(t, sizeof(TwoPhaseTables)))) {
+    munmap(data, size);
+    return false;
+  }
+  if (check) writeStamp(path, st, header->checksum);
+
+  initMoves();
+  tables = t;
+  tablesMapped = true;
+  return true;
+}
+
+// write the tables to a file, through a temporary file so other
+// processes never see a half written one
+bool TwoPhase::SaveTables(const char *path)
+{
+  if (tables == NULL) return false;
+
+  TableHeader header;
+  memset(&header, 0, sizeof(header));
+  memcpy(header.magic, TABLE_MAGIC, sizeof(TABLE_MAGIC));
+  header.version = TABLE_VERSION;
+  header.headerSize = sizeof(TableHeader);
+  header.size = sizeof(TwoPhaseTables);
+  header.checksum = checksum(tables, sizeof(TwoPhaseTables));
+
+  string temp = string(path) + "." + to_string(getpid());
+  FILE *file = fopen(temp.c_str(), "wb");
+  if (file == NULL) return false;
+
+  bool ok = fwrite(&header, sizeof(header), 1, file) == 1 &&
+    fwrite(tables, sizeof(TwoPhaseTables), 1, file) == 1;
+  ok = fclose(file) == 0 && ok;
+  if (ok) ok = rename(temp.c_str(), path) == 0;
+  if (!ok) {
+    int error = errno;
+    remove(temp.c_str());
+    errno = error;
+    return false;
+  }
+
+  // the file holds the tables just built, so it needs no checking
+  struct stat st;
+  if (stat(path, &st) == 0) writeStamp(path, st, header.checksum);
+  return true;
+}
+
+// build the move and pruning tables, only done once
+void TwoPhase::InitTables()
+{
+  if (tables != NULL) return;
+  TwoPhaseTables *t = new TwoPhaseTables;
+  initMoves();
+
+  CubieCube c;
+  for (int i = 0; i < N_TWIST; i++) {
+    for (int m = 0; m < N_MOVES; m++) {
+      identity(c); setTwist(c, i);
+      cornerMultiply(c, moveCube[m]);
+      t->twistMove[i][m] = getTwist(c);
+    }
+  }
+  for (int i = 0; i < N_FLIP; i++) {
+    for (int m = 0; m < N_MOVES; m++) {
+      identity(c); setFlip(c, i);
+      edgeMultiply(c, moveCube[m]);
+      t->flipMove[i][m] = getFlip(c);
+    }
+  }
+  for (int i = 0; i < N_SLICE; i++) {
+    for (int m = 0; m < N_MOVES; m++) {
+      identity(c); setSlice(c, i);
+      edgeMultiply(c, moveCube[m]);
+      t->sliceMove[i][m] = getSlice(c);
+    }
+  }
+  for (int i = 0; i < N_CPERM; i++) {
+    for (int m = 0; m < N_MOVES2; m++) {
+      identity(c); setPerm(c.cp, 8, i, URF);
+      cornerMultiply(c, moveCube[phase2Moves[m]]);
+      t->cpermMove[i][m] = permIndex(c.cp, 8);
+    }
+  }
+  for (int i = 0; i < N_EDGE; i++) {
+    for (int m = 0; m < N_MOVES2; m++) {
+      identity(c); setPerm(c.ep, 8, i, UR);
+      edgeMultiply(c, moveCube[phase2Moves[m]]);
+      t->edgeMove[i][m] = permIndex(c.ep, 8);
+    }
+  }
+  for (int i = 0; i < N_SPERM; i++) {
+    for (int m = 0; m < N_MOVES2; m++) {
+      identity(c); setPerm(c.ep + 8, 4, i, FR);
+      edgeMultiply(c, moveCube[phase2Moves[m]]);
+      t->spermMove[i][m] = permIndex(c.ep + 8, 4);
+    }
+  }
+
+  buildPruning(t->twistPrune, &t->twistMove[0][0], N_TWIST,
+      &t->sliceMove[0][0], N_SLICE, N_MOVES);
+  buildPruning(t->flipPrune, &t->flipMove[0][0], N_FLIP,
+      &t->sliceMove[0][0], N_SLICE, N_MOVES);
+  buildPruning(t->cpermPrune, &t->cpermMove[0][0], N_CPERM,
+      &t->spermMove[0][0], N_SPERM, N_MOVES2);
+  buildPruning(t->edgePrune, &t->edgeMove[0][0], N_EDGE,
+      &t->spermMove[0][0], N_SPERM, N_MOVES2);
+
+  tables = t;
+}
+
+// read the corners and edges off the facelets, returns an error like
+// Cubex: 1-improper cubelets, 5-edge flip parity, 6-edge swap parity,
+// 7-corner rotation parity
+int TwoPhase::LoadFacelets(const unsigned char *facelets)
+{
+  int color[54], face[7], cornerAt[8][3], edgeAt[12][2];
+  bool seen[12];
+
+  for (int i = 0; i < 54; i++)
+    color[i] = facelets[i] >= '0' ? facelets[i] - '0' : facelets[i];
+
+  // the centers tell which face a color belongs to
+  for (int i = 0; i < 7; i++) face[i] = -1;
+  for (int f = 0; f < 6; f++) {
+    int c = color[f * 9 + 4];
+    if (c < 1 || c > 6 || face[c] >= 0) return 1;
+    face[c] = f;
+  }
+  for (int i = 0; i < 54; i++) {
+    if (color[i] < 1 || color[i] > 6) return 1;
+    color[i] = face[color[i]];
+  }
+
+  // find the facelets of every corner and edge position
+  for (int i = 0; i < 8; i++)
+    for (int k = 0; k < 3; k++)
+      cornerAt[i][k] = color[faceletIndex(cornerFaces[i], 3, k)];
+  for (int i = 0; i < 12; i++)
+    for (int k = 0; k < 2; k++)
+      edgeAt[i][k] = color[faceletIndex(edgeFaces[i], 2, k)];
+
+  // identify the corners
+  for (int j = 0; j < 8; j++) seen[j] = false;
+  for (int i = 0; i < 8; i++) {
+    int ori;
+    for (ori = 0; ori < 3; ori++)
+      if (cornerAt[i][ori] == FACE_U || cornerAt[i][ori] == FACE_D) break;
+    if (ori == 3) return 1;
+    int c1 = cornerAt[i][(ori + 1) % 3], c2 = cornerAt[i][(ori + 2) % 3];
+    int j;
+    for (j = 0; j < 8; j++)
+      if (cornerFaces[j][0] == cornerAt[i][ori] &&
+          cornerFaces[j][1] == c1 && cornerFaces[j][2] == c2) break;
+    if (j == 8 || seen[j]) return 1;
+    seen[j] = true;
+    cp[i] = j; co[i] = ori;
+  }
+
+  // identify the edges
+  for (int j = 0; j < 12; j++) seen[j] = false;
+  for (int i = 0; i < 12; i++) {
+    int j;
+    for (j = 0; j < 12; j++) {
+      if (edgeFaces[j][0] == edgeAt[i][0] && edgeFaces[j][1] == edgeAt[i][1]) {
+        eo[i] = 0; break;
+      }
+      if (edgeFaces[j][0] == edgeAt[i][1] && edgeFaces[j][1] == edgeAt[i][0]) {
+        eo[i] = 1; break;
+      }
+    }
+    if (j == 12 || seen[j]) return 1;
+    seen[j] = true;
+    ep[i] = j;
+  }
+
+  // check that the cube can be solved at all
+  int twist = 0, flip = 0, parity = 0;
+  for (int i = 0; i < 8; i++) twist += co[i];
+  for (int i = 0; i < 12; i++) flip += eo[i];
+  for (int i = 0; i < 8; i++)
+    for (int j = i + 1; j < 8; j++) if (cp[j] < cp[i]) parity++;
+  for (int i = 0; i < 12; i++)
+    for (int j = i + 1; j < 12; j++) if (ep[j] < ep[i]) parity++;
+  if (flip % 2) return 5;
+  if (parity % 2) return 6;
+  if (twist % 3) return 7;
+  return 0;
+}
+
+bool TwoPhase::TimeUp()
+{
+  chrono::duration<double> elapsed = chrono::steady_clock::now() - start;
+  return elapsed.count() > timeout;
+}
+
+// search for a solution, stopping at the first one of at most 'maxMoves'
+// face turns or, once any solution is found, when 'timeout' seconds have
+// passed. returns 0 when a solution was found, 1 otherwise.
+int TwoPhase::Solve(int maxMoves, double timeout)
+{
+  if (tables == NULL) return 1;
+
+  start = chrono::steady_clock::now();
+  this->maxMoves = maxMoves;
+  this->timeout = timeout;
+  bestLength = 31;
+  bestPhase1 = 0;
+  aborted = false;
+  nodes = 0;
+
+  CubieCube c;
+  memcpy(c.cp, cp, 8); memcpy(c.co, co, 8);
+  memcpy(c.ep, ep, 12); memcpy(c.eo, eo, 12);
+  int twist = getTwist(c), flip = getFlip(c), slice = getSlice(c);
+
+  for (int depth = 0; depth < bestLength && !aborted; depth++) {
+    if (Phase1(twist, flip, slice, 0, depth)) break;
+  }
+
+  seconds = chrono::duration<double>(chrono::steady_clock::now() - start).count();
+  if (bestLength > 30) return 1;
+
+  solution = "";
+  moves = bestLength;
+  phase1 = phase2 = 0;
+  for (int i = 0; i < bestLength; i++) {
+    int f = best[i] / 3, turns = best[i] % 3 + 1;
+    if (turns == 3) { solution += anticlockwise[f]; solution += "."; }
+    else {
+      for (int k = 0; k < turns; k++) { solution += clockwise[f]; solution += "."; }
+    }
+    // half turns are written as two moves, count them the same way
+    (i < bestPhase1 ? phase1 : phase2) += turns == 2 ? 2 : 1;
+  }
+  return 0;
+}
+
+// phase 1, find 'togo' more moves that take the cube into phase 2
+bool TwoPhase::Phase1(int twist, int flip, int slice, int depth, int togo)
+{
+  if (togo == 0)
+    return twist == 0 && flip == 0 && slice == 0 && StartPhase2(depth);
+
+  if ((++nodes & 0xfff) == 0 && bestLength <= 30 && TimeUp()) aborted = true;
+  if (aborted) return true;
+
+  for (int m = 0; m < N_MOVES; m++) {
+    int f = m / 3;
+    if (depth > 0) {
+      int last = path[depth - 1] / 3;
+      if (f == last || f == last - 3) continue;
+    }
+    int t = tables->twistMove[twist][m];
+    int fl = tables->flipMove[flip][m];
+    int s = tables->sliceMove[slice][m];
+    int h = tables->twistPrune[s * N_TWIST + t];
+    if (tables->flipPrune[s * N_FLIP + fl] > h) h = tables->flipPrune[s * N_FLIP + fl];
+    if (h >= togo) continue;
+
+    path[depth] = m;
+    if (Phase1(t, fl, s, depth + 1, togo - 1)) return true;
+  }
+  return false;
+}
+
+// the cube is in phase 2 after 'depth' moves, try to finish it
+bool TwoPhase::StartPhase2(int depth)
+{
+  // ending phase 1 with a phase 2 move means a shorter phase 1 was tried
+  if (depth > 0) {
+    for (int i = 0; i < N_MOVES2; i++)
+      if (phase2Moves[i] == path[depth - 1]) return false;
+  }
+
+  CubieCube c;
+  memcpy(c.cp, cp, 8); memcpy(c.co, co, 8);
+  memcpy(c.ep, ep, 12); memcpy(c.eo, eo, 12);
+  for (int i = 0; i < depth; i++) multiply(c, moveCube[path[i]]);
+
+  int cperm = permIndex(c.cp, 8);
+  int edge = permIndex(c.ep, 8);
+  int sperm = permIndex(c.ep + 8, 4);
+
+  int h = tables->cpermPrune[sperm * N_CPERM + cperm];
+  if (tables->edgePrune[sperm * N_EDGE + edge] > h) h = tables->edgePrune[sperm * N_EDGE + edge];
+
+  for (int togo = h; togo < bestLength - depth; togo++) {
+    if (Phase2(cperm, edge, sperm, depth, togo)) {
+      bestLength = depth + togo;
+      memcpy(best, path, sizeof(int) * bestLength);
+      bestPhase1 = depth;
+      break;
+    }
+    if (aborted) break;
+  }
+  return aborted || bestLength <= maxMoves;
+}
+
+// phase 2, find 'togo' more moves that solve the cube
+bool TwoPhase::Phase2(int cperm, int edge, int sperm, int depth, int togo)
+{
+  if (togo == 0) return cperm == 0 && edge == 0 && sperm == 0;
+
+  if ((++nodes & 0xfff) == 0 && bestLength <= 30 && TimeUp()) aborted = true;
+  if (aborted) return false;
+
+  for (int i = 0; i < N_MOVES2; i++) {
+    int m = phase2Moves[i], f = m / 3;
+    if (depth > 0) {
+      int last = path[depth - 1] / 3;
+      if (f == last || f == last - 3) continue;
+    }
+    int c = tables->cpermMove[cperm][i];
+    int e = tables->edgeMove[edge][i];
+    int s = tables->spermMove[sperm][i];
+    int h = tables->cpermPrune[s * N_CPERM + c];
+    if (tables->edgePrune[s * N_EDGE + e] > h) h = tables->edgePrune[s * N_EDGE + e];
+    if (h >= togo) continue;
+
+    path[depth] = m;
+    if (Phase2(c, e, s, depth + 1, togo - 1)) return true;
+  }
+  return false;
+}
@@ -0,0 +1,88 @@
+/*
+ * twophase.h
+ * A two-phase solver for the 3x3x3 cube, after Herbert Kociemba's
+ * algorithm. Phase 1 brings the cube into the subgroup generated by
+ * U, D, R2, L2, F2 and B2, phase 2 solves it from there. Both phases are
+ * IDA* searches over small coordinates, using precomputed move tables and
+ * pruning tables.
+ */
+
+#ifndef _TWOPHASE_H_
+#define _TWOPHASE_H_
+
+#include <string>
+#include <chrono>
+#include <stdint.h>
+using namespace std;
+
+/* Sizes of the coordinates */
+const int N_TWIST = 2187;   /* 3^7 corner orientations */
+const int N_FLIP = 2048;    /* 2^11 edge orientations */
+const int N_SLICE = 495;    /* 12 choose 4 positions of the middle slice edges */
+const int N_CPERM = 40320;  /* 8! corner permutations */
+const int N_EDGE = 40320;   /* 8! permutations of the U and D edges */
+const int N_SPERM = 24;     /* 4! permutations of the middle slice edges */
+const int N_MOVES = 18;     /* U, R, F, D, L, B, each turned 1, 2 or 3 times */
+const int N_MOVES2 = 10;    /* the moves that keep a cube in phase 2 */
+
+/* All the tables of the solver, kept in one block */
+struct TwoPhaseTables {
+  unsigned short twistMove[N_TWIST][N_MOVES];
+  unsigned short flipMove[N_FLIP][N_MOVES];
+  unsigned short sliceMove[N_SLICE][N_MOVES];
+  unsigned short cpermMove[N_CPERM][N_MOVES2];
+  unsigned short edgeMove[N_EDGE][N_MOVES2];
+  unsigned short spermMove[N_SPERM][N_MOVES2];
+  signed char twistPrune[N_SLICE * N_TWIST];
+  signed char flipPrune[N_SLICE * N_FLIP];
+  signed char cpermPrune[N_SPERM * N_CPERM];
+  signed char edgePrune[N_SPERM * N_EDGE];
+};
+
+/* Header of a table file, followed by the TwoPhaseTables. Bump the */
+/* version whenever the way the tables are built changes. */
+const char TABLE_MAGIC[8] = { 'P', 'y', 'C', 'u', 'b', 'e', '2', 'P' };
+const uint32_t TABLE_VERSION = 1;
+
+struct TableHeader {
+  char magic[8];
+  uint32_t version;
+  uint32_t headerSize;
+  uint64_t size;      /* size of the tables following the header */
+  uint64_t checksum;  /* FNV-1a hash of the tables, see twophase.cpp */
+};
+
+class TwoPhase
+{
+public:
+  TwoPhase();
+  static void InitTables();
+  static bool TablesReady();
+  static bool TablesMapped();
+  static bool LoadTables(const char *path, bool verify = false);
+  static bool SaveTables(const char *path);
+  int LoadFacelets(const unsigned char *facelets);
+  int Solve(int maxMoves, double timeout);
+  string solution; /* moves in the notation of Cubex, e.g. "UL.FC." */
+  int moves;       /* number of face turns in the solution */
+  int phase1;      /* moves of 'solution' in phase 1, half turns are two */
+  int phase2;      /* and in phase 2, adding up to its length */
+  double seconds;  /* time spent searching */
+private:
+  bool Phase1(int twist, int flip, int slice, int depth, int togo);
+  bool Phase2(int cperm, int edge, int sperm, int depth, int togo);
+  bool StartPhase2(int depth);
+  bool TimeUp();
+  unsigned char cp[8], co[8], ep[12], eo[12];
+  int path[32];
+  int best[32];
+  int bestLength;
+  int bestPhase1;
+  int maxMoves;
+  double timeout;
+  long nodes;
+  bool aborted;
+  chrono::steady_clock::time_point start;
+};
+
+#endif /* _TWOPHASE_H_ */